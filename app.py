@@ -1,9 +1,8 @@
-import streamlit as st
-from db import init_db
-init_db()  # ensures tables & seed admin if empty
+import time
+_rerun_started = time.perf_counter()
 
-from auth import require_login
-from pages import dashboard, sales, inventory, emi_tracker, bill_scan, users as users_page
+import streamlit as st
+from utils.timing import PROCESS_TIMINGS, load_page, record_rerun, render_timing_panel
 
 st.set_page_config(
     page_title="Mobile Shop Management",
@@ -11,29 +10,70 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
-user = require_login()
-
-st.sidebar.markdown(f"**Logged in:** {user['username']} ({user['role']})")
-nav = ["Dashboard", "New Sale", "Inventory", "EMI Tracker", "Bill Scan"]
-if user['role'] == 'admin':
-    nav.append("Users")
-page = st.sidebar.radio("Go to", nav)
-
-if st.sidebar.button("Logout"):
-    st.session_state["user"] = None
-    st.rerun()
-
-if page == "Dashboard":
-    dashboard.app()
-elif page == "New Sale":
-    sales.app()
-elif page == "Inventory":
-    inventory.app()
-elif page == "EMI Tracker":
-    emi_tracker.app()
-elif page == "Bill Scan":
-    bill_scan.app()
-elif page == "Users":
-    users_page.app()
-else:
-    st.error("Unknown page.")
+
+@st.cache_resource(show_spinner="Starting up...")
+def bootstrap():
+    """Create/migrate tables, seed admin & start batch jobs once per process, not on every rerun."""
+    from db import init_db
+    from utils.jobs import start_job_scheduler
+    from utils.offline_queue import start_outbox_syncer
+    t0 = time.perf_counter()
+    init_db()
+    start_job_scheduler()
+    start_outbox_syncer()
+    PROCESS_TIMINGS["bootstrap_ms"] = (time.perf_counter() - t0) * 1000
+    return True
+
+
+bootstrap()
+
+from auth import require_login
+from db import session_scope, read_session_scope
+from utils.sql_stats import capture, record_sql, render_sql_panel
+from utils.profiling import profile_rerun, render_profiler_panel
+
+# page label -> module, imported on first visit
+PAGES = {
+    "Dashboard": "pages.dashboard",
+    "New Sale": "pages.sales",
+    "Inventory": "pages.inventory",
+    "EMI Tracker": "pages.emi_tracker",
+    "Bill Scan": "pages.bill_scan",
+    "Search": "pages.search",
+    "Exports": "pages.exports",
+    "Users": "pages.users",
+}
+
+# one DB session per rerun, always returned to the pool (also on st.rerun/st.stop);
+# report reads may go to the read replica; statements are counted per rerun
+# for the admin SQL panel
+with capture() as sql, session_scope(), read_session_scope():
+    user = require_login()
+
+    st.sidebar.markdown(f"**Logged in:** {user['username']} ({user['role']})")
+    nav = ["Dashboard", "New Sale", "Inventory", "EMI Tracker", "Bill Scan", "Search"]
+    if user['role'] in ('owner', 'admin'):
+        nav.append("Exports")
+    if user['role'] == 'admin':
+        nav.append("Users")
+    page = st.sidebar.radio("Go to", nav)
+
+    if st.sidebar.button("Logout"):
+        st.session_state["user"] = None
+        st.rerun()
+
+    if user['role'] == 'admin':
+        render_timing_panel()
+        render_sql_panel()
+        render_profiler_panel(page)
+
+    if page in PAGES:
+        try:
+            with profile_rerun(page):
+                load_page(PAGES[page]).app()
+        finally:
+            elapsed_ms = (time.perf_counter() - _rerun_started) * 1000
+            record_rerun(page, elapsed_ms)
+            record_sql(page, sql, elapsed_ms)
+    else:
+        st.error("Unknown page.")
@@ -1,5 +1,5 @@
 import streamlit as st
-from db import SessionLocal, get_user_by_username, verify_password
+from db import get_session, get_user_by_username, verify_password
 
 def login_form():
     st.sidebar.subheader("Login")
@@ -8,9 +8,7 @@ def login_form():
     login_btn = st.sidebar.button("Login", type="primary")
 
     if login_btn:
-        session = SessionLocal()
-        user = get_user_by_username(username, session)
-        session.close()
+        user = get_user_by_username(username, get_session())
         if user and verify_password(user, password):
             st.session_state["user"] = {
                 "username": user.username,
@@ -0,0 +1,152 @@
+"""
+Query-plan & latency benchmark for the hot-column indexes (migration 1).
+
+Seeds a large dataset (utils/synthetic.py) with the model indexes dropped, times the app's hot
+lookups and prints their plans, then applies the migrations and repeats.
+
+    python benchmarks/bench_indexes.py                  # temp SQLite file
+    python benchmarks/bench_indexes.py --sales 500000
+    python benchmarks/bench_indexes.py --url postgresql://...   # scratch DB only!
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+QUERIES = {
+    "dashboard revenue (payment_type, range)": (
+        "SELECT sum(total_amount) FROM sales "
+        "WHERE payment_type = :pt AND sale_datetime >= :start AND sale_datetime < :end",
+        lambda r: {"pt": "cash", "start": r["day"], "end": r["day_end"]},
+    ),
+    "dashboard top sellers (range join)": (
+        "SELECT p.name, sum(si.qty) AS units FROM sale_items si "
+        "JOIN products p ON p.id = si.product_id JOIN sales s ON s.id = si.sale_id "
+        "WHERE s.sale_datetime >= :start AND s.sale_datetime < :end "
+        "GROUP BY p.id, p.name ORDER BY units DESC LIMIT 10",
+        lambda r: {"start": r["day"], "end": r["day_end"]},
+    ),
+    "bill scan (sale_items.imei)": (
+        "SELECT si.id, s.id FROM sale_items si JOIN sales s ON s.id = si.sale_id "
+        "WHERE si.imei = :imei",
+        lambda r: {"imei": r["imei"]},
+    ),
+    "product by sku": (
+        "SELECT id FROM products WHERE sku = :sku",
+        lambda r: {"sku": r["sku"]},
+    ),
+    "product by name": (
+        "SELECT id FROM products WHERE name = :name",
+        lambda r: {"name": r["name"]},
+    ),
+    "customer by phone": (
+        "SELECT id FROM customers WHERE phone = :phone",
+        lambda r: {"phone": r["phone"]},
+    ),
+    "EMIs due in window": (
+        "SELECT id FROM emi_details WHERE next_due_date >= :start AND next_due_date < :end",
+        lambda r: {"start": r["day"], "end": r["day_end"]},
+    ),
+}
+
+
+def _ts(d):
+    return d.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def drop_model_indexes(engine):
+    from db import Base
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for idx in table.indexes:
+                idx.drop(bind=conn, checkfirst=True)
+
+
+def explain(conn, sql, params):
+    from sqlalchemy import text
+    if conn.dialect.name == "sqlite":
+        rows = conn.execute(text("EXPLAIN QUERY PLAN " + sql), params).all()
+        return [r[-1] for r in rows]
+    rows = conn.execute(text("EXPLAIN ANALYZE " + sql), params).all()
+    return [r[0] for r in rows]
+
+
+def measure(engine, probes, repeat):
+    from sqlalchemy import text
+    out = {}
+    with engine.connect() as conn:
+        for label, (sql, make) in QUERIES.items():
+            timings = []
+            for i in range(repeat):
+                params = make(probes[i % len(probes)])
+                t0 = time.perf_counter()
+                conn.execute(text(sql), params).all()
+                timings.append((time.perf_counter() - t0) * 1000)
+            out[label] = (statistics.median(timings), explain(conn, sql, make(probes[0])))
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="database URL (default: temp SQLite file)")
+    ap.add_argument("--products", type=int, default=20000)
+    ap.add_argument("--customers", type=int, default=50000)
+    ap.add_argument("--sales", type=int, default=200000)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args(argv)
+
+    tmp = None
+    if not args.url:
+        tmp = tempfile.mkdtemp(prefix="shopbench-")
+        args.url = "sqlite:///" + os.path.join(tmp, "bench.db")
+    os.environ["DB_URL"] = args.url
+
+    from db import Base, engine
+    from migrations import run_migrations
+
+    from utils import synthetic as syn
+
+    rng = random.Random(args.seed)
+    Base.metadata.create_all(bind=engine)
+    drop_model_indexes(engine)
+    t0 = time.perf_counter()
+    counts = syn.generate(engine, args.products, args.customers, args.sales, args.seed)
+    print(f"seeded {args.sales} sales in {time.perf_counter() - t0:.1f}s ({engine.url.render_as_string()})")
+
+    probes = []
+    for _ in range(args.repeat):
+        day = syn.START + datetime.timedelta(days=rng.randrange(365))
+        i = rng.randrange(1, args.products + 1)
+        probes.append({
+            "day": _ts(day), "day_end": _ts(day + datetime.timedelta(days=1)),
+            "imei": syn.item_imei(rng.randrange(1, counts["sale_items"] + 1)),
+            "sku": syn.product_sku(i), "name": syn.product_name(i),
+            "phone": syn.customer_phone(rng.randrange(1, args.customers + 1)),
+        })
+
+    before = measure(engine, probes, args.repeat)
+    t0 = time.perf_counter()
+    run_migrations(engine)
+    print(f"migrations applied in {time.perf_counter() - t0:.1f}s\n")
+    after = measure(engine, probes, args.repeat)
+
+    print(f"{'query':42} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for label in QUERIES:
+        b, a = before[label][0], after[label][0]
+        print(f"{label:42} {b:10.2f} {a:10.3f} {b / a if a else float('inf'):7.0f}x")
+    for label in QUERIES:
+        print(f"\n== {label}")
+        print("  before: " + "\n          ".join(before[label][1]))
+        print("  after:  " + "\n          ".join(after[label][1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Concurrent checkout stress test against SQLite.
+
+Several threads (one session each, like parallel counters) race to sell the
+same few products. Checks that stock never goes negative, that every unit is
+sold exactly once and that sale items / stock movements match the stock taken.
+A multi-line cart with one short line must fail cleanly, naming that line.
+
+    python benchmarks/checkout_stress.py
+    python benchmarks/checkout_stress.py --threads 16 --stock 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--products", type=int, default=3)
+    ap.add_argument("--stock", type=int, default=50, help="units per product")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_URL"] = f"sqlite:///{os.path.join(tmp, 'stress.db')}"
+    os.environ.setdefault("DB_POOL_SIZE", str(args.threads))
+
+    from sqlalchemy import insert, select, func
+    from db import Base, engine, SessionLocal, Product, SaleItem, StockMovement
+    from utils.checkout import checkout, StockShortError
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"id": i, "sku": f"SKU{i}", "name": f"Phone {i}", "sell_price": 1000 + i,
+             "qty_on_hand": args.stock}
+            for i in range(1, args.products + 1)
+        ])
+
+    outcomes = Counter()
+    outcomes_lock = threading.Lock()
+    start = threading.Barrier(args.threads)
+
+    def counter(worker):
+        start.wait()
+        i = 0
+        while True:
+            # alternate single-unit sales with 2-line carts spanning two products
+            pid = (worker + i) % args.products + 1
+            cart = [{"product_id": pid, "qty": 1, "name": f"Phone {pid}"}]
+            if i % 3 == 2 and args.products > 1:
+                cart.append({"product_id": pid % args.products + 1, "qty": 1})
+            i += 1
+            session = SessionLocal()
+            try:
+                checkout(session, cart, None, "cash", 0.0)
+                session.commit()
+                result = "sold"
+            except StockShortError:
+                session.rollback()
+                result = "short"
+            except Exception as e:
+                session.rollback()
+                result = f"error: {type(e).__name__}"
+            finally:
+                session.close()
+            with outcomes_lock:
+                outcomes[result] += 1
+            if result == "short":
+                with SessionLocal() as s:
+                    if not s.execute(select(func.count()).where(Product.qty_on_hand > 0)).scalar():
+                        return
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=counter, args=(w,)) for w in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    with SessionLocal() as s:
+        stock = dict(s.execute(select(Product.id, Product.qty_on_hand)).all())
+        sold = s.execute(select(func.coalesce(func.sum(SaleItem.qty), 0))).scalar()
+        moved = s.execute(select(func.coalesce(func.sum(StockMovement.change_qty), 0))).scalar()
+
+    # a cart whose second line is short must fail and name line 2
+    with SessionLocal() as s:
+        s.execute(insert(Product), [{"id": 999, "name": "Plenty", "qty_on_hand": 10}])
+        s.commit()
+        try:
+            checkout(s, [{"product_id": 999, "qty": 1}, {"product_id": 1, "qty": 1}],
+                     None, "cash", 0.0)
+            short_msg = None
+        except StockShortError as e:
+            s.rollback()
+            short_msg = str(e)
+        left = s.get(Product, 999).qty_on_hand
+
+    total = args.products * args.stock
+    print(f"threads:     {args.threads}, {total} units over {args.products} products")
+    print(f"attempts:    {dict(outcomes)} in {elapsed:.2f}s")
+    print(f"final stock: {stock}")
+    print(f"units sold:  {sold}, stock movements: {moved}")
+    print(f"short cart:  {short_msg!r}, untouched line kept {left} units")
+
+    checks = {
+        "no database errors": not any(k.startswith("error") for k in outcomes),
+        "no negative stock": min(stock.values()) >= 0,
+        "every unit sold once": sold == total and all(q == 0 for q in stock.values()),
+        "movements match sale items": -moved == sold,
+        "short line reported": bool(short_msg) and short_msg.startswith("Line 2") and left == 10,
+    }
+    for name, ok in checks.items():
+        print(f"  [{'ok' if ok else 'FAIL'}] {name}")
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
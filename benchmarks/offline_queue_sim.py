@@ -0,0 +1,119 @@
+"""
+Offline queue simulation with two local SQLite files (edge outbox, primary).
+
+Counters queue sales while the primary is "down" (the syncer points at an
+unopenable path), another counter sells some of the same stock directly on
+the primary, then the uplink comes back and the outbox is replayed. Checks:
+
+- queueing latency stays in milliseconds and nothing is lost while down
+- the catalog view subtracts unsynced lines
+- every queued sale lands exactly once (also after a replay of synced
+  entries, as after a crash between primary commit and outbox update)
+- oversold sales become conflicts, stock never goes negative, and the stock
+  ledger still reconciles
+
+    python benchmarks/offline_queue_sim.py
+    python benchmarks/offline_queue_sim.py --sales 500 --stock 100
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--products", type=int, default=5)
+    ap.add_argument("--stock", type=int, default=40, help="units per product")
+    ap.add_argument("--sales", type=int, default=200, help="sales queued while offline")
+    ap.add_argument("--direct", type=int, default=30, help="sales made on the primary meanwhile")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="outbox-sim-")
+    os.environ["DB_URL"] = f"sqlite:///{os.path.join(tmp, 'primary.db')}"
+
+    from sqlalchemy import create_engine, insert, select, update, func
+    from sqlalchemy.orm import sessionmaker
+    from db import Base, engine, SessionLocal, Product, Sale, StockMovement
+    from migrations import run_migrations
+    from utils.checkout import checkout
+    from utils.offline_queue import Outbox, outbox_sales, sync_once, sync_all
+    from utils.stock_ledger import reconcile
+
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {"id": i, "sku": f"SKU{i}", "name": f"Phone {i}", "sell_price": 1000 + i, "qty_on_hand": args.stock}
+            for i in range(1, args.products + 1)
+        ])
+        conn.execute(insert(StockMovement), [
+            {"product_id": i, "change_qty": args.stock, "reason": "purchase"} for i in range(1, args.products + 1)
+        ])
+    outbox = Outbox(f"sqlite:///{os.path.join(tmp, 'edge.db')}")
+    down = sessionmaker(bind=create_engine(f"sqlite:///{os.path.join(tmp, 'no', 'such', 'dir.db')}"))
+    failures = []
+
+    def check(ok, what):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            failures.append(what)
+
+    # 1. uplink down: queue sales, try to sync
+    lat, expected = [], {}
+    for i in range(args.sales):
+        pid = i % args.products + 1
+        cart = [{"product_id": pid, "name": f"Phone {pid}", "qty": 1, "price": 1000.0 + pid, "imei": None}]
+        t0 = time.perf_counter()
+        outbox.enqueue(cart, None, "cash", 1000.0 + pid, customer_phone=f"98{i % 50:08d}")
+        lat.append((time.perf_counter() - t0) * 1000)
+        expected[pid] = expected.get(pid, 0) + 1
+    print(f"queued {args.sales} sales: median {statistics.median(lat):.2f} ms, max {max(lat):.2f} ms")
+    try:
+        sync_once(outbox, down)
+        check(False, "sync against an unreachable primary raises")
+    except Exception as e:
+        check(True, f"sync against an unreachable primary raises ({type(e).__name__})")
+    check(outbox.counts() == {"pending": args.sales}, "nothing lost or marked while down")
+    check(outbox.pending_stock() == expected, "pending stock matches queued lines")
+
+    # 2. another counter sells directly on the primary meanwhile
+    with SessionLocal() as s:
+        for i in range(args.direct):
+            checkout(s, [{"product_id": 1, "qty": 1}], None, "cash", 1001.0)
+            s.commit()
+
+    # 3. uplink back: replay
+    t0 = time.perf_counter()
+    totals = sync_all(outbox)
+    print(f"synced in {time.perf_counter() - t0:.2f}s: {totals}")
+    oversold = max(0, expected[1] + args.direct - args.stock)
+    check(totals["conflicts"] == oversold, f"{oversold} oversold sale(s) flagged as conflicts")
+    with SessionLocal() as s:
+        queued_sales = s.execute(select(func.count()).where(Sale.client_ref.isnot(None))).scalar()
+        negative = s.execute(select(func.count()).where(Product.qty_on_hand < 0)).scalar()
+    check(queued_sales == args.sales - oversold, "each synced sale is on the primary once")
+    check(negative == 0, "no negative stock")
+    check(outbox.pending_stock() == ({1: oversold} if oversold else {}), "only conflicts still hold stock")
+
+    # 4. replay of already-synced entries (crash before the outbox was updated)
+    with outbox.engine.begin() as conn:
+        conn.execute(update(outbox_sales).where(outbox_sales.c.status == "synced").values(status="pending"))
+    again = sync_all(outbox)
+    with SessionLocal() as s:
+        after = s.execute(select(func.count()).where(Sale.client_ref.isnot(None))).scalar()
+    check(after == queued_sales and again["synced"] == queued_sales, "replay is idempotent")
+
+    with SessionLocal() as s:
+        drift = reconcile(s)
+    check(drift.empty, "stock ledger reconciles with qty_on_hand")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
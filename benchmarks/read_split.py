@@ -0,0 +1,105 @@
+"""
+Checkout latency while year-long reports run, with and without a read replica.
+
+Generates synthetic data into a primary SQLite file and copies it as the
+"replica", then times single-line checkouts (one counter) three ways: idle,
+while report threads scan a year of sales on the primary, and while the same
+reports run on the replica (the read engine's own pool).
+
+With more report threads than the primary pool holds (pool_size +
+max_overflow, 10 by default), checkouts queue for a connection when reports
+share the primary. Everything runs in one process here, so the GIL still
+slows checkouts in both report scenarios; on Postgres the replica also takes
+the scan I/O and CPU off the primary server.
+
+    python benchmarks/read_split.py
+    python benchmarks/read_split.py --sales 500000 --readers 16
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--products", type=int, default=5000)
+    ap.add_argument("--sales", type=int, default=200000)
+    ap.add_argument("--readers", type=int, default=12, help="concurrent report threads")
+    ap.add_argument("--checkouts", type=int, default=200)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="read-split-")
+    primary, replica = os.path.join(tmp, "primary.db"), os.path.join(tmp, "replica.db")
+    os.environ["DB_URL"] = f"sqlite:///{primary}"
+
+    from sqlalchemy import create_engine
+    from db import Base, engine, IST
+    from migrations import run_migrations
+    from utils.synthetic import generate, START
+
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    generate(engine, args.products, args.products * 4, args.sales)
+    engine.dispose()
+    with create_engine(f"sqlite:///{primary}").connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    shutil.copy(primary, replica)
+
+    # db reads DB_READ_URL at import time; import the rest after setting it
+    os.environ["DB_READ_URL"] = f"sqlite:///{replica}"
+    for mod in [m for m in sys.modules if m == "db" or m.startswith(("utils.", "migrations"))]:
+        del sys.modules[mod]
+    from db import SessionLocal, ReadSessionLocal, Product
+    from sqlalchemy import select
+    from utils.checkout import checkout
+    from utils.db_helpers import get_sales_summary, get_top_sellers
+
+    start = IST.localize(START).replace(hour=9)  # not midnight-aligned: raw-table scans
+    end = start.replace(year=start.year + 1)
+    with SessionLocal() as s:
+        pids = s.execute(select(Product.id).where(Product.qty_on_hand > 0)).scalars().all()
+
+    def reports(factory, stop, counter):
+        while not stop.is_set():
+            with factory() as s:
+                get_sales_summary(s, start, end)
+                get_top_sellers(s, start, end)
+            counter.append(1)
+
+    def time_checkouts(n):
+        out = []
+        for i in range(n):
+            t0 = time.perf_counter()
+            with SessionLocal() as s:
+                checkout(s, [{"product_id": pids[i % len(pids)], "qty": 1}], None, "cash", 0)
+                s.rollback()
+            out.append((time.perf_counter() - t0) * 1000)
+        return out
+
+    print(f"{'scenario':28} {'median ms':>10} {'p95 ms':>10} {'max ms':>10} {'reports':>8}")
+    for label, factory in (("idle", None), ("reports on primary", SessionLocal),
+                           ("reports on replica", ReadSessionLocal)):
+        stop, done = threading.Event(), []
+        threads = [threading.Thread(target=reports, args=(factory, stop, done)) for _ in range(args.readers)] \
+            if factory else []
+        for t in threads:
+            t.start()
+        time.sleep(0.5 if threads else 0)
+        lat = sorted(time_checkouts(args.checkouts))
+        stop.set()
+        for t in threads:
+            t.join()
+        p95 = lat[int(0.95 * (len(lat) - 1))]
+        print(f"{label:28} {statistics.median(lat):10.2f} {p95:10.2f} {lat[-1]:10.2f} {len(done):8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Benchmark suite for the shop's hot paths, with JSON output.
+
+Generates a deterministic dataset (utils/synthetic.py) in a throwaway SQLite
+DB, times each case `--repeat` times and prints median / p95 / min in ms.
+Write results with --out and compare two commits with --compare:
+
+    python benchmarks/run.py --out before.json
+    git checkout my-branch
+    python benchmarks/run.py --out after.json --compare before.json
+    python benchmarks/run.py --products 50000 --sales 1000000 --only summary
+
+Cases that write (imports, checkout) run inside a transaction that is rolled
+back, so every repeat sees the same data. Times include the DB round-trips.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _stats(timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))]
+    return {"median_ms": statistics.median(timings), "p95_ms": p95, "min_ms": timings[0], "n": len(timings)}
+
+
+def build_cases(args):
+    """name -> (setup() -> state, run(state)); everything resolved lazily after DB_URL is set."""
+    import numpy as np
+    import pandas as pd
+    from sqlalchemy import text
+    from db import SessionLocal, IST
+    from utils import synthetic as syn
+    from utils.db_helpers import get_stock_summary, get_sales_summary, get_top_sellers, lookup_imeis, get_emis_due
+    from utils.bulk_import import import_stock_frame, resolve_sale_frame
+    from utils.fuzzy import NameMatcher
+    from utils.scanning import extract_imeis_from_text, rank_imeis
+
+    rng = np.random.default_rng(args.seed + 1)
+    start = IST.localize(syn.START)
+    day = start + datetime.timedelta(days=int(rng.integers(30, args.days - 30)))
+    month = (day.replace(day=1), (day.replace(day=1) + datetime.timedelta(days=32)).replace(day=1))
+    # a range that does not sit on IST midnights, so the summaries take the raw-table path
+    ragged = (day + datetime.timedelta(hours=9), day + datetime.timedelta(days=6, hours=18))
+
+    def pid(n):
+        return [int(i) for i in rng.integers(1, args.products + 1, size=n)]
+
+    def stock_frame(n):
+        ids = pid(n)
+        known = rng.random(n) < 0.7  # the rest are new products
+        return pd.DataFrame({
+            "name": [syn.product_name(i) if k else f"New Model {i}-{j}" for j, (i, k) in enumerate(zip(ids, known))],
+            "sku": [syn.product_sku(i) if k else None for i, k in zip(ids, known)],
+            "category": ["phone" if syn.is_phone(i) else "accessory" for i in ids],
+            "price": rng.integers(100, 50000, size=n),
+            "qty": rng.integers(1, 10, size=n),
+            "imei": [syn.product_imei(i) if k else None for i, k in zip(ids, known)],
+        })
+
+    def sale_frame(n):
+        ids = pid(n)
+        how = rng.integers(0, 3, size=n)  # 0 imei, 1 sku, 2 name
+        return pd.DataFrame({
+            "imei": [syn.product_imei(i) if h == 0 else None for i, h in zip(ids, how)],
+            "sku": [syn.product_sku(i) if h == 1 else None for i, h in zip(ids, how)],
+            "name": [syn.product_name(i) if h == 2 else None for i, h in zip(ids, how)],
+            "qty": 1,
+            "price": None,
+        })
+
+    def lookup_probe(n=20):
+        n_items = max(1, int(args.sales * 1.6))
+        sold = [syn.item_imei(int(i)) for i in rng.integers(1, n_items, size=n // 2)]
+        stock = [syn.product_imei(int(i)) for i in pid(n) if syn.is_phone(i)][: n // 4]
+        missing = [syn.item_imei(10**12 + k) for k in range(n - len(sold) - len(stock))]
+        return sold + stock + missing
+
+    def with_session(fn):
+        def setup():
+            return SessionLocal()
+
+        def run(session):
+            try:
+                return fn(session)
+            finally:
+                session.rollback()
+        return setup, run
+
+    texts = [syn.bill_text([syn.item_imei(3 * k + j) for j in range(3)], noise_lines=60, seed=k) for k in range(20)]
+    big_text = "\n".join(syn.bill_text([syn.item_imei(k)], noise_lines=40, seed=k) for k in range(200))
+    imports = stock_frame(args.import_rows)
+    sale_upload = sale_frame(args.import_rows)
+    probe = lookup_probe()
+    with SessionLocal() as session:
+        matcher = NameMatcher.from_session(session)
+    fuzzy_names = pd.Series([
+        syn.product_name(i).replace(" ", "", 1) + (" (new)" if i % 3 == 0 else "") for i in pid(args.import_rows)
+    ])
+
+    def checkout_case(session):
+        from utils.checkout import checkout
+        rows = session.execute(
+            text("SELECT id, sell_price FROM products WHERE qty_on_hand > 2 LIMIT 3")
+        ).all()
+        cart = [{"product_id": r[0], "name": f"p{r[0]}", "qty": 1, "unit_price": float(r[1]),
+                 "imei": None} for r in rows]
+        checkout(session, cart, None, "cash", sum(c["unit_price"] for c in cart), customer_phone="9000000001")
+
+    def search_setup():
+        from utils.catalog import _load_catalog
+        from utils.product_search import ProductSearchIndex
+        return ProductSearchIndex(_load_catalog.__wrapped__(None))
+
+    def search_run(index):
+        for q in ("sam", "redmi note", "128gb blue", "charger", syn.product_sku(7), syn.product_imei(3)):
+            index.search(q)
+
+    def fulltext_run(session):
+        from utils.search import search
+        for q in (f"Customer {args.customers // 3}", "+91 " + syn.customer_phone(11)[-10:],
+                  syn.item_imei(probe_item)[-6:], syn.item_imei(probe_item), "redmi 128gb", "charger"):
+            search(session, q)
+
+    probe_item = int(rng.integers(1, max(2, args.sales)))
+
+    def phone_lookup(session):
+        from utils.phones import suggest, history
+        for typed in ("900", syn.customer_phone(args.customers // 2)[:7], syn.customer_phone(args.customers // 2)):
+            hits = suggest(session, typed)
+        if hits:
+            history(session, hits[0]["id"])
+
+    def search_build_setup():
+        from utils.catalog import _load_catalog
+        return _load_catalog.__wrapped__(None)
+
+    def search_build(catalog):
+        from utils.product_search import ProductSearchIndex
+        ProductSearchIndex(catalog)
+
+    return {
+        "summary.stock": with_session(get_stock_summary),
+        "summary.sales_day_rollup": with_session(lambda s: get_sales_summary(s, day, day + datetime.timedelta(days=1))),
+        "summary.sales_month_rollup": with_session(lambda s: get_sales_summary(s, *month)),
+        "summary.sales_ragged_raw": with_session(lambda s: get_sales_summary(s, *ragged)),
+        "summary.top_sellers_month": with_session(lambda s: get_top_sellers(s, *month)),
+        "summary.top_sellers_ragged_raw": with_session(lambda s: get_top_sellers(s, *ragged)),
+        "summary.emis_due_30d_page": with_session(
+            lambda s: get_emis_due(s, day, day + datetime.timedelta(days=30), limit=50)),
+        "import.stock_frame": with_session(lambda s: import_stock_frame(s, imports, None, matcher)),
+        "import.sale_frame": with_session(lambda s: resolve_sale_frame(s, sale_upload, matcher)),
+        "import.fuzzy_names": (lambda: fuzzy_names, matcher.best),
+        "import.build_name_matcher": with_session(NameMatcher.from_session),
+        "billscan.lookup_imeis_20": with_session(lambda s: lookup_imeis(s, probe)),
+        "billscan.extract_imeis_x20": (lambda: texts, lambda t: [extract_imeis_from_text(x) for x in t]),
+        "billscan.rank_imeis_big_text": (lambda: big_text, rank_imeis),
+        "search.build_index": (search_build_setup, search_build),
+        "search.queries_x6": (search_setup, search_run),
+        "search.fulltext_x6": with_session(fulltext_run),
+        "checkout.phone_suggest_x3": with_session(phone_lookup),
+        "checkout.three_lines": with_session(checkout_case),
+    }
+
+
+def run_cases(cases, repeat, warmup=1):
+    results = {}
+    for name, (setup, run) in cases.items():
+        state = setup()
+        try:
+            for _ in range(warmup):
+                run(state)
+            timings = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                run(state)
+                timings.append((time.perf_counter() - t0) * 1000)
+        finally:
+            if hasattr(state, "close"):
+                state.close()
+        results[name] = _stats(timings)
+        r = results[name]
+        print(f"{name:34} {r['median_ms']:10.2f} {r['p95_ms']:10.2f} {r['min_ms']:10.2f}")
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        base = json.load(f)
+    print(f"\nvs {baseline_path} ({base['meta'].get('commit')}), median ms:")
+    print(f"{'case':34} {'before':>10} {'after':>10} {'ratio':>7}")
+    for name, r in results.items():
+        b = base["results"].get(name)
+        if not b:
+            print(f"{name:34} {'-':>10} {r['median_ms']:10.2f}")
+            continue
+        ratio = r["median_ms"] / b["median_ms"] if b["median_ms"] else float("inf")
+        flag = "  slower" if ratio > 1.2 else ("  faster" if ratio < 0.8 else "")
+        print(f"{name:34} {b['median_ms']:10.2f} {r['median_ms']:10.2f} {ratio:6.2f}x{flag}")
+    if base["meta"].get("scale") != {k: v for k, v in vars(ARGS).items() if k in SCALE_KEYS}:
+        print("note: baseline was generated at a different scale/seed")
+
+
+SCALE_KEYS = ("products", "customers", "sales", "days", "seed", "import_rows")
+ARGS = None
+
+
+def main(argv=None):
+    global ARGS
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="database URL (default: temp SQLite file); must be empty or generated earlier")
+    ap.add_argument("--products", type=int, default=5000)
+    ap.add_argument("--customers", type=int, default=20000)
+    ap.add_argument("--sales", type=int, default=100000)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--import-rows", type=int, default=1000)
+    ap.add_argument("--repeat", type=int, default=15)
+    ap.add_argument("--only", help="run cases whose name contains this text")
+    ap.add_argument("--no-generate", action="store_true", help="--url already holds generated data")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--compare", help="baseline results JSON to compare against")
+    ARGS = args = ap.parse_args(argv)
+
+    if not args.url:
+        args.url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="shopbench-"), "bench.db")
+    os.environ["DB_URL"] = args.url
+
+    import numpy as np
+    import pandas as pd
+    import sqlalchemy
+    from db import Base, engine
+    from migrations import run_migrations
+    from utils.synthetic import generate
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    gen_s = None
+    if not args.no_generate:
+        t0 = time.perf_counter()
+        counts = generate(engine, args.products, args.customers, args.sales, args.seed, days=args.days)
+        gen_s = time.perf_counter() - t0
+        print(f"generated {counts['sales']} sales / {counts['sale_items']} items in {gen_s:.1f}s")
+
+    cases = build_cases(args)
+    if args.only:
+        cases = {k: v for k, v in cases.items() if args.only in k}
+    print(f"\n{'case':34} {'median ms':>10} {'p95 ms':>10} {'min ms':>10}")
+    results = run_cases(cases, args.repeat)
+
+    meta = {
+        "commit": _git_commit(),
+        "at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "db": engine.dialect.name,
+        "sqlite": engine.dialect.dbapi.sqlite_version if engine.dialect.name == "sqlite" else None,
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "scale": {k: getattr(args, k) for k in SCALE_KEYS},
+        "repeat": args.repeat,
+        "generate_s": gen_s,
+    }
+    if args.compare:
+        compare(results, args.compare)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"\nresults -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
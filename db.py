@@ -4,17 +4,27 @@ Database models & session setup.
 - Uses Streamlit secrets if available: st.secrets["db"]["url"]
 - Else uses environment variable DB_URL
 - Else falls back to local SQLite (for dev only)
+- Pool settings: [db] pool_size / max_overflow / pool_timeout / pool_recycle /
+  pool_pre_ping in secrets, or DB_POOL_SIZE etc. in the environment
+- Optional read replica: [db] read_url (DB_READ_URL) gets its own engine and
+  pool for report reads (get_read_session); read_max_lag_seconds and
+  read_fallback control when reads fall back to the primary
 
 Auto-seeds admin user + demo data when empty.
 """
 import os
+import contextlib
+import contextvars
 import datetime
+import itertools
+import threading
+import time
 import pytz
 import streamlit as st
 
 from sqlalchemy import (
-    create_engine, Column, Integer, String, DateTime, Float, Boolean,
-    ForeignKey, Text, Numeric
+    create_engine, Column, Integer, String, DateTime, Date, Float, Boolean,
+    ForeignKey, Text, Numeric, Index, event
 )
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
 from passlib.hash import bcrypt
@@ -38,10 +48,185 @@ def _get_db_url():
     # 3. Fallback to local sqlite (dev only)
     return "sqlite:///data/shop.db"
 
+def _get_db_setting(name, default):
+    """st.secrets["db"][name], else env DB_<NAME>, else default (cast to default's type)."""
+    value = None
+    try:
+        value = st.secrets["db"][name]
+    except Exception:
+        value = os.getenv(f"DB_{name.upper()}")
+    if value is None:
+        return default
+    if isinstance(default, bool):
+        return str(value).strip().lower() in ("1", "true", "yes", "on")
+    return type(default)(value)
+
+
+def _engine_kwargs(url):
+    """Pool settings (secrets/env overridable); SQLite gets thread-safe connect args."""
+    kwargs = {
+        "pool_pre_ping": _get_db_setting("pool_pre_ping", True),
+        "pool_recycle": _get_db_setting("pool_recycle", 1800),
+    }
+    if url.startswith("sqlite"):
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in url or url.rstrip("/") == "sqlite:":
+            return kwargs
+    kwargs.update(
+        pool_size=_get_db_setting("pool_size", 5),
+        max_overflow=_get_db_setting("max_overflow", 5),
+        pool_timeout=_get_db_setting("pool_timeout", 30),
+    )
+    return kwargs
+
+
+def _sqlite_pragmas(dbapi_conn, connection_record):
+    """WAL lets readers run alongside the single writer; busy_timeout waits for locks."""
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute(f"PRAGMA busy_timeout={_get_db_setting('sqlite_busy_timeout_ms', 5000)}")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA cache_size=-20000")
+    cur.close()
+
+
 DB_URL = _get_db_url()
-engine = create_engine(DB_URL, connect_args={} if not DB_URL.startswith("sqlite") else {"check_same_thread": False})
+engine = create_engine(DB_URL, **_engine_kwargs(DB_URL))
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _sqlite_pragmas)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
+_current_session = contextvars.ContextVar("db_session", default=None)
+
+
+@contextlib.contextmanager
+def session_scope():
+    """
+    One session per Streamlit rerun. app.py opens it around the page; nested
+    scopes reuse it. It is always closed (connection back to the pool), also
+    when st.rerun()/st.stop() unwind the script; uncommitted work is rolled back.
+    """
+    current = _current_session.get()
+    if current is not None:
+        yield current
+        return
+    session = SessionLocal()
+    token = _current_session.set(session)
+    try:
+        yield session
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
+        _current_session.reset(token)
+        session.close()
+
+
+def get_session():
+    """The session of the enclosing session_scope()."""
+    session = _current_session.get()
+    if session is None:
+        raise RuntimeError("get_session() called outside session_scope()")
+    return session
+
+
+# ------------------------------------------------------------------
+# Read replica
+# ------------------------------------------------------------------
+# Reports (dashboard, EMI tracker, bill lookups, exports) read through
+# get_read_session() / read_engine_for_reports(). With no read_url these are
+# the primary. With one, reads go to the replica while it answers and lags
+# at most read_max_lag_seconds; otherwise they fall back to the primary,
+# unless read_fallback is off (then the replica is used regardless).
+READ_URL = _get_db_setting("read_url", "")
+READ_MAX_LAG_SECONDS = _get_db_setting("read_max_lag_seconds", 30.0)
+READ_FALLBACK = _get_db_setting("read_fallback", True)
+READ_CHECK_SECONDS = 5.0
+
+if READ_URL:
+    read_engine = create_engine(READ_URL, **_engine_kwargs(READ_URL))
+    if read_engine.dialect.name == "sqlite":
+        event.listen(read_engine, "connect", _sqlite_pragmas)
+else:
+    read_engine = engine
+ReadSessionLocal = sessionmaker(bind=read_engine, autocommit=False, autoflush=False)
+
+_current_read_session = contextvars.ContextVar("db_read_session", default=None)
+_replica_state = {"ok": READ_URL == "", "lag_s": 0.0, "error": None, "checked": 0.0}
+_replica_lock = threading.Lock()
+
+_PG_LAG_SQL = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def _replica_lag(conn):
+    """Seconds the replica is behind (0 when caught up or not measurable)."""
+    if conn.dialect.name != "postgresql":
+        return 0.0
+    return float(conn.exec_driver_sql(_PG_LAG_SQL).scalar() or 0)
+
+
+def replica_status():
+    """{"ok", "lag_s", "error"} of the read replica, re-checked every READ_CHECK_SECONDS."""
+    if not READ_URL:
+        return dict(_replica_state)
+    now = time.monotonic()
+    with _replica_lock:
+        if now - _replica_state["checked"] >= READ_CHECK_SECONDS:
+            try:
+                with read_engine.connect() as conn:
+                    lag = _replica_lag(conn)
+                _replica_state.update(lag_s=lag, ok=lag <= READ_MAX_LAG_SECONDS,
+                                      error=None if lag <= READ_MAX_LAG_SECONDS else "lagging")
+            except Exception as e:
+                _replica_state.update(ok=False, lag_s=None, error=f"{type(e).__name__}: {str(e).splitlines()[0]}")
+            _replica_state["checked"] = now
+        return dict(_replica_state)
+
+
+def use_replica():
+    """True when reads should go to the replica right now."""
+    return bool(READ_URL) and (not READ_FALLBACK or replica_status()["ok"])
+
+
+def read_engine_for_reports():
+    """Engine for long read-only scans (exports): replica when usable, else primary."""
+    return read_engine if use_replica() else engine
+
+
+@contextlib.contextmanager
+def read_session_scope():
+    """
+    Companion of session_scope() for report reads; app.py opens both per
+    rerun. The replica session connects only when a page reads from it.
+    """
+    if not READ_URL or _current_read_session.get() is not None:
+        yield
+        return
+    session = ReadSessionLocal()
+    token = _current_read_session.set(session)
+    try:
+        yield
+    finally:
+        _current_read_session.reset(token)
+        session.close()
+
+
+def get_read_session():
+    """
+    Session for read-only queries: the replica's (inside read_session_scope)
+    when use_replica(), else the rerun's primary session. Never write to it.
+    """
+    if use_replica():
+        session = _current_read_session.get()
+        if session is not None:
+            return session
+    return get_session()
+
 
 # ------------------------------------------------------------------
 # Models
@@ -62,9 +247,9 @@ class User(Base):
 class Product(Base):
     __tablename__ = "products"
     id = Column(Integer, primary_key=True)
-    sku = Column(String(64))
+    sku = Column(String(64), index=True)
     imei = Column(String(32), unique=True, nullable=True)
-    name = Column(String(255), nullable=False)
+    name = Column(String(255), nullable=False, index=True)
     category = Column(String(64), default="phone")  # phone/accessory/service
     cost_price = Column(Numeric(12,2), default=0)
     sell_price = Column(Numeric(12,2), default=0)
@@ -88,7 +273,8 @@ class Customer(Base):
     __tablename__ = "customers"
     id = Column(Integer, primary_key=True)
     full_name = Column(String(255))
-    phone = Column(String(32))
+    phone = Column(String(32), index=True)  # as entered
+    phone_e164 = Column(String(16), index=True, unique=True)  # canonical (utils/phones.py); NULL if unparseable
     email = Column(String(255))
     govt_id = Column(String(64))
     notes = Column(Text)
@@ -97,14 +283,18 @@ class Customer(Base):
 
 class Sale(Base):
     __tablename__ = "sales"
+    __table_args__ = (
+        Index("ix_sales_payment_type_sale_datetime", "payment_type", "sale_datetime"),
+    )
     id = Column(Integer, primary_key=True)
-    sale_datetime = Column(DateTime, default=lambda: datetime.datetime.now(IST))
+    sale_datetime = Column(DateTime, default=lambda: datetime.datetime.now(IST), index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    customer_id = Column(Integer, ForeignKey("customers.id"))
+    customer_id = Column(Integer, ForeignKey("customers.id"), index=True)
     payment_type = Column(String(16), default="cash")  # cash/emi
     total_amount = Column(Numeric(12,2), default=0)
     notes = Column(Text)
     bill_image_path = Column(String(255))
+    client_ref = Column(String(36), index=True, unique=True, nullable=True)  # offline queue id; replay guard
     user = relationship("User", back_populates="sales")
     customer = relationship("Customer", back_populates="sales")
     items = relationship("SaleItem", back_populates="sale", cascade="all, delete-orphan")
@@ -114,9 +304,9 @@ class Sale(Base):
 class SaleItem(Base):
     __tablename__ = "sale_items"
     id = Column(Integer, primary_key=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
-    imei = Column(String(32))
+    sale_id = Column(Integer, ForeignKey("sales.id"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
+    imei = Column(String(32), index=True)
     qty = Column(Integer, default=1)
     unit_price = Column(Numeric(12,2), default=0)
     line_total = Column(Numeric(12,2), default=0)
@@ -127,14 +317,16 @@ class SaleItem(Base):
 class EmiDetail(Base):
     __tablename__ = "emi_details"
     id = Column(Integer, primary_key=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"))
+    sale_id = Column(Integer, ForeignKey("sales.id"), index=True)
     company_id = Column(Integer, ForeignKey("companies.id"))
     down_payment = Column(Numeric(12,2), default=0)
     financed_amount = Column(Numeric(12,2), default=0)
     tenure_months = Column(Integer, default=0)
     interest_rate = Column(Float, default=0.0)
     emi_amount = Column(Numeric(12,2), default=0)
-    next_due_date = Column(DateTime, nullable=True)
+    next_due_date = Column(DateTime, nullable=True, index=True)  # NULL once fully repaid
+    first_due_date = Column(DateTime, nullable=True)  # anchor for monthly due dates
+    remaining_installments = Column(Integer, nullable=True)  # incl. the one at next_due_date
     sale = relationship("Sale", back_populates="emi_detail")
     company = relationship("Company", back_populates="emi_details")
 
@@ -142,22 +334,149 @@ class EmiDetail(Base):
 class StockMovement(Base):
     __tablename__ = "stock_movements"
     id = Column(Integer, primary_key=True)
-    product_id = Column(Integer, ForeignKey("products.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     change_qty = Column(Integer, default=0)
     reason = Column(String(64))  # purchase/sale/adjustment/return
     ref_sale_id = Column(Integer, ForeignKey("sales.id"), nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    timestamp = Column(DateTime, default=lambda: datetime.datetime.now(IST))
+    timestamp = Column(DateTime, default=lambda: datetime.datetime.now(IST), index=True)
     product = relationship("Product", back_populates="stock_movements")
 
 
+class DailySalesRollup(Base):
+    """Per IST day / payment type / product sales totals (see utils/rollup.py).
+
+    product_id 0 holds the sale-level row: sale_count and amount = sum(Sale.total_amount).
+    Product rows hold units and amount = sum(SaleItem.line_total).
+    """
+    __tablename__ = "daily_sales_rollup"
+    day = Column(Date, primary_key=True)
+    payment_type = Column(String(16), primary_key=True)
+    product_id = Column(Integer, primary_key=True, autoincrement=False)
+    sale_count = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    amount = Column(Numeric(14,2), nullable=False, default=0)
+
+
+class BillJob(Base):
+    """Queued bill scan (see utils/bill_jobs.py)."""
+    __tablename__ = "bill_jobs"
+    id = Column(Integer, primary_key=True)
+    batch_id = Column(String(36), index=True)
+    file_name = Column(String(255))
+    stored_path = Column(String(255))
+    status = Column(String(16), nullable=False, default="queued", index=True)  # queued/running/done/failed
+    imeis = Column(Text)  # comma-separated, best first
+    result = Column(Text)  # JSON lookup rows
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=True)
+    error = Column(Text)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(IST))
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class StockSnapshot(Base):
+    """Ledger checkpoint: sums every stock movement with timestamp < taken_at
+    (see utils/stock_ledger.py). Products at 0 have no item row."""
+    __tablename__ = "stock_snapshots"
+    id = Column(Integer, primary_key=True)
+    taken_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=lambda: datetime.datetime.now(IST))
+    items = relationship("StockSnapshotItem", cascade="all, delete-orphan")
+
+
+class StockSnapshotItem(Base):
+    __tablename__ = "stock_snapshot_items"
+    snapshot_id = Column(Integer, ForeignKey("stock_snapshots.id"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    qty = Column(Integer, nullable=False, default=0)
+
+
+class JobRun(Base):
+    """Last run + watermark of a scheduled batch job (see utils/jobs.py)."""
+    __tablename__ = "job_runs"
+    name = Column(String(64), primary_key=True)
+    watermark = Column(DateTime)  # cutoff the last successful run processed up to
+    last_started_at = Column(DateTime)
+    last_finished_at = Column(DateTime)
+    last_rows = Column(Integer, default=0)
+    last_error = Column(Text)
+
+
+class SearchDocument(Base):
+    """Denormalized searchable text per sale / customer (utils/search.py)."""
+    __tablename__ = "search_documents"
+    __table_args__ = (
+        Index("ix_search_documents_kind_ref_id", "kind", "ref_id", unique=True),
+    )
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(16), nullable=False)  # sale/customer
+    ref_id = Column(Integer, nullable=False)  # sales.id / customers.id
+    sold_at = Column(DateTime)  # NULL for customers
+    customer = Column(String(255))
+    phone = Column(String(32))  # normalized digits
+    body = Column(Text, nullable=False)  # the indexed text
+
+
+# ------------------------------------------------------------------
+# Stock version
+# ------------------------------------------------------------------
+# Monotonic counter bumped after every commit that wrote Product or
+# StockMovement rows (ORM objects or bulk insert/update statements).
+# Caches of stock data (utils/catalog.py) key on it.
+_stock_version = 0
+_stock_version_lock = threading.Lock()
+_STOCK_TABLES = {"products", "stock_movements"}
+
+
+def stock_version() -> int:
+    return _stock_version
+
+
+def bump_stock_version() -> int:
+    global _stock_version
+    with _stock_version_lock:
+        _stock_version += 1
+        return _stock_version
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _flag_stock_flush(session, flush_context):
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, (Product, StockMovement)):
+            session.info["stock_dirty"] = True
+            return
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _flag_stock_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if getattr(table, "name", None) in _STOCK_TABLES:
+            orm_execute_state.session.info["stock_dirty"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _bump_on_commit(session):
+    if session.info.pop("stock_dirty", False):
+        bump_stock_version()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _clear_on_rollback(session):
+    session.info.pop("stock_dirty", None)
+
+
 # ------------------------------------------------------------------
 # Init & seed
 # ------------------------------------------------------------------
 def init_db():
-    """Create tables & seed admin if missing."""
+    """Create tables, apply pending migrations & seed admin if missing."""
+    from migrations import run_migrations
     # Ensure schema exists
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     seed_admin_if_empty()
 
 
@@ -176,11 +495,17 @@ def seed_admin_if_empty():
             )
             session.add(admin_user)
             # sample stock
-            session.add_all([
+            demo_products = [
                 Product(sku="MOB001", imei="123456789012345", name="Demo Phone A", category="phone", cost_price=10000, sell_price=12000, qty_on_hand=5),
                 Product(sku="MOB002", imei="123456789012346", name="Demo Phone B", category="phone", cost_price=15000, sell_price=18000, qty_on_hand=3),
                 Product(sku="ACC001", name="Fast Charger", category="accessory", cost_price=500, sell_price=800, qty_on_hand=20),
                 Product(sku="ACC002", name="Screen Protector", category="accessory", cost_price=50, sell_price=150, qty_on_hand=100),
+            ]
+            session.add_all(demo_products)
+            # opening stock goes through the ledger like any purchase
+            session.add_all([
+                StockMovement(product=p, change_qty=p.qty_on_hand, reason="purchase")
+                for p in demo_products
             ])
             session.add_all([
                 Company(company_name="Bajaj Finance", company_type="NBFC"),
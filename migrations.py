@@ -0,0 +1,153 @@
+"""
+Lightweight versioned schema migrations.
+
+`Base.metadata.create_all` only creates missing tables, so anything added to
+an existing table (indexes, columns, backfills) is a numbered step here.
+Applied versions are recorded in `schema_migrations`; `init_db()` runs the
+pending ones in order, each in its own transaction. Steps must work on both
+SQLite and PostgreSQL.
+
+Steps spell out their indexes and column types instead of reading the
+current models, so a later model change never alters what an old step
+does to a database that has not run it yet.
+"""
+import datetime
+
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, select, insert, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from db import IST
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255)),
+    Column("applied_at", DateTime),
+)
+
+MIGRATIONS = []  # (version, description, fn(conn)), kept sorted by version
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def create_indexes(conn, *indexes):
+    """Create fixed (name, table, columns, unique) index definitions if missing."""
+    for name, table, columns, unique in indexes:
+        conn.execute(text(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} "
+            f"ON {table} ({', '.join(columns)})"
+        ))
+
+
+def add_columns(conn, table_name, **column_types):
+    """ALTER TABLE ... ADD COLUMN for the given name=type columns the table lacks."""
+    existing = {c["name"] for c in inspect(conn).get_columns(table_name)}
+    for name, col_type in column_types.items():
+        if name not in existing:
+            conn.execute(text(
+                f"ALTER TABLE {table_name} ADD COLUMN {name} {col_type.compile(dialect=conn.dialect)}"
+            ))
+
+
+def applied_versions(engine):
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def run_migrations(engine):
+    """Apply pending migrations; returns the list of versions applied."""
+    _meta.create_all(bind=engine)
+    done = applied_versions(engine)
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            with engine.begin() as conn:
+                fn(conn)
+                conn.execute(insert(schema_migrations).values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.datetime.now(IST),
+                ))
+        except IntegrityError:
+            # another process applied it concurrently
+            continue
+        applied.append(version)
+    return applied
+
+
+# ------------------------------------------------------------------
+# Migrations
+# ------------------------------------------------------------------
+@migration(1, "indexes on hot lookup columns")
+def _m0001_hot_indexes(conn):
+    create_indexes(
+        conn,
+        ("ix_products_sku", "products", ["sku"], False),
+        ("ix_products_name", "products", ["name"], False),
+        ("ix_customers_phone", "customers", ["phone"], False),
+        ("ix_sales_sale_datetime", "sales", ["sale_datetime"], False),
+        ("ix_sales_payment_type_sale_datetime", "sales", ["payment_type", "sale_datetime"], False),
+        ("ix_sale_items_sale_id", "sale_items", ["sale_id"], False),
+        ("ix_sale_items_product_id", "sale_items", ["product_id"], False),
+        ("ix_sale_items_imei", "sale_items", ["imei"], False),
+        ("ix_emi_details_sale_id", "emi_details", ["sale_id"], False),
+        ("ix_emi_details_next_due_date", "emi_details", ["next_due_date"], False),
+        ("ix_stock_movements_product_id", "stock_movements", ["product_id"], False),
+    )
+
+
+@migration(2, "backfill daily_sales_rollup")
+def _m0002_rollup_backfill(conn):
+    from utils.rollup import rebuild
+    rebuild(conn)
+
+
+@migration(3, "index on stock_movements.timestamp")
+def _m0003_movement_timestamp_index(conn):
+    create_indexes(conn, ("ix_stock_movements_timestamp", "stock_movements", ["timestamp"], False))
+
+
+@migration(4, "emi_details.first_due_date / remaining_installments")
+def _m0004_emi_installments(conn):
+    add_columns(conn, "emi_details", first_due_date=DateTime(), remaining_installments=Integer())
+    # due dates never advanced before this, so nothing has been rolled over yet
+    conn.execute(text(
+        "UPDATE emi_details SET first_due_date = next_due_date, "
+        "remaining_installments = tenure_months "
+        "WHERE remaining_installments IS NULL"
+    ))
+
+
+@migration(5, "sales.client_ref (offline queue replay guard)")
+def _m0005_sale_client_ref(conn):
+    add_columns(conn, "sales", client_ref=String(36))
+    create_indexes(conn, ("ix_sales_client_ref", "sales", ["client_ref"], True))
+
+
+@migration(6, "full-text search index (search_documents)")
+def _m0006_search_index(conn):
+    from utils.search import install, rebuild
+    install(conn)
+    rebuild(conn)
+
+
+@migration(7, "customers.phone_e164 (merge duplicate phones), index on sales.customer_id")
+def _m0007_customer_phone_e164(conn):
+    from utils.phones import merge_duplicates
+    add_columns(conn, "customers", phone_e164=String(16))
+    # duplicates must be merged before the unique index can exist
+    merge_duplicates(conn, full=True)
+    create_indexes(
+        conn,
+        ("ix_customers_phone_e164", "customers", ["phone_e164"], True),
+        ("ix_sales_customer_id", "sales", ["customer_id"], False),
+    )
@@ -1 +1 @@
-from . import dashboard, sales, inventory, emi_tracker, bill_scan, users
+# Page modules are imported on first visit by app.py (see PAGES there).
@@ -1,99 +1,126 @@
 import streamlit as st
 from auth import require_role
-from db import SessionLocal, SaleItem, Sale, Customer
-from utils.scanning import extract_imeis_from_file, extract_imeis_from_text
-import tempfile, io
-
-# OCR optional
-try:
-    import pytesseract
-    from PIL import Image
-    _HAS_TESS = True
-except Exception:
-    _HAS_TESS = False
-
-try:
-    from pdf2image import convert_from_bytes
-    _HAS_PDF2IMAGE = True
-except Exception:
-    _HAS_PDF2IMAGE = False
-
-
-def ocr_image_bytes(data: bytes) -> str:
-    if not _HAS_TESS:
-        return ""
-    try:
-        img = Image.open(io.BytesIO(data))
-        return pytesseract.image_to_string(img)
-    except Exception:
-        return ""
-
-def ocr_pdf_bytes(data: bytes) -> str:
-    if not (_HAS_TESS and _HAS_PDF2IMAGE):
-        return ""
-    try:
-        pages = convert_from_bytes(data)
-        txts = [pytesseract.image_to_string(p) for p in pages]
-        return "\n".join(txts)
-    except Exception:
-        return ""
+from db import get_session, get_read_session, session_scope
+from utils.db_helpers import lookup_imeis
+from utils.scanning import MIN_CONFIDENCE
+from utils.bill_jobs import (
+    extract_bill_text, rank_bill_imeis, expand_uploads, enqueue_bills, batch_progress,
+    start_bill_workers,
+)
+import json
+import pandas as pd
 
+BILL_WORKERS = 2
+
+
+@st.cache_resource
+def _bill_workers():
+    return start_bill_workers(BILL_WORKERS)
+
+
+def _lookup_table(user, rows):
+    df = pd.DataFrame(rows)
+    if user['role'] != 'admin' and 'Amount' in df.columns:
+        df = df.drop(columns=['Amount'])
+    return df
 
-def app():
-    user = require_role(["owner","admin","employee"])
-    st.title("Bill Scan / Lookup")
 
+def single_bill(user):
     uploaded = st.file_uploader("Upload Bill (Image/PDF/Text)", type=["jpg","jpeg","png","pdf","txt"])
     if not uploaded:
         return
 
-    data = uploaded.getbuffer()
-    extracted_text = ""
-    if uploaded.type == "text/plain":
-        extracted_text = data.decode("utf-8", errors="ignore")
-    elif uploaded.type in ("image/jpeg","image/png","image/jpg"):
-        extracted_text = ocr_image_bytes(data)
-    elif uploaded.type == "application/pdf":
-        extracted_text = ocr_pdf_bytes(data)
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix="."+uploaded.name.split(".")[-1]) as tmp:
-        tmp.write(data)
-        tmp_path = tmp.name
-
-    imeis = []
-    if extracted_text:
-        imeis = extract_imeis_from_text(extracted_text)
-    if not imeis:
-        imeis = extract_imeis_from_file(tmp_path)
+    data = uploaded.getvalue()
+    stop_early = False
+    if uploaded.name.lower().endswith(".pdf"):
+        stop_early = st.checkbox(
+            "Stop OCR once a page with IMEIs is found (faster for long bills)", value=False
+        )
+    with st.spinner("Reading bill..."):
+        extracted_text = extract_bill_text(uploaded.name, data, stop_on_imei=stop_early)
+    ranked = rank_bill_imeis(uploaded.name, data, extracted_text)
 
-    if not imeis:
+    if not ranked:
         st.warning("No IMEI found. Try clearer image or enter manually.")
         return
 
+    include_unverified = st.checkbox(
+        "Also look up numbers failing the IMEI check digit", value=False
+    )
+    imeis = [i for i, conf in ranked if include_unverified or conf >= MIN_CONFIDENCE]
+    skipped = [i for i, conf in ranked if conf < MIN_CONFIDENCE and i not in imeis]
+    if skipped:
+        st.caption(f"Ignored {len(skipped)} 15-digit number(s) failing the IMEI check digit.")
+    if not imeis:
+        st.warning("No valid IMEI found. Tick the box above to look up unverified numbers.")
+        return
+
     st.success(f"Found IMEI(s): {', '.join(imeis)}")
-    session = SessionLocal()
-    found_sales = []
-    for imei in imeis:
-        rows = (
-            session.query(SaleItem, Sale, Customer)
-            .join(SaleItem.sale)
-            .join(Sale.customer)
-            .filter(SaleItem.imei==imei)
-            .all()
-        )
-        for si, s, c in rows:
-            found_sales.append({
-                "SaleID": s.id,
-                "Customer": c.full_name,
-                "Phone": c.phone,
-                "Payment": s.payment_type,
-                "Amount": float(s.total_amount),
-                "IMEI": si.imei
-            })
-    session.close()
-
-    import pandas as pd
-    df = pd.DataFrame(found_sales)
-    if user['role'] != 'admin' and 'Amount' in df.columns:
-        df = df.drop(columns=['Amount'])
-    st.dataframe(df, use_container_width=True)
+    found_sales = lookup_imeis(get_read_session(), imeis)
+
+    st.dataframe(_lookup_table(user, found_sales), use_container_width=True)
+
+
+def batch_bills(user):
+    _bill_workers()
+    files = st.file_uploader(
+        "Upload Bills (multiple files or ZIP)",
+        type=["jpg","jpeg","png","pdf","txt","zip"],
+        accept_multiple_files=True,
+        key="bill_batch_files",
+    )
+    if files and st.button(f"Queue {len(files)} upload(s)", type="primary"):
+        batch_id, count = enqueue_bills(get_session(), expand_uploads(files), user_id=user["id"])
+        st.session_state.setdefault("bill_batches", []).insert(0, batch_id)
+        st.success(f"Queued {count} bill(s).")
+
+    batches = st.session_state.get("bill_batches", [])
+    if batches:
+        if batches[0] in st.session_state.get("bill_batches_done", set()):
+            _batch_status(user, batches[0])
+        else:
+            _batch_status_live(user, batches[0])
+
+
+@st.fragment(run_every=2)
+def _batch_status_live(user, batch_id):
+    """Polls while the batch is in progress; one full rerun when it completes."""
+    if _batch_status(user, batch_id):
+        st.session_state.setdefault("bill_batches_done", set()).add(batch_id)
+        st.rerun()
+
+
+def _batch_status(user, batch_id):
+    """Render batch progress; returns True once every job is done/failed."""
+    # fragment reruns run outside app.py's scope, so open one here if needed
+    with session_scope() as session:
+        counts, jobs = batch_progress(session, batch_id)
+        rows = [{
+            "File": j.file_name,
+            "Status": j.status,
+            "IMEIs": j.imeis or "",
+            "SaleID": j.sale_id,
+            "Error": j.error or "",
+        } for j in jobs]
+        results = [r for j in jobs if j.result for r in json.loads(j.result)]
+
+    total = sum(counts.values())
+    finished = counts.get("done", 0) + counts.get("failed", 0)
+    st.progress(finished / total if total else 0.0,
+                text=f"{finished}/{total} processed, {counts.get('failed', 0)} failed")
+    st.dataframe(pd.DataFrame(rows), use_container_width=True)
+    if results:
+        st.write("Matches:")
+        st.dataframe(_lookup_table(user, results), use_container_width=True)
+    return total > 0 and finished == total
+
+
+def app():
+    user = require_role(["owner","admin","employee"])
+    st.title("Bill Scan / Lookup")
+
+    tab_single, tab_batch = st.tabs(["Single Bill", "Batch Upload"])
+    with tab_single:
+        single_bill(user)
+    with tab_batch:
+        batch_bills(user)
@@ -2,7 +2,7 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from auth import require_login
-from db import SessionLocal
+from db import get_read_session
 from utils.dates import today_range_ist, IST
 from utils.db_helpers import get_stock_summary, get_sales_summary, get_top_sellers
 
@@ -20,7 +20,7 @@ def app():
     start_dt = datetime.combine(start_date, datetime.min.time(), tzinfo=IST)
     end_dt = datetime.combine(end_date, datetime.min.time(), tzinfo=IST) + pd.Timedelta(days=1)
 
-    session = SessionLocal()
+    session = get_read_session()
     units, value = get_stock_summary(session)
     total, cash, emi = get_sales_summary(session, start_dt, end_dt)
 
@@ -38,7 +38,6 @@ def app():
 
     st.subheader("Most Sold Models")
     rows = get_top_sellers(session, start_dt, end_dt, limit=10)
-    session.close()
 
     if rows:
         data = []
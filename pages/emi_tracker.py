@@ -1,44 +1,89 @@
 import streamlit as st
 from auth import require_role
-from db import SessionLocal, EmiDetail, Sale, Customer, Company
-from sqlalchemy.orm import joinedload
+from db import get_read_session
+from utils.dates import today_range_ist
+from utils.db_helpers import count_emis_due, get_emis_due
+from utils.emi import outstanding, schedule_frame
+import datetime
 import pandas as pd
 
+PAGE_SIZES = [25, 50, 100, 200]
+WINDOWS = ["Overdue", "Due today", "Next 7 days", "Next 30 days", "All upcoming", "All"]
+
+
+def _window(choice):
+    """[start, end) for a due-date window; None = open end."""
+    today, tomorrow = today_range_ist()
+    return {
+        "Overdue": (None, today),
+        "Due today": (today, tomorrow),
+        "Next 7 days": (today, today + datetime.timedelta(days=7)),
+        "Next 30 days": (today, today + datetime.timedelta(days=30)),
+        "All upcoming": (today, None),
+        "All": (None, None),
+    }[choice]
+
+
+def _installments_paid(df):
+    tenure = df["tenure_months"].fillna(0)
+    return (tenure - df["remaining_installments"].fillna(tenure)).clip(lower=0).astype(int)
+
+
 def app():
     user = require_role(["owner","admin","employee"])
     st.title("EMI Tracker")
 
-    session = SessionLocal()
-    rows = (
-        session.query(EmiDetail)
-        .options(joinedload(EmiDetail.sale).joinedload(Sale.customer),
-                 joinedload(EmiDetail.company))
-        .all()
-    )
-
-    data = []
-    for em in rows:
-        sale = em.sale
-        cust = sale.customer if sale else None
-        comp = em.company if em.company else None
-        row = {
-            "SaleID": sale.id if sale else None,
-            "Customer": cust.full_name if cust else None,
-            "Phone": cust.phone if cust else None,
-            "Company": comp.company_name if comp else None,
-            "Tenure": em.tenure_months,
-            "Next Due": em.next_due_date,
-        }
-        if user['role'] == 'admin':
-            row["DownPayment"] = float(em.down_payment or 0)
-            row["Financed"] = float(em.financed_amount or 0)
-            row["EMI"] = float(em.emi_amount or 0)
-            row["Interest%"] = em.interest_rate
-        data.append(row)
-    session.close()
-
-    if data:
-        df = pd.DataFrame(data)
-        st.dataframe(df, use_container_width=True)
-    else:
-        st.info("No EMI records.")
+    session = get_read_session()
+
+    c1, c2 = st.columns([3, 1])
+    window = c1.radio("Due", WINDOWS, index=3, horizontal=True)
+    page_size = c2.selectbox("Rows per page", PAGE_SIZES, index=1)
+    start, end = _window(window)
+
+    total = count_emis_due(session, start, end)
+    pages = max(1, -(-total // page_size))
+    if st.session_state.get("emi_page", 1) > pages:
+        st.session_state["emi_page"] = pages
+    page = c2.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key="emi_page")
+    rows = get_emis_due(session, start, end, limit=page_size, offset=(page - 1) * page_size)
+
+    if not rows:
+        st.info("No EMI records." if window == "All" else "No EMIs due in this window.")
+        return
+
+    df = pd.DataFrame(rows)
+    for col in ["down_payment", "financed_amount", "emi_amount", "interest_rate"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+    df["next_due_date"] = pd.to_datetime(df["next_due_date"])
+    paid = _installments_paid(df)
+    df["outstanding"] = outstanding(
+        df["financed_amount"].to_numpy(), df["interest_rate"].to_numpy(),
+        df["tenure_months"].fillna(1).to_numpy(), paid.to_numpy(),
+    ).round(2)
+
+    out = pd.DataFrame({
+        "SaleID": df["sale_id"],
+        "Customer": df["customer"],
+        "Phone": df["phone"],
+        "Company": df["company"],
+        "Tenure": df["tenure_months"],
+        "Left": df["remaining_installments"],
+        "Next Due": df["next_due_date"],
+    })
+    if user['role'] == 'admin':
+        out["DownPayment"] = df["down_payment"]
+        out["Financed"] = df["financed_amount"]
+        out["EMI"] = df["emi_amount"]
+        out["Interest%"] = df["interest_rate"]
+        out["Outstanding"] = df["outstanding"]
+    st.caption(f"{total} EMI(s) in window; showing {len(out)}.")
+    st.dataframe(out, use_container_width=True)
+
+    if user['role'] == 'admin':
+        with st.expander("Repayment Schedule"):
+            choice = st.selectbox("Sale", df["sale_id"].tolist(), key="emi_schedule_sale")
+            loan = df[df["sale_id"] == choice].iloc[0]
+            st.dataframe(
+                schedule_frame(loan["financed_amount"], loan["interest_rate"], int(loan["tenure_months"] or 1)),
+                use_container_width=True,
+            )
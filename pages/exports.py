@@ -0,0 +1,49 @@
+import streamlit as st
+from auth import require_role
+from utils.dates import today_range_ist
+from utils.exports import EXPORTS, FORMATS, day_range, export
+import os
+
+
+def _file_reader(path):
+    """Deferred download: the file is read only when the button is clicked."""
+    def read():
+        with open(path, "rb") as f:
+            return f.read()
+    return read
+
+
+def app():
+    require_role(["owner", "admin"])
+    st.title("Exports")
+    st.caption("Rows are streamed from the database to a file in chunks, so large ranges are fine.")
+
+    today, _ = today_range_ist()
+    with st.form("export_form"):
+        kind = st.selectbox("Data", list(EXPORTS), format_func=lambda k: EXPORTS[k][0])
+        dr = st.date_input("Date Range", (today.date().replace(day=1), today.date()))
+        fmt = st.radio("Format", list(FORMATS), horizontal=True, format_func=str.upper)
+        go = st.form_submit_button("Prepare Export", type="primary")
+
+    if go:
+        if isinstance(dr, tuple):
+            start_day, end_day = dr if len(dr) == 2 else (dr[0], dr[0])
+        else:
+            start_day = end_day = dr
+        start, end = day_range(start_day, end_day)
+        with st.spinner("Exporting..."):
+            path, rows = export(kind, start, end, fmt)
+        st.session_state["export_file"] = (path, rows, fmt)
+
+    last = st.session_state.get("export_file")
+    if last and os.path.exists(last[0]):
+        path, rows, fmt = last
+        size_mb = os.path.getsize(path) / 1e6
+        st.success(f"{rows:,} row(s), {size_mb:,.1f} MB.")
+        st.download_button(
+            f"Download {os.path.basename(path)}",
+            data=_file_reader(path),
+            file_name=os.path.basename(path),
+            mime=FORMATS[fmt],
+            on_click="ignore",
+        )
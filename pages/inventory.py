@@ -1,17 +1,47 @@
 import streamlit as st
 from auth import require_role
-from db import SessionLocal, Product, StockMovement
+from db import SessionLocal, get_session, Product, StockMovement, stock_version
+from utils.bulk_import import import_stock_frame, normalize_stock_frame, resolve_stock_rows
+from utils.catalog import get_catalog
+from utils.fuzzy import get_name_matcher
+from utils.stock_ledger import reconcile, stock_at, end_of_day
+import datetime
+import hashlib
+import io
 import pandas as pd
 
 REQUIRED_COLS = ["name", "sku", "category", "price", "qty"]
 OPTIONAL_COLS = ["imei"]
 
 
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def review_stock_file(digest, file_name, version, _data):
+    """
+    Parse an uploaded stock file and resolve it for the preview; memoized on
+    its content hash + stock version. Returns (frame, missing columns, rows
+    needing review).
+    """
+    if file_name.lower().endswith(".csv"):
+        df = pd.read_csv(io.BytesIO(_data))
+    else:
+        df = pd.read_excel(io.BytesIO(_data))
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    missing = [c for c in REQUIRED_COLS if c not in df.columns]
+    if missing:
+        return df, missing, None
+    session = SessionLocal()
+    try:
+        resolved = resolve_stock_rows(session, normalize_stock_frame(df), get_name_matcher())
+    finally:
+        session.close()
+    return df, missing, resolved[resolved["review"] != ""]
+
+
 def app():
     user = require_role(["owner", "admin", "employee"])
     st.title("Inventory")
 
-    session = SessionLocal()
+    session = get_session()
 
     # ------------------------------------------------------------------
     # Manual Add
@@ -76,116 +106,59 @@ def app():
     )
 
     if uploaded is not None:
+        data = uploaded.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
         try:
-            if uploaded.name.lower().endswith(".csv"):
-                df = pd.read_csv(uploaded)
-            else:
-                df = pd.read_excel(uploaded)
+            df, missing, review = review_stock_file(digest, uploaded.name, stock_version(), data)
         except Exception as e:
             st.error(f"Error reading file: {e}")
             df = None
 
         if df is not None:
-            df.columns = [c.strip().lower() for c in df.columns]
-            missing = [c for c in REQUIRED_COLS if c not in df.columns]
             if missing:
                 st.error(f"Missing required columns: {missing}")
             else:
                 st.write("Preview:")
                 st.dataframe(df.head(), use_container_width=True)
+                if not review.empty:
+                    fuzzy = int((review["match"] == "fuzzy").sum())
+                    st.warning(
+                        f"{fuzzy} row(s) will update a product with a similar name; "
+                        f"{len(review) - fuzzy} will be added although a similar product exists. "
+                        "Check them before importing."
+                    )
+                    st.dataframe(
+                        review[["name", "sku", "qty", "match", "review"]].rename(columns=str.title),
+                        use_container_width=True,
+                    )
                 if st.button("Import CSV/Excel Rows", type="primary", key="import_csv_btn"):
-                    added = 0
-                    updated = 0
-                    for _, row in df.iterrows():
-                        name = str(row.get("name", "")).strip()
-                        if not name:
-                            continue
-                        sku = str(row.get("sku") or "").strip() or None
-                        category = str(row.get("category") or "phone").strip() or "phone"
-                        price = float(row.get("price") or 0)
-                        qty = int(row.get("qty") or 0)
-                        imei = str(row.get("imei") or "").strip() or None
-
-                        prod = None
-                        if imei:
-                            prod = (
-                                session.query(Product)
-                                .filter(Product.imei == imei)
-                                .first()
-                            )
-                        if not prod and sku:
-                            prod = (
-                                session.query(Product)
-                                .filter(Product.sku == sku, Product.name == name)
-                                .first()
-                            )
-                        if not prod and name:
-                            prod = (
-                                session.query(Product)
-                                .filter(Product.name == name)
-                                .first()
-                            )
-
-                        if not prod:
-                            prod = Product(
-                                sku=sku,
-                                imei=imei,
-                                name=name,
-                                category=category,
-                                cost_price=price,
-                                sell_price=price,
-                                qty_on_hand=qty,
-                            )
-                            session.add(prod)
-                            session.flush()
-                            if qty:
-                                session.add(
-                                    StockMovement(
-                                        product=prod,
-                                        change_qty=qty,
-                                        reason="purchase",
-                                        user_id=user["id"],
-                                    )
-                                )
-                            added += 1
-                        else:
-                            prod.qty_on_hand += qty
-                            # set sell_price if not yet priced
-                            if price and float(prod.sell_price or 0) == 0:
-                                prod.sell_price = price
-                            session.add(
-                                StockMovement(
-                                    product=prod,
-                                    change_qty=qty,
-                                    reason="purchase",
-                                    user_id=user["id"],
-                                )
-                            )
-                            updated += 1
+                    added, updated, report = import_stock_frame(session, df, user["id"], get_name_matcher())
                     session.commit()
-                    st.success(f"Imported. Added {added}, updated {updated}.")
+                    st.session_state["inv_import_result"] = (added, updated, report)
                     st.rerun()
 
+    last_import = st.session_state.pop("inv_import_result", None)
+    if last_import:
+        added, updated, report = last_import
+        st.success(f"Imported. Added {added}, updated {updated}.")
+        with st.expander("Import details"):
+            st.dataframe(report, use_container_width=True)
+
     # ------------------------------------------------------------------
     # Inventory Table
     # ------------------------------------------------------------------
-    products = session.query(Product).order_by(Product.name).all()
-    if products:
-        df = pd.DataFrame(
-            [
-                {
-                    "ID": p.id,
-                    "SKU": p.sku,
-                    "IMEI": p.imei,
-                    "Name": p.name,
-                    "Category": p.category,
-                    "Cost": float(p.cost_price),
-                    "Sell": float(p.sell_price),
-                    "Qty": p.qty_on_hand,
-                }
-                for p in products
-            ]
-        )
+    catalog = get_catalog()
+    if not catalog.empty:
+        df = catalog.rename(columns={
+            "id": "ID",
+            "sku": "SKU",
+            "imei": "IMEI",
+            "name": "Name",
+            "category": "Category",
+            "cost_price": "Cost",
+            "sell_price": "Sell",
+            "qty_on_hand": "Qty",
+        })
         st.dataframe(df, use_container_width=True)
     else:
         st.info("No products.")
@@ -194,7 +167,10 @@ def app():
     # Adjust Stock
     # ------------------------------------------------------------------
     with st.expander("Adjust Stock"):
-        prod_options = {f"{p.name} (ID {p.id})": p.id for p in products}
+        prod_options = {
+            f"{name} (ID {pid})": int(pid)
+            for pid, name in zip(catalog["id"], catalog["name"])
+        }
         if prod_options:
             prod_choice = st.selectbox("Product", list(prod_options.keys()))
             adj_qty = st.number_input("Change Qty (+/-)", value=0, step=1)
@@ -216,4 +192,23 @@ def app():
         else:
             st.info("Add products first.")
 
-    session.close()
+    # ------------------------------------------------------------------
+    # Stock Ledger (owner/admin)
+    # ------------------------------------------------------------------
+    if user["role"] in ("owner", "admin"):
+        with st.expander("Stock Ledger"):
+            day = st.date_input("Stock at end of", value=datetime.date.today(), key="ledger_day")
+            if st.button("Show Stock On Date"):
+                qty = stock_at(session, end_of_day(day))
+                names = dict(zip(catalog["id"], catalog["name"]))
+                st.dataframe(pd.DataFrame(
+                    [{"ID": pid, "Name": names.get(pid), "Qty": q} for pid, q in sorted(qty.items()) if q]
+                ), use_container_width=True)
+            if st.button("Check Ledger Drift"):
+                report = reconcile(session)
+                if report.empty:
+                    st.success("Quantities match the stock movements.")
+                else:
+                    st.warning(f"{len(report)} product(s) differ from their stock movements.")
+                    st.dataframe(report, use_container_width=True)
+                    st.caption("Repair with: python -m utils.stock_ledger reconcile --repair ledger|stock")
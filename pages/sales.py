@@ -1,44 +1,115 @@
 import streamlit as st
 from auth import require_role
-from db import (
-    SessionLocal, Product, Company, Customer, Sale, SaleItem, EmiDetail, StockMovement, IST
-)
+from db import SessionLocal, get_session, Company, IST, stock_version
+from utils.bulk_import import resolve_sale_frame
+from utils.fuzzy import get_name_matcher
+from utils.checkout import checkout, StockShortError
+from utils.emi import emi_amount as emi_amount_for
+from utils.offline_queue import queue_mode, get_outbox
+from utils.phones import suggest, history, to_e164
+from utils.product_search import get_search_index, IMEI_QUERY_RE
 import datetime
+import hashlib
+import io
 import pandas as pd
+from sqlalchemy.exc import OperationalError
+
+SEARCH_TOP_K = 25
+HISTORY_ROWS = 5
+
+
+@st.cache_data(ttl=60, max_entries=32, show_spinner=False)
+def resolve_bulk_sale_file(digest, file_name, version, _data):
+    """Parse + resolve an uploaded sale file; memoized on its content hash + stock version."""
+    if file_name.lower().endswith(".csv"):
+        bulk_df = pd.read_csv(io.BytesIO(_data))
+    else:
+        bulk_df = pd.read_excel(io.BytesIO(_data))
+    session = SessionLocal()
+    try:
+        return resolve_sale_frame(session, bulk_df, get_name_matcher())
+    finally:
+        session.close()
+
+
+def _pick_customer():
+    choice = st.session_state.get("sale_cust_pick")
+    if choice:
+        st.session_state["sale_cust_phone"] = choice["phone"]
+        st.session_state["sale_cust_name"] = choice["name"] or ""
+    st.session_state["sale_cust_pick"] = None
+
+
+def customer_lookup(session, user, phone):
+    """Known customers for the typed digits; purchase history once the number matches one."""
+    try:
+        matches = suggest(session, phone)
+    except OperationalError:
+        # database unreachable (offline queue fallback): sell without the lookup
+        session.rollback()
+        return
+    e164 = to_e164(phone)
+    exact = next((m for m in matches if m["phone"] == e164), None)
+    if exact:
+        last = f", last on {exact['last_sale']:%d %b %Y}" if exact["last_sale"] else ""
+        st.caption(f"Returning customer: {exact['name']} · {exact['sales']} purchase(s){last}")
+        rows = history(session, exact["id"], limit=HISTORY_ROWS)
+        if rows:
+            df = pd.DataFrame(rows)
+            if user['role'] != 'admin':
+                df = df.drop(columns=['Amount'])
+            st.dataframe(df, hide_index=True, use_container_width=True)
+    elif matches:
+        st.selectbox(
+            "Matching customers", [None] + matches, key="sale_cust_pick", on_change=_pick_customer,
+            format_func=lambda m: "Pick a customer..." if m is None
+            else f"{m['phone']} · {m['name']} · {m['sales']} purchase(s)",
+        )
 
 
 def app():
     user = require_role(["owner", "admin", "employee"])
     st.title("New Sale")
+    notice = st.session_state.pop("sale_notice", None)
+    if notice:
+        st.success(notice)
 
-    session = SessionLocal()
+    session = get_session()
 
     # ------------------------ Customer Info ------------------------
     st.header("Customer Info")
     colA, colB = st.columns(2)
     with colA:
-        cust_phone = st.text_input("Customer Phone")
+        cust_phone = st.text_input("Customer Phone", key="sale_cust_phone")
     with colB:
-        cust_name = st.text_input("Customer Name")
-
-    # ------------------------ Load Products ------------------------
-    products = session.query(Product).order_by(Product.name).all()
-    prod_map = {
-        f"{p.name} (₹{p.sell_price}, Qty {p.qty_on_hand})": p
-        for p in products
-        if p.qty_on_hand > 0
-    }
+        cust_name = st.text_input("Customer Name", key="sale_cust_name")
+    customer_lookup(session, user, cust_phone)
 
     cart = st.session_state.setdefault("cart", [])
 
     # ------------------------ Manual Add ------------------------
     st.header("Add Product Manually")
+    index = get_search_index()
+    search = st.text_input(
+        "Search Product (name / SKU / scan IMEI)", key="sale_prod_search"
+    ).strip()
+    hits = index.rows(index.search(search, k=SEARCH_TOP_K))
+    prod_map = {
+        f"{p.name} (₹{p.sell_price:.2f}, Qty {p.qty_on_hand})": p
+        for p in hits.itertuples(index=False)
+    }
+    scanned_imei = search if IMEI_QUERY_RE.match(search) and len(hits) == 1 else ""
+    if search and not prod_map:
+        st.caption("No in-stock product matches.")
+    elif not search:
+        st.caption(f"Showing first {len(prod_map)} in-stock products; type to search.")
+
     with st.form("add_to_cart_form", clear_on_submit=True):
         prod_choice = st.selectbox(
             "Select Product", list(prod_map.keys()) if prod_map else ["-- No stock --"]
         )
         qty = st.number_input("Qty", min_value=1, value=1, step=1)
-        imei_override = st.text_input("IMEI (optional)")
+        imei_override = st.text_input("IMEI (optional)", value=scanned_imei)
         add_btn = st.form_submit_button("Add Item")
         if add_btn and prod_map and prod_choice in prod_map:
             p = prod_map[prod_choice]
@@ -47,7 +118,7 @@ def app():
             else:
                 cart.append(
                     {
-                        "product_id": p.id,
+                        "product_id": int(p.id),
                         "name": p.name,
                         "qty": qty,
                         "price": float(p.sell_price),
@@ -81,82 +152,19 @@ def app():
 
     addable_rows = []
     if bulk_file is not None:
+        data = bulk_file.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
         try:
-            if bulk_file.name.lower().endswith(".csv"):
-                bulk_df = pd.read_csv(bulk_file)
-            else:
-                bulk_df = pd.read_excel(bulk_file)
+            preview_df, addable_rows = resolve_bulk_sale_file(
+                digest, bulk_file.name, stock_version(), data
+            )
         except Exception as e:
             st.error(f"Could not read file: {e}")
-            bulk_df = None
-
-        if bulk_df is not None:
-            bulk_df.columns = [c.strip().lower() for c in bulk_df.columns]
-            if "qty" not in bulk_df.columns and "quantity" in bulk_df.columns:
-                bulk_df["qty"] = bulk_df["quantity"]
-            for col in ["imei", "sku", "name", "qty", "price"]:
-                if col not in bulk_df.columns:
-                    bulk_df[col] = None
-
-            preview_rows = []
-            for _, r in bulk_df.iterrows():
-                imei_val = str(r.get("imei") or "").strip()
-                sku_val = str(r.get("sku") or "").strip()
-                name_val = str(r.get("name") or "").strip()
-                qty_val = r.get("qty")
-                price_val = r.get("price")
-
-                try:
-                    qty_val = int(qty_val)
-                except Exception:
-                    qty_val = 0
-
-                prod = None
-                if imei_val:
-                    prod = session.query(Product).filter(Product.imei == imei_val).first()
-                if not prod and sku_val:
-                    prod = session.query(Product).filter(Product.sku == sku_val).first()
-                if not prod and name_val:
-                    prod = (
-                        session.query(Product)
-                        .filter(Product.name.ilike(name_val))
-                        .first()
-                    )
-
-                if not prod:
-                    status = "Not found"
-                elif qty_val <= 0:
-                    status = "Bad qty"
-                elif qty_val > prod.qty_on_hand:
-                    status = f"Stock short (have {prod.qty_on_hand})"
-                else:
-                    status = "OK"
-                    addable_rows.append(
-                        {
-                            "product_id": prod.id,
-                            "name": prod.name,
-                            "qty": qty_val,
-                            "price": float(price_val)
-                            if pd.notna(price_val)
-                            else float(prod.sell_price),
-                            "imei": imei_val or prod.imei,
-                        }
-                    )
-
-                preview_rows.append(
-                    {
-                        "Matched": prod.name if prod else "",
-                        "IMEI": imei_val,
-                        "SKU": sku_val,
-                        "Name": name_val,
-                        "Qty": qty_val,
-                        "Price": price_val,
-                        "Status": status,
-                    }
-                )
+            preview_df = None
 
+        if preview_df is not None:
             st.write("Preview Import:")
-            st.dataframe(pd.DataFrame(preview_rows), use_container_width=True)
+            st.dataframe(preview_df, use_container_width=True)
 
             add_bulk = st.button(
                 f"Add {len(addable_rows)} Valid Rows to Cart", key="bulk_add_btn"
@@ -216,7 +224,7 @@ def app():
                 "Interest Rate (%)", min_value=0.0, step=0.5, value=0.0
             )
             financed_amount = max(0.0, subtotal - down_payment)
-            emi_amount = financed_amount / tenure if tenure else financed_amount
+            emi_amount = emi_amount_for(financed_amount, interest, tenure)
             emi_info = {
                 "company": comp,
                 "down": down_payment,
@@ -228,6 +236,8 @@ def app():
                 + datetime.timedelta(days=30),
             }
             st.write(f"**EMI Amount (approx): ₹{emi_amount:,.2f} / month**")
+            if interest:
+                st.caption(f"Total interest: ₹{emi_amount * tenure - financed_amount:,.2f}")
 
     # ------------------------ Submit ------------------------
     submit_sale = st.button("Submit Sale", type="primary")
@@ -236,75 +246,56 @@ def app():
             st.error("Cart is empty. Add products before saving.")
             st.stop()
 
-        # find/create customer
-        cust = None
-        if cust_phone:
-            cust = (
-                session.query(Customer)
-                .filter(Customer.phone == cust_phone)
-                .first()
-            )
-        if not cust:
-            cust = Customer(
-                full_name=cust_name or cust_phone or "Unknown",
-                phone=cust_phone,
-                email=None,
-            )
-            session.add(cust)
-            session.flush()
-
-        sale = Sale(
-            user_id=user["id"],
-            customer_id=cust.id,
-            payment_type=pay_type,
-            total_amount=subtotal,
-        )
-        session.add(sale)
-        session.flush()
-
-        # sale items
-        for line in cart:
-            p = session.get(Product, line["product_id"])
-            qty = line["qty"]
-            line_total = qty * float(p.sell_price)
-            item = SaleItem(
-                sale_id=sale.id,
-                product_id=p.id,
-                imei=line.get("imei"),
-                qty=qty,
-                unit_price=p.sell_price,
-                line_total=line_total,
-            )
-            session.add(item)
-            p.qty_on_hand -= qty
-            session.add(
-                StockMovement(
-                    product=p,
-                    change_qty=-qty,
-                    reason="sale",
-                    ref_sale_id=sale.id,
-                    user_id=user["id"],
-                )
-            )
-
-        # EMI record
+        emi = None
         if pay_type == "emi" and emi_info.get("company"):
-            comp = emi_info["company"]
-            em = EmiDetail(
-                sale_id=sale.id,
-                company_id=comp.id,
-                down_payment=emi_info["down"],
-                financed_amount=emi_info["financed"],
-                tenure_months=emi_info["tenure"],
-                interest_rate=emi_info["interest"],
-                emi_amount=emi_info["emi_amount"],
-                next_due_date=emi_info["next_due_date"],
-            )
-            session.add(em)
-
-        session.commit()
-        st.success(f"Sale #{sale.id} saved.")
+            emi = dict(emi_info, company_id=emi_info["company"].id)
+        args = (cart, user["id"], pay_type, subtotal)
+        kwargs = dict(customer_phone=cust_phone, customer_name=cust_name, emi=emi)
+        mode = queue_mode()
+        if mode == "always" or (mode == "fallback" and get_outbox().counts().get("pending")):
+            local_id = get_outbox().enqueue(*args, **kwargs)
+            st.session_state["sale_notice"] = f"Sale queued as L-{local_id}; it syncs in the background."
+        else:
+            try:
+                sale = checkout(session, *args, **kwargs)
+                session.commit()
+                st.session_state["sale_notice"] = f"Sale #{sale.id} saved."
+            except StockShortError as e:
+                session.rollback()
+                st.error(f"Sale not saved. {e}")
+                st.stop()
+            except OperationalError:
+                session.rollback()
+                if mode != "fallback":
+                    raise
+                local_id = get_outbox().enqueue(*args, **kwargs)
+                st.session_state["sale_notice"] = (
+                    f"Database unreachable; sale queued as L-{local_id} and will sync when it is back."
+                )
         st.session_state["cart"] = []
         st.rerun()
 
-    session.close()
+    if queue_mode() != "off":
+        render_outbox(user)
+
+
+def render_outbox(user):
+    """Unsynced sales of the offline queue; owners/admins resolve conflicts."""
+    outbox = get_outbox()
+    counts = outbox.counts()
+    pending, conflicts = counts.get("pending", 0), counts.get("conflict", 0)
+    if not pending and not conflicts:
+        return
+    st.caption(f"Offline queue: {pending} sale(s) waiting to sync, {conflicts} conflict(s).")
+    if not conflicts or user["role"] not in ("owner", "admin"):
+        return
+    with st.expander(f"Sync conflicts ({conflicts})", expanded=True):
+        for e in outbox.entries(("conflict",)):
+            c1, c2, c3 = st.columns([6, 1, 1])
+            c1.write(f"L-{e['local_id']} ({e['created_at']:%d %b %H:%M}): {e['last_error']}")
+            if c2.button("Retry", key=f"outbox_retry_{e['local_id']}"):
+                outbox.retry(e["local_id"])
+                st.rerun()
+            if c3.button("Discard", key=f"outbox_discard_{e['local_id']}"):
+                outbox.discard(e["local_id"])
+                st.rerun()
@@ -0,0 +1,62 @@
+import streamlit as st
+from auth import require_role
+from db import get_read_session, Sale, IST
+from utils.search import search
+from sqlalchemy import select
+import datetime
+import time
+import pandas as pd
+
+RESULT_LIMITS = [20, 50, 100]
+
+
+def _rows(session, user, hits):
+    sale_ids = [h["ref_id"] for h in hits if h["kind"] == "sale"]
+    sales = {}
+    if sale_ids:
+        sales = {r.id: r for r in session.execute(
+            select(Sale.id, Sale.total_amount, Sale.payment_type).where(Sale.id.in_(sale_ids))
+        )}
+    today = datetime.datetime.now(IST).date()
+    rows = []
+    for h in hits:
+        sale = sales.get(h["ref_id"]) if h["kind"] == "sale" else None
+        day = h["sold_at"].date() if h["sold_at"] else None
+        rows.append({
+            "Kind": h["kind"],
+            "Sale #": h["ref_id"] if sale else None,
+            "Date": day,
+            "Days ago": (today - day).days if day else None,
+            "Customer": h["customer"],
+            "Phone": h["phone"],
+            "Payment": sale.payment_type if sale else None,
+            "Amount": float(sale.total_amount or 0) if sale else None,
+            "Match": h["snippet"],
+        })
+    df = pd.DataFrame(rows)
+    if user['role'] != 'admin':
+        df = df.drop(columns=['Amount'])
+    return df
+
+
+def app():
+    user = require_role(["owner","admin","employee"])
+    st.title("Search")
+
+    c1, c2 = st.columns([4, 1])
+    query = c1.text_input("Customer, phone, IMEI, product or note",
+                          placeholder="e.g. ramesh, 98765 43210, last digits of an IMEI")
+    limit = c2.selectbox("Results", RESULT_LIMITS)
+    if not query.strip():
+        st.caption("Search past sales and customers. Phones match with or without +91 and spaces.")
+        return
+
+    session = get_read_session()
+    t0 = time.perf_counter()
+    hits = search(session, query, limit)
+    ms = (time.perf_counter() - t0) * 1000
+    if not hits:
+        st.info("No matches.")
+    else:
+        st.dataframe(_rows(session, user, hits), hide_index=True, use_container_width=True)
+    st.caption(f"{len(hits)} result(s) in {ms:.0f} ms")
@@ -1,7 +1,7 @@
 import streamlit as st
 from passlib.hash import bcrypt
 from auth import require_role
-from db import SessionLocal, User
+from db import get_session, User
 import pandas as pd
 
 def create_user(session, username, password, role="employee", full_name=None, email=None):
@@ -22,7 +22,7 @@ def app():
     user = require_role(["admin"])
     st.title("User Management")
 
-    session = SessionLocal()
+    session = get_session()
 
     with st.expander("Add User"):
         username = st.text_input("Username")
@@ -54,5 +54,3 @@ def app():
         "Active": u.active
     } for u in users])
     st.dataframe(df, use_container_width=True)
-
-    session.close()
@@ -0,0 +1,232 @@
+"""
+Background bill-processing queue.
+
+Uploads (single files or ZIPs) are stored content-addressed under data/bills/
+and enqueued as `bill_jobs` rows. A small pool of worker threads claims queued
+jobs (guarded UPDATE, so several workers/processes never take the same job),
+runs OCR + IMEI extraction, resolves the IMEIs and links the bill to the sale
+via `Sale.bill_image_path` when exactly one sale matches.
+"""
+import datetime
+import io
+import json
+import os
+import pathlib
+import threading
+import time
+import uuid
+import zipfile
+
+from sqlalchemy import select, update, insert, func
+
+from db import SessionLocal, ReadSessionLocal, BillJob, Sale, IST, use_replica
+from utils.db_helpers import lookup_imeis
+from utils.ocr import bytes_digest, ocr_image_bytes, ocr_pdf_bytes
+from utils.scanning import (
+    rank_imeis, extract_imeis_from_text, extract_imeis_from_filename, MIN_CONFIDENCE
+)
+
+BILL_DIR = os.path.join("data", "bills")
+BILL_TYPES = {"jpg", "jpeg", "png", "pdf", "txt"}
+STALE_AFTER = datetime.timedelta(minutes=30)
+POLL_SECONDS = 2.0
+REQUEUE_EVERY = datetime.timedelta(minutes=5)
+
+
+def _ext(name):
+    return pathlib.Path(name).suffix.lower().lstrip(".")
+
+
+def store_bill(name, data):
+    """Write bytes to data/bills/<sha256>.<ext> (idempotent); returns the path."""
+    os.makedirs(BILL_DIR, exist_ok=True)
+    path = os.path.join(BILL_DIR, f"{bytes_digest(data)}.{_ext(name) or 'bin'}")
+    if not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return path
+
+
+def expand_uploads(files):
+    """(name, bytes) for each upload, expanding ZIP archives; skips unsupported types."""
+    for f in files:
+        data = f.getvalue()
+        if _ext(f.name) == "zip":
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                for info in zf.infolist():
+                    if not info.is_dir() and _ext(info.filename) in BILL_TYPES:
+                        yield pathlib.Path(info.filename).name, zf.read(info)
+        elif _ext(f.name) in BILL_TYPES:
+            yield f.name, data
+
+
+def extract_bill_text(name, data, stop_on_imei=False):
+    ext = _ext(name)
+    if ext == "txt":
+        return data.decode("utf-8", errors="ignore")
+    if ext in ("jpg", "jpeg", "png"):
+        return ocr_image_bytes(data)
+    if ext == "pdf":
+        return ocr_pdf_bytes(data, stop_on_imei=stop_on_imei)
+    return ""
+
+
+def rank_bill_imeis(name, data, text):
+    """Ranked IMEIs from OCR text, falling back to raw bytes then the file name."""
+    ranked = rank_imeis(text) if text else []
+    if not ranked:
+        found = extract_imeis_from_text(data.decode("utf-8", errors="ignore"))
+        ranked = rank_imeis("\n".join(found or extract_imeis_from_filename(name)))
+    return ranked
+
+
+# ------------------------------------------------------------------
+# Queue
+# ------------------------------------------------------------------
+def enqueue_bills(session, items, user_id=None):
+    """Store + enqueue (name, bytes) items as one batch; returns (batch_id, count)."""
+    batch_id = uuid.uuid4().hex
+    now = datetime.datetime.now(IST)
+    rows = [
+        {"batch_id": batch_id, "file_name": name, "stored_path": store_bill(name, data),
+         "status": "queued", "user_id": user_id, "created_at": now}
+        for name, data in items
+    ]
+    if rows:
+        session.execute(insert(BillJob), rows)
+        session.commit()
+    _wake.set()
+    return batch_id, len(rows)
+
+
+def batch_progress(session, batch_id):
+    """({status: count}, jobs) for a batch."""
+    counts = dict(
+        session.execute(
+            select(BillJob.status, func.count()).where(BillJob.batch_id == batch_id).group_by(BillJob.status)
+        ).all()
+    )
+    jobs = session.execute(
+        select(BillJob).where(BillJob.batch_id == batch_id).order_by(BillJob.id)
+    ).scalars().all()
+    return counts, jobs
+
+
+def _claim_next(session):
+    """Atomically move the oldest queued job to running; returns its id or None."""
+    while True:
+        job_id = session.execute(
+            select(BillJob.id).where(BillJob.status == "queued").order_by(BillJob.id).limit(1)
+        ).scalar()
+        if job_id is None:
+            return None
+        res = session.execute(
+            update(BillJob)
+            .where(BillJob.id == job_id, BillJob.status == "queued")
+            .values(status="running", started_at=datetime.datetime.now(IST))
+        )
+        session.commit()
+        if res.rowcount == 1:
+            return job_id
+
+
+def _lookup(session, imeis):
+    """lookup_imeis on the read replica when it is usable, else on `session`."""
+    if not use_replica():
+        return lookup_imeis(session, imeis)
+    with ReadSessionLocal() as read:
+        return lookup_imeis(read, imeis)
+
+
+def process_job(session, job_id):
+    job = session.get(BillJob, job_id)
+    try:
+        with open(job.stored_path, "rb") as f:
+            data = f.read()
+        text = extract_bill_text(job.file_name, data)
+        ranked = rank_bill_imeis(job.file_name, data, text)
+        imeis = [i for i, conf in ranked if conf >= MIN_CONFIDENCE]
+        rows = _lookup(session, imeis) if imeis else []
+        sale_ids = {r["SaleID"] for r in rows if r.get("SaleID")}
+        if len(sale_ids) == 1:
+            job.sale_id = sale_ids.pop()
+            sale = session.get(Sale, job.sale_id)
+            if sale is not None and not sale.bill_image_path:
+                sale.bill_image_path = job.stored_path
+        job.imeis = ",".join(i for i, _ in ranked)
+        job.result = json.dumps(rows, default=str)
+        job.status = "done"
+    except Exception as e:
+        session.rollback()
+        job = session.get(BillJob, job_id)
+        job.status = "failed"
+        job.error = f"{type(e).__name__}: {e}"
+    job.finished_at = datetime.datetime.now(IST)
+    session.commit()
+
+
+def fail_job(session, job_id, error):
+    """Mark a running job failed (used when process_job itself blew up)."""
+    session.execute(
+        update(BillJob)
+        .where(BillJob.id == job_id, BillJob.status == "running")
+        .values(status="failed", error=error, finished_at=datetime.datetime.now(IST))
+    )
+    session.commit()
+
+
+def requeue_stale(session, older_than=STALE_AFTER):
+    """Put jobs left 'running' by a dead worker back in the queue."""
+    cutoff = datetime.datetime.now(IST) - older_than
+    session.execute(
+        update(BillJob)
+        .where(BillJob.status == "running", BillJob.started_at < cutoff)
+        .values(status="queued", started_at=None)
+    )
+    session.commit()
+
+
+# ------------------------------------------------------------------
+# Worker pool
+# ------------------------------------------------------------------
+_wake = threading.Event()
+
+
+def _worker_loop(stop):
+    next_requeue = 0.0
+    while not stop.is_set():
+        session = SessionLocal()
+        job_id = None
+        try:
+            if time.monotonic() >= next_requeue:
+                requeue_stale(session)
+                next_requeue = time.monotonic() + REQUEUE_EVERY.total_seconds()
+            job_id = _claim_next(session)
+            if job_id is not None:
+                process_job(session, job_id)
+        except Exception as e:
+            session.rollback()
+            if job_id is not None:
+                try:
+                    fail_job(session, job_id, f"{type(e).__name__}: {e}")
+                except Exception:
+                    session.rollback()  # requeue_stale picks it up later
+            job_id = None
+        finally:
+            session.close()
+        if job_id is None:
+            _wake.wait(POLL_SECONDS)
+            _wake.clear()
+
+
+def start_bill_workers(n=2):
+    """
+    Start n daemon worker threads; returns the stop Event. Workers also put
+    stale 'running' jobs back in the queue every REQUEUE_EVERY.
+    """
+    stop = threading.Event()
+    for i in range(n):
+        threading.Thread(target=_worker_loop, args=(stop,), name=f"bill-worker-{i}", daemon=True).start()
+    return stop
@@ -0,0 +1,321 @@
+"""
+Set-based resolution & writes for the bulk CSV/Excel uploads.
+
+Rows are matched against products with a handful of chunked IN (...) queries
+instead of one lookup per row, then names that still match nothing go
+through the fuzzy name matcher (utils/fuzzy.py); new products, quantity
+updates and stock movements are written in bulk.
+"""
+import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, insert, update, bindparam, case, func, and_
+
+from db import Product, StockMovement, IST
+from utils.fuzzy import NameMatcher, AUTO_MATCH, name_key, review_note
+
+IN_CHUNK = 500
+
+
+def _chunks(values, size=IN_CHUNK):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _text(v):
+    """Cell -> stripped string or None (NaN/blank safe, 1.2e14 floats -> digits)."""
+    if v is None:
+        return None
+    if isinstance(v, float):
+        if np.isnan(v):
+            return None
+        if v.is_integer():
+            v = int(v)
+    s = str(v).strip()
+    return s or None
+
+
+def _number(v, cast=float):
+    try:
+        if v is None or pd.isna(v):
+            return cast(0)
+        return cast(float(v))
+    except (TypeError, ValueError):
+        return cast(0)
+
+
+def _fetch_products(session, column, values):
+    """Prefetch products where `column` IN values, as a DataFrame."""
+    cols = [Product.id, Product.imei, Product.sku, Product.name,
+            Product.sell_price, Product.qty_on_hand]
+    rows = []
+    for chunk in _chunks(sorted(set(values))):
+        rows.extend(session.execute(select(*cols).where(column.in_(chunk))).all())
+    return pd.DataFrame(rows, columns=["id", "imei", "sku", "name", "sell_price", "qty_on_hand"])
+
+
+def _first_id(cands, keys):
+    """Lowest product id per key combination (stands in for `.first()`)."""
+    if cands.empty:
+        return pd.DataFrame(columns=keys + ["id"])
+    return cands.dropna(subset=keys).groupby(keys, as_index=False)["id"].min()
+
+
+def _match_fuzzy(session, rows, matcher):
+    """
+    Fill `product_id` of named rows still unmatched from the fuzzy matcher
+    (score >= AUTO_MATCH) and set the `review` column. Returns the filled index.
+    """
+    rows["review"] = ""
+    todo = rows["product_id"].isna() & rows["name"].notna()
+    if not todo.any():
+        return rows.index[:0]
+    fz = (matcher or NameMatcher.from_session(session)).best(rows.loc[todo, "name"])
+    auto = fz["fuzzy_score"] >= AUTO_MATCH
+    rows.loc[todo, "review"] = [
+        review_note(n, s, a) for n, s, a in zip(fz["fuzzy_name"], fz["fuzzy_score"], auto)
+    ]
+    rows.loc[fz.index[auto], "product_id"] = fz.loc[auto, "fuzzy_id"]
+    return fz.index[auto]
+
+
+# ------------------------------------------------------------------
+# Inventory: "Import CSV/Excel Rows"
+# ------------------------------------------------------------------
+def normalize_stock_frame(df):
+    """Uploaded stock frame -> typed columns name/sku/category/price/qty/imei."""
+    out = pd.DataFrame(index=df.index)
+    out["name"] = df["name"].map(_text)
+    out["sku"] = df["sku"].map(_text)
+    out["category"] = df["category"].map(_text).fillna("phone")
+    out["price"] = df["price"].map(_number)
+    out["qty"] = df["qty"].map(lambda v: _number(v, int))
+    out["imei"] = df["imei"].map(_text) if "imei" in df.columns else None
+    return out
+
+
+def resolve_stock_rows(session, rows, matcher=None):
+    """
+    Match normalized rows to existing products: IMEI, then SKU+name, then
+    name, then fuzzy name (`matcher`, built from the DB when None).
+
+    Adds `product_id` (NaN when unmatched), `match` and `review` columns.
+    """
+    rows = rows.copy()
+    imeis = rows["imei"].dropna().unique()
+    names = rows["name"].dropna().unique()
+    cands = pd.concat(
+        [_fetch_products(session, Product.imei, imeis),
+         _fetch_products(session, Product.name, names)],
+        ignore_index=True,
+    ).drop_duplicates("id")
+
+    by_imei = _first_id(cands, ["imei"]).rename(columns={"id": "id_imei"})
+    by_sku_name = _first_id(cands, ["sku", "name"]).rename(columns={"id": "id_sku_name"})
+    by_name = _first_id(cands, ["name"]).rename(columns={"id": "id_name"})
+
+    m = (
+        rows.reset_index()
+        .merge(by_imei, on="imei", how="left")
+        .merge(by_sku_name, on=["sku", "name"], how="left")
+        .merge(by_name, on="name", how="left")
+        .set_index("index")
+    )
+
+    rows["product_id"] = m["id_imei"].fillna(m["id_sku_name"]).fillna(m["id_name"])
+    rows["match"] = np.select(
+        [m["id_imei"].notna(), m["id_sku_name"].notna(), m["id_name"].notna()],
+        ["imei", "sku+name", "name"],
+        default="new",
+    )
+    rows.loc[_match_fuzzy(session, rows, matcher), "match"] = "fuzzy"
+    rows.loc[rows["name"].isna(), "match"] = "skipped"
+    return rows
+
+
+def import_stock_frame(session, df, user_id, matcher=None):
+    """
+    Import an uploaded stock frame in bulk.
+
+    Returns (added, updated, report) where report has one row per upload row
+    with the matched product id, match reason and fuzzy review note. Caller
+    commits.
+    """
+    rows = resolve_stock_rows(session, normalize_stock_frame(df), matcher)
+
+    # Rows matching nothing in the DB: first occurrence creates the product,
+    # later rows with the same IMEI/normalized name update it (as the row loop did).
+    new_products = []
+    new_by_imei, new_by_name = {}, {}
+    new_ref = pd.Series(-1, index=rows.index)
+    for idx, r in rows[rows["match"] == "new"].iterrows():
+        imei, sku = _text(r["imei"]), _text(r["sku"])
+        ref = new_by_imei.get(imei) if imei else None
+        if ref is None:
+            ref = new_by_name.get(name_key(r["name"]))
+        if ref is None:
+            ref = len(new_products)
+            new_products.append(Product(
+                sku=sku, imei=imei, name=r["name"], category=r["category"],
+                cost_price=r["price"], sell_price=r["price"], qty_on_hand=r["qty"],
+            ))
+            new_by_name[name_key(r["name"])] = ref
+            if imei:
+                new_by_imei[imei] = ref
+        else:
+            p = new_products[ref]
+            p.qty_on_hand += r["qty"]
+            if r["price"] and not p.sell_price:
+                p.sell_price = r["price"]
+            rows.at[idx, "match"] = "name" if new_by_name.get(name_key(r["name"])) == ref else "imei"
+        new_ref[idx] = ref
+
+    if new_products:
+        session.add_all(new_products)
+        session.flush()
+        ids = np.array([p.id for p in new_products])
+        is_new = new_ref >= 0
+        rows.loc[is_new, "product_id"] = ids[new_ref[is_new].to_numpy()]
+
+    creator = rows["match"] == "new"
+    updates = rows[rows["match"].isin(["imei", "sku+name", "name", "fuzzy"])]
+    existing = updates[~updates.index.isin(new_ref[new_ref >= 0].index)]
+
+    if not existing.empty:
+        agg = existing.groupby("product_id").agg(
+            delta=("qty", "sum"),
+            price=("price", lambda s: next((x for x in s if x), 0.0)),
+        )
+        tbl = Product.__table__
+        stmt = (
+            update(tbl)
+            .where(tbl.c.id == bindparam("pid"))
+            .values(
+                qty_on_hand=tbl.c.qty_on_hand + bindparam("delta"),
+                sell_price=case(
+                    (and_(bindparam("price") > 0, func.coalesce(tbl.c.sell_price, 0) == 0),
+                     bindparam("price")),
+                    else_=tbl.c.sell_price,
+                ),
+                updated_at=bindparam("now"),
+            )
+        )
+        now = datetime.datetime.now(IST)
+        session.execute(stmt, [
+            {"pid": int(pid), "delta": int(a.delta), "price": float(a.price), "now": now}
+            for pid, a in agg.iterrows()
+        ])
+
+    moves = rows[(creator & (rows["qty"] != 0)) | rows.index.isin(updates.index)]
+    if not moves.empty:
+        session.execute(insert(StockMovement), [
+            {"product_id": int(pid), "change_qty": int(q), "reason": "purchase", "user_id": user_id}
+            for pid, q in zip(moves["product_id"], moves["qty"])
+        ])
+
+    report = pd.DataFrame({
+        "Name": rows["name"],
+        "SKU": rows["sku"],
+        "IMEI": rows["imei"],
+        "Qty": rows["qty"],
+        "Product ID": rows["product_id"].astype("Int64"),
+        "Match": rows["match"],
+        "Review": rows["review"],
+    })
+    return int(creator.sum()), len(updates), report
+
+
+# ------------------------------------------------------------------
+# New Sale: "Bulk Add from Excel/CSV"
+# ------------------------------------------------------------------
+SALE_COLS = ["imei", "sku", "name", "qty", "price"]
+
+
+def resolve_sale_frame(session, df, matcher=None):
+    """
+    Resolve an uploaded sale frame (imei/sku/name/qty/price) in batched queries.
+
+    Match order per row is IMEI, then SKU, then case-insensitive name, then
+    fuzzy name (`matcher`, built from the DB when None).
+    Returns (preview DataFrame, addable cart rows).
+    """
+    df = df.copy()
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    if "qty" not in df.columns and "quantity" in df.columns:
+        df["qty"] = df["quantity"]
+    for col in SALE_COLS:
+        if col not in df.columns:
+            df[col] = None
+
+    rows = pd.DataFrame(index=df.index)
+    rows["imei"] = df["imei"].map(_text)
+    rows["sku"] = df["sku"].map(_text)
+    rows["name"] = df["name"].map(_text)
+    rows["name_key"] = rows["name"].str.lower()
+    rows["qty"] = df["qty"].map(lambda v: _number(v, int))
+    rows["price"] = pd.to_numeric(df["price"], errors="coerce")
+
+    cands = pd.concat(
+        [_fetch_products(session, Product.imei, rows["imei"].dropna()),
+         _fetch_products(session, Product.sku, rows["sku"].dropna()),
+         _fetch_products(session, func.lower(Product.name), rows["name_key"].dropna())],
+        ignore_index=True,
+    ).drop_duplicates("id")
+    cands["name_key"] = cands["name"].str.lower()
+
+    m = (
+        rows.reset_index()
+        .merge(_first_id(cands, ["imei"]).rename(columns={"id": "id_imei"}), on="imei", how="left")
+        .merge(_first_id(cands, ["sku"]).rename(columns={"id": "id_sku"}), on="sku", how="left")
+        .merge(_first_id(cands, ["name_key"]).rename(columns={"id": "id_name"}), on="name_key", how="left")
+        .set_index("index")
+    )
+    rows["product_id"] = m["id_imei"].fillna(m["id_sku"]).fillna(m["id_name"])
+    fuzzy = _match_fuzzy(session, rows, matcher)
+    if len(fuzzy):
+        cands = pd.concat(
+            [cands, _fetch_products(session, Product.id, rows.loc[fuzzy, "product_id"].astype(int))],
+            ignore_index=True,
+        ).drop_duplicates("id")
+
+    prod = cands.drop(columns="name_key").add_prefix("p_")
+    rows = rows.join(prod.set_index("p_id"), on="product_id")
+    have = rows["p_qty_on_hand"].fillna(0).astype(int)
+    found = rows["product_id"].notna()
+    ok = found & (rows["qty"] > 0) & (rows["qty"] <= have)
+    status = np.select(
+        [~found, rows["qty"] <= 0, rows["qty"] > have],
+        ["Not found", "Bad qty", "Stock short"],
+        default="OK",
+    )
+    status = pd.Series(status, index=rows.index)
+    short = status == "Stock short"
+    status[short] = "Stock short (have " + have[short].astype(str) + ")"
+
+    preview = pd.DataFrame({
+        "Matched": rows["p_name"].fillna(""),
+        "IMEI": rows["imei"].fillna(""),
+        "SKU": rows["sku"].fillna(""),
+        "Name": rows["name"].fillna(""),
+        "Qty": rows["qty"],
+        "Price": df["price"],
+        "Status": status,
+        "Review": rows["review"],
+    })
+
+    sel = rows[ok]
+    price = sel["price"].fillna(sel["p_sell_price"].astype(float))
+    addable_rows = [
+        {
+            "product_id": int(pid),
+            "name": name,
+            "qty": int(qty),
+            "price": float(pr),
+            "imei": _text(imei) or _text(p_imei),
+        }
+        for pid, name, qty, pr, imei, p_imei in zip(
+            sel["product_id"], sel["p_name"], sel["qty"], price, sel["imei"], sel["p_imei"]
+        )
+    ]
+    return preview, addable_rows
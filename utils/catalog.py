@@ -0,0 +1,76 @@
+"""
+Process-wide product catalog snapshot shared by all sessions.
+
+The snapshot is a column-oriented DataFrame (one column per Product field),
+cached with st.cache_resource under the current stock version, so it is
+rebuilt only after a commit that wrote products or stock movements. The TTL
+bounds staleness from writes made by other processes. Treat it as read-only.
+With the offline queue on, sales still waiting in the outbox are subtracted
+from qty_on_hand, and the last snapshot keeps being served when a reload
+fails because the primary is unreachable (a process that never loaded one
+still needs the primary once).
+"""
+import pandas as pd
+import streamlit as st
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from db import SessionLocal, Product, stock_version
+
+CATALOG_TTL_SECONDS = 300
+
+_last_catalog = None  # last snapshot loaded; served offline when the queue is on
+
+
+@st.cache_resource(max_entries=2, ttl=CATALOG_TTL_SECONDS, show_spinner=False)
+def _load_catalog(version):
+    session = SessionLocal()
+    try:
+        rows = session.execute(
+            select(
+                Product.id, Product.sku, Product.imei, Product.name, Product.category,
+                Product.cost_price, Product.sell_price, Product.qty_on_hand,
+            ).order_by(Product.name)
+        ).all()
+    finally:
+        session.close()
+    cols = list(zip(*rows)) or [()] * 8
+    return pd.DataFrame({
+        "id": pd.Series(cols[0], dtype="int64"),
+        "sku": pd.Series(cols[1], dtype=object),
+        "imei": pd.Series(cols[2], dtype=object),
+        "name": pd.Series(cols[3], dtype=object),
+        "category": pd.Series(cols[4], dtype=object),
+        "cost_price": pd.Series([float(v or 0) for v in cols[5]], dtype="float64"),
+        "sell_price": pd.Series([float(v or 0) for v in cols[6]], dtype="float64"),
+        "qty_on_hand": pd.Series([int(v or 0) for v in cols[7]], dtype="int64"),
+    })
+
+
+@st.cache_resource(max_entries=2, ttl=CATALOG_TTL_SECONDS, show_spinner=False)
+def _with_pending(version, outbox_version, catalog_id, _catalog):
+    from utils.offline_queue import get_outbox
+    pending = get_outbox().pending_stock()
+    if not pending:
+        return _catalog
+    catalog = _catalog.copy()
+    catalog["qty_on_hand"] -= catalog["id"].map(pending).fillna(0).astype("int64")
+    return catalog
+
+
+def get_catalog():
+    """Current catalog snapshot (DataFrame ordered by name)."""
+    global _last_catalog
+    from utils.offline_queue import queue_mode, get_outbox
+    try:
+        catalog = _load_catalog(stock_version())
+    except OperationalError:
+        if _last_catalog is None or queue_mode() == "off":
+            raise
+        catalog = _last_catalog
+    else:
+        _last_catalog = catalog
+    if queue_mode() == "off":
+        return catalog
+    # keyed on the loaded snapshot too, so a TTL reload is never masked
+    return _with_pending(stock_version(), get_outbox().version, id(catalog), catalog)
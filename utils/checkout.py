@@ -0,0 +1,181 @@
+"""
+Sale checkout in a handful of statements, safe under concurrent counters.
+
+Stock is taken with one guarded UPDATE per chunk of cart products:
+
+    UPDATE products SET qty_on_hand = qty_on_hand - CASE id WHEN ... END
+    WHERE id IN (...) AND qty_on_hand >= CASE id WHEN ... END
+
+so two counters selling the last unit cannot both succeed, whatever the
+isolation level. On Postgres the cart products are also locked (SELECT ...
+FOR UPDATE, in id order) before the update. The stock update is the first
+write of the transaction, so on SQLite the write lock is taken before any
+other row is touched. Sale items and stock movements are bulk inserted.
+"""
+from collections import defaultdict
+
+from sqlalchemy import select, update, insert, case
+from sqlalchemy.exc import IntegrityError
+
+from db import Product, Customer, Sale, SaleItem, EmiDetail, StockMovement
+from utils.bulk_import import _chunks
+from utils.phones import find_customer, to_e164
+from utils.rollup import record_sale
+from utils.search import index_sales, index_customers
+
+
+class StockShortError(ValueError):
+    """A cart line asks for more units than are on hand (or its product is gone)."""
+
+    def __init__(self, line_no, name, requested, available):
+        self.line_no = line_no
+        self.name = name
+        self.requested = requested
+        self.available = available
+        if available is None:
+            msg = f"Line {line_no} ({name}): product no longer exists."
+        else:
+            msg = (f"Line {line_no} ({name}): {requested} requested, "
+                   f"only {available} in stock.")
+        super().__init__(msg)
+
+
+def _need_per_product(cart):
+    """{product_id: total qty} and {product_id: first 1-based cart line}."""
+    need, first_line = defaultdict(int), {}
+    for n, line in enumerate(cart, start=1):
+        pid = int(line["product_id"])
+        need[pid] += int(line["qty"])
+        first_line.setdefault(pid, n)
+    return dict(need), first_line
+
+
+def _load_products(session, pids):
+    """{id: (name, sell_price, qty_on_hand)}; row-locked on Postgres."""
+    products = {}
+    for chunk in _chunks(sorted(pids)):
+        stmt = (
+            select(Product.id, Product.name, Product.sell_price, Product.qty_on_hand)
+            .where(Product.id.in_(chunk))
+            .order_by(Product.id)
+        )
+        if session.get_bind().dialect.name == "postgresql":
+            stmt = stmt.with_for_update()
+        products.update((r.id, (r.name, r.sell_price, r.qty_on_hand)) for r in session.execute(stmt))
+    return products
+
+
+def _short_line(session, cart, need, first_line, products=None):
+    """StockShortError for the first cart line whose product cannot be covered."""
+    products = _load_products(session, need) if products is None else products
+    for pid, line_no in sorted(first_line.items(), key=lambda kv: kv[1]):
+        name, _, on_hand = products.get(pid, (cart[line_no - 1].get("name"), None, None))
+        if on_hand is None or on_hand < need[pid]:
+            return StockShortError(line_no, name, need[pid], on_hand)
+    # stock moved again since the update; report the tightest line
+    pid = min(need, key=lambda p: products[p][2] - need[p])
+    return StockShortError(first_line[pid], products[pid][0], need[pid], products[pid][2])
+
+
+def take_stock(session, cart):
+    """
+    Decrement stock for every cart line.
+
+    Returns {product_id: (name, sell_price, qty_on_hand)} as loaded before the
+    update. Raises StockShortError naming the first short line; the caller
+    must roll back, since earlier chunks may already be decremented.
+    """
+    need, first_line = _need_per_product(cart)
+    products = _load_products(session, need)
+    missing = [pid for pid in need if pid not in products]
+    if missing:
+        raise _short_line(session, cart, need, first_line, products)
+
+    tbl = Product.__table__
+    for chunk in _chunks(sorted(need)):
+        qty = case({pid: need[pid] for pid in chunk}, value=tbl.c.id)
+        res = session.execute(
+            update(tbl)
+            .where(tbl.c.id.in_(chunk), tbl.c.qty_on_hand >= qty)
+            .values(qty_on_hand=tbl.c.qty_on_hand - qty)
+        )
+        if res.rowcount != len(chunk):
+            # re-read inside the transaction for an accurate message
+            raise _short_line(session, cart, need, first_line)
+    return products
+
+
+def _find_or_create_customer(session, phone, name):
+    cust = find_customer(session, phone) if phone else None
+    if cust:
+        return cust
+    cust = Customer(full_name=name or phone or "Unknown", phone=phone, phone_e164=to_e164(phone), email=None)
+    try:
+        with session.begin_nested():
+            session.add(cust)
+            session.flush()
+    except IntegrityError:
+        # another counter added the same number meanwhile
+        return find_customer(session, phone)
+    index_customers(session, [cust.id])
+    return cust
+
+
+def checkout(session, cart, user_id, payment_type, total_amount,
+             customer_phone=None, customer_name=None, emi=None,
+             client_ref=None, sale_datetime=None):
+    """
+    Record a sale for `cart` (dicts with product_id, qty, imei) and take the stock.
+
+    `emi` is None or a dict with company_id, down, financed, tenure, interest,
+    emi_amount, next_due_date. `client_ref` / `sale_datetime` come from the
+    offline queue (unique replay guard, time the sale was rung up); stock
+    movements are always stamped now. Returns the flushed Sale; the caller
+    commits, or rolls back on StockShortError.
+    """
+    products = take_stock(session, cart)
+    cust = _find_or_create_customer(session, customer_phone, customer_name)
+
+    sale = Sale(
+        user_id=user_id,
+        customer_id=cust.id,
+        payment_type=payment_type,
+        total_amount=total_amount,
+        client_ref=client_ref,
+    )
+    if sale_datetime is not None:
+        sale.sale_datetime = sale_datetime
+    session.add(sale)
+    session.flush()
+
+    items, moves, rollup_lines = [], [], []
+    for line in cart:
+        pid, qty = int(line["product_id"]), int(line["qty"])
+        unit_price = products[pid][1]
+        line_total = qty * float(unit_price or 0)
+        items.append({"sale_id": sale.id, "product_id": pid, "imei": line.get("imei"),
+                      "qty": qty, "unit_price": unit_price, "line_total": line_total})
+        moves.append({"product_id": pid, "change_qty": -qty, "reason": "sale",
+                      "ref_sale_id": sale.id, "user_id": user_id})
+        rollup_lines.append((pid, qty, line_total))
+    session.execute(insert(SaleItem), items)
+    session.execute(insert(StockMovement), moves)
+
+    if emi:
+        session.add(EmiDetail(
+            sale_id=sale.id,
+            company_id=emi["company_id"],
+            down_payment=emi["down"],
+            financed_amount=emi["financed"],
+            tenure_months=emi["tenure"],
+            interest_rate=emi["interest"],
+            emi_amount=emi["emi_amount"],
+            next_due_date=emi["next_due_date"],
+            first_due_date=emi["next_due_date"],
+            remaining_installments=emi["tenure"],
+        ))
+        session.flush()
+
+    record_sale(session, sale.sale_datetime, payment_type, total_amount, rollup_lines)
+    index_sales(session, [sale.id])
+    return sale
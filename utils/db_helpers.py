@@ -1,11 +1,26 @@
 import decimal
 from sqlalchemy import func
-from db import Product, Sale, SaleItem
+from db import Product, Sale, SaleItem, DailySalesRollup
+from utils.rollup import ALL_PRODUCTS, ist_day, is_ist_midnight
 def get_stock_summary(session):
     units = session.query(func.sum(Product.qty_on_hand)).scalar() or 0
     value = session.query(func.sum(Product.qty_on_hand * Product.sell_price)).scalar() or decimal.Decimal(0)
     return int(units), float(value)
+def _rollup_range(start, end):
+    """(first_day, end_day) if [start, end) is whole IST days, else None."""
+    if is_ist_midnight(start) and is_ist_midnight(end):
+        return ist_day(start), ist_day(end)
+    return None
 def get_sales_summary(session, start, end):
+    days = _rollup_range(start, end)
+    if days:
+        rows = session.query(DailySalesRollup.payment_type, func.sum(DailySalesRollup.amount)).filter(
+            DailySalesRollup.product_id == ALL_PRODUCTS,
+            DailySalesRollup.day >= days[0],
+            DailySalesRollup.day < days[1],
+        ).group_by(DailySalesRollup.payment_type).all()
+        by_type = {pt: float(amount or 0) for pt, amount in rows}
+        return sum(by_type.values()), by_type.get("cash", 0.0), by_type.get("emi", 0.0)
     q = session.query(func.sum(Sale.total_amount)).filter(Sale.sale_datetime >= start, Sale.sale_datetime < end)
     total = q.scalar() or decimal.Decimal(0)
     cash = session.query(func.sum(Sale.total_amount)).filter(
@@ -21,6 +36,21 @@ def get_sales_summary(session, start, end):
     return float(total), float(cash), float(emi)
 def get_top_sellers(session, start, end, limit=10):
     from sqlalchemy import desc
+    days = _rollup_range(start, end)
+    if days:
+        return (
+            session.query(
+                Product.name,
+                func.sum(DailySalesRollup.units).label("units"),
+                func.sum(DailySalesRollup.amount).label("revenue")
+            )
+            .join(Product, Product.id == DailySalesRollup.product_id)
+            .filter(DailySalesRollup.day >= days[0], DailySalesRollup.day < days[1])
+            .group_by(Product.id, Product.name)
+            .order_by(desc("units"))
+            .limit(limit)
+            .all()
+        )
     rows = (
         session.query(
             Product.name,
@@ -36,3 +66,98 @@ def get_top_sellers(session, start, end, limit=10):
         .all()
     )
     return rows
+def lookup_imeis(session, imeis):
+    """
+    Resolve IMEIs against sold items and stock in one round-trip.
+    Sold rows come from sale_items (any product), unsold ones from products
+    whose IMEI was never sold; IMEIs matching nothing get a "Not found" row.
+    """
+    from sqlalchemy import select, union_all, null, exists
+    from db import Customer
+    imeis = list(dict.fromkeys(imeis))
+    if not imeis:
+        return []
+    sold = (
+        select(
+            SaleItem.imei.label("imei"), Product.name.label("product"), Product.qty_on_hand.label("qty"),
+            Sale.id.label("sale_id"), Sale.sale_datetime.label("sold_at"),
+            Customer.full_name.label("customer"), Customer.phone.label("phone"),
+            Sale.payment_type.label("payment"), Sale.total_amount.label("amount"),
+        )
+        .select_from(SaleItem)
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .outerjoin(Customer, Customer.id == Sale.customer_id)
+        .outerjoin(Product, Product.id == SaleItem.product_id)
+        .where(SaleItem.imei.in_(imeis))
+    )
+    unsold = (
+        select(
+            Product.imei, Product.name, Product.qty_on_hand,
+            null(), null(), null(), null(), null(), null(),
+        )
+        .where(Product.imei.in_(imeis))
+        .where(~exists().where(SaleItem.imei == Product.imei))
+    )
+    rows = session.execute(union_all(sold, unsold)).mappings().all()
+    out = []
+    for r in rows:
+        if r["sale_id"] is not None:
+            status = "Sold"
+        elif (r["qty"] or 0) > 0:
+            status = f"In stock (qty {r['qty']})"
+        else:
+            status = "Out of stock"
+        out.append({
+            "IMEI": r["imei"],
+            "Status": status,
+            "Product": r["product"],
+            "SaleID": r["sale_id"],
+            "Sold At": r["sold_at"],
+            "Customer": r["customer"],
+            "Phone": r["phone"],
+            "Payment": r["payment"],
+            "Amount": float(r["amount"]) if r["amount"] is not None else None,
+        })
+    matched = {r["IMEI"] for r in out}
+    out += [{"IMEI": i, "Status": "Not found"} for i in imeis if i not in matched]
+    return out
+def _emi_due_filter(start, end):
+    """Due-date window conditions; (None, None) matches every EMI, even those with no due date."""
+    from db import EmiDetail
+    cond = []
+    if start is not None or end is not None:
+        cond.append(EmiDetail.next_due_date.isnot(None))
+    if start is not None:
+        cond.append(EmiDetail.next_due_date >= start)
+    if end is not None:
+        cond.append(EmiDetail.next_due_date < end)
+    return cond
+def count_emis_due(session, start=None, end=None):
+    from db import EmiDetail
+    return session.query(func.count(EmiDetail.id)).filter(*_emi_due_filter(start, end)).scalar() or 0
+def get_emis_due(session, start=None, end=None, limit=50, offset=0):
+    """
+    One page of EMIs with next_due_date in [start, end) (open ends allowed;
+    with neither end, every EMI incl. repaid ones), ordered by due date; range + ORDER BY + LIMIT/OFFSET are served by the
+    next_due_date index.
+    """
+    from sqlalchemy import select
+    from db import EmiDetail, Customer, Company
+    return session.execute(
+        select(
+            EmiDetail.id.label("emi_id"), Sale.id.label("sale_id"), Sale.sale_datetime,
+            Customer.full_name.label("customer"), Customer.phone,
+            Company.company_name.label("company"),
+            EmiDetail.tenure_months, EmiDetail.remaining_installments, EmiDetail.next_due_date,
+            EmiDetail.down_payment,
+            EmiDetail.financed_amount, EmiDetail.emi_amount, EmiDetail.interest_rate,
+        )
+        .select_from(EmiDetail)
+        .outerjoin(Sale, Sale.id == EmiDetail.sale_id)
+        .outerjoin(Customer, Customer.id == Sale.customer_id)
+        .outerjoin(Company, Company.id == EmiDetail.company_id)
+        .where(*_emi_due_filter(start, end))
+        .order_by(EmiDetail.next_due_date, EmiDetail.id)
+        .limit(limit)
+        .offset(offset)
+    ).mappings().all()
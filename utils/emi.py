@@ -0,0 +1,92 @@
+"""
+Vectorized EMI amortization (reducing-balance, monthly installments).
+
+Every function takes scalars or equal-length arrays (one entry per loan) and
+computes all loans in one NumPy pass. Schedules are (loans x months) arrays,
+zero beyond each loan's tenure.
+
+    E = P r (1+r)^n / ((1+r)^n - 1),  r = annual_rate / 12 / 100
+    balance after k installments B_k = P (1+r)^k - E ((1+r)^k - 1) / r
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+class Schedule(NamedTuple):
+    emi: np.ndarray        # (loans,)
+    interest: np.ndarray   # (loans, months) interest part of installment k
+    principal: np.ndarray  # (loans, months) principal part of installment k
+    balance: np.ndarray    # (loans, months) outstanding after installment k
+    due: np.ndarray        # (loans, months) True where k <= tenure
+
+
+def _loans(principal, annual_rate_pct, months):
+    p = np.atleast_1d(np.asarray(principal, dtype=np.float64))
+    r = np.atleast_1d(np.asarray(annual_rate_pct, dtype=np.float64)) / 1200.0
+    n = np.atleast_1d(np.asarray(months, dtype=np.int64))
+    p, r, n = np.broadcast_arrays(p, np.nan_to_num(r), np.maximum(n, 1))
+    return p, r, n
+
+
+def emi_amount(principal, annual_rate_pct, months):
+    """Monthly installment per loan (principal / months when the rate is 0)."""
+    p, r, n = _loans(principal, annual_rate_pct, months)
+    growth = np.power(1.0 + r, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        emi = np.where(r > 0, p * r * growth / (growth - 1.0), p / n)
+    return emi if np.ndim(principal) else float(emi[0])
+
+
+def _balance_after(p, r, emi, k):
+    """Outstanding after k installments; k broadcasts against the loans."""
+    growth = np.power(1.0 + r, k)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bal = np.where(r > 0, p * growth - emi * (growth - 1.0) / np.where(r > 0, r, 1.0), p - emi * k)
+    return np.clip(bal, 0.0, None)
+
+
+def outstanding(principal, annual_rate_pct, months, paid):
+    """Balance per loan after `paid` installments."""
+    p, r, n = _loans(principal, annual_rate_pct, months)
+    k = np.clip(np.broadcast_to(np.asarray(paid, dtype=np.int64), p.shape), 0, n)
+    emi = emi_amount(p, r * 1200.0, n)
+    bal = np.where(k >= n, 0.0, _balance_after(p, r, emi, k))
+    return bal if np.ndim(principal) else float(bal[0])
+
+
+def amortize(principal, annual_rate_pct, months):
+    """Full schedules for all loans at once."""
+    p, r, n = _loans(principal, annual_rate_pct, months)
+    emi = emi_amount(p, r * 1200.0, n)
+    k = np.arange(1, int(n.max(initial=1)) + 1)
+    due = k[None, :] <= n[:, None]
+    p2, r2, e2 = p[:, None], r[:, None], emi[:, None]
+    before = _balance_after(p2, r2, e2, k[None, :] - 1)
+    interest = before * r2
+    principal_part = e2 - interest
+    # last installment clears the float residue
+    last = k[None, :] == n[:, None]
+    principal_part = np.where(last, before, principal_part)
+    balance = np.where(last, 0.0, _balance_after(p2, r2, e2, k[None, :]))
+    return Schedule(
+        emi=emi,
+        interest=np.where(due, interest, 0.0),
+        principal=np.where(due, principal_part, 0.0),
+        balance=np.where(due, balance, 0.0),
+        due=due,
+    )
+
+
+def schedule_frame(principal, annual_rate_pct, months):
+    """One loan's schedule as a DataFrame (Month, EMI, Interest, Principal, Balance)."""
+    s = amortize(principal, annual_rate_pct, months)
+    n = int(s.due[0].sum())
+    return pd.DataFrame({
+        "Month": np.arange(1, n + 1),
+        "EMI": np.round(s.interest[0, :n] + s.principal[0, :n], 2),
+        "Interest": np.round(s.interest[0, :n], 2),
+        "Principal": np.round(s.principal[0, :n], 2),
+        "Balance": np.round(s.balance[0, :n], 2),
+    })
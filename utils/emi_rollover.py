@@ -0,0 +1,66 @@
+"""
+Set-based EMI due-date rollover.
+
+A loan whose next_due_date has passed moves to its next monthly due date and
+loses one remaining installment; after the last one next_due_date becomes
+NULL. Due dates are computed from first_due_date (first_due + n months), so
+month-end dates do not drift: 31 Jan -> 28/29 Feb -> 31 Mar.
+
+Each pass is one UPDATE over every loan still behind `now`; a daily run needs
+one pass, a loan three months behind needs three.
+"""
+from sqlalchemy import update, case, cast, func, literal, literal_column, and_, String, Integer
+
+from db import EmiDetail
+
+MAX_PASSES = 600  # 50 years of monthly installments; guards against a bad row
+
+
+def _add_months(conn, ts, months):
+    """SQL for `ts + months` months, clamped to the target month's last day."""
+    if conn.get_bind().dialect.name == "postgresql":
+        return ts + months * literal_column("interval '1 month'")
+    # SQLite rolls 31 Jan + 1 month over to 3 Mar; take the earlier of that and
+    # the last day of the target month (same time of day)
+    def modifier(value, unit):
+        return literal("+") + cast(value, String) + f" {unit}"
+
+    seconds_of_day = cast(func.strftime("%s", ts), Integer) % 86400
+    plain = func.datetime(ts, modifier(months, "months"))
+    month_end = func.datetime(
+        ts, "start of month", modifier(months + 1, "months"), "-1 day",
+        modifier(seconds_of_day, "seconds"),
+    )
+    return func.min(plain, month_end)
+
+
+def roll_over_due_dates(session, now, since=None):
+    """
+    Advance every loan with since <= next_due_date < now. Returns the number
+    of installments rolled over (rows touched, summed over passes). Idempotent:
+    a second call with the same `now` changes nothing. Caller commits.
+    """
+    e = EmiDetail.__table__.c
+    cond = [e.next_due_date < now, e.remaining_installments > 0, e.first_due_date.isnot(None)]
+    if since is not None:
+        cond.append(e.next_due_date >= since)
+    # right-hand sides see the pre-update row, so n counts the installment being closed
+    n = e.tenure_months - e.remaining_installments + 1
+    stmt = (
+        update(EmiDetail.__table__)
+        .where(and_(*cond))
+        .values(
+            remaining_installments=e.remaining_installments - 1,
+            next_due_date=case(
+                (e.remaining_installments <= 1, None),
+                else_=_add_months(session, e.first_due_date, n),
+            ),
+        )
+    )
+    total = 0
+    for _ in range(MAX_PASSES):
+        rows = session.execute(stmt).rowcount
+        total += rows
+        if not rows:
+            break
+    return total
@@ -0,0 +1,224 @@
+"""
+Streaming exports of sales, sale items, EMIs and stock movements.
+
+Rows are read in CHUNK_ROWS partitions (server-side cursor on Postgres via
+stream_results; SQLite's cursor is lazy already) and written straight to a
+CSV or Parquet file, so memory stays flat whatever the row count. Each query
+is ordered along the index it range-scans (sale_datetime / timestamp), so the
+database streams rows as it finds them instead of sorting the whole range.
+
+    python -m utils.exports sale_items --start 2025-01-01 --end 2025-04-01 -o q1_items.csv
+    python -m utils.exports sales --start 2025-01-01 --end 2025-04-01 --format parquet -o q1.parquet
+"""
+import argparse
+import csv
+import datetime
+import os
+import tempfile
+import time
+
+from sqlalchemy import select, Integer, Numeric, Float, Date, DateTime, Boolean
+
+from db import (
+    read_engine_for_reports, Sale, SaleItem, Product, Customer, Company, EmiDetail, StockMovement, User, IST,
+)
+
+CHUNK_ROWS = 20_000
+EXPORT_DIR = os.path.join("data", "exports")
+EXPORT_KEEP_HOURS = 24
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+def _sales(start, end):
+    return (
+        select(
+            Sale.id.label("sale_id"), Sale.sale_datetime, Customer.full_name.label("customer"),
+            Customer.phone, Sale.payment_type, Sale.total_amount, User.username.label("sold_by"),
+            Sale.notes,
+        )
+        .outerjoin(Customer, Customer.id == Sale.customer_id)
+        .outerjoin(User, User.id == Sale.user_id)
+        .where(Sale.sale_datetime >= start, Sale.sale_datetime < end)
+        .order_by(Sale.sale_datetime, Sale.id)
+    )
+
+
+def _sale_items(start, end):
+    return (
+        select(
+            SaleItem.id.label("item_id"), SaleItem.sale_id, Sale.sale_datetime, Sale.payment_type,
+            SaleItem.product_id, Product.sku, Product.name.label("product"), SaleItem.imei,
+            SaleItem.qty, SaleItem.unit_price, SaleItem.line_total,
+        )
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .outerjoin(Product, Product.id == SaleItem.product_id)
+        .where(Sale.sale_datetime >= start, Sale.sale_datetime < end)
+        .order_by(Sale.sale_datetime, Sale.id, SaleItem.id)
+    )
+
+
+def _emis(start, end):
+    return (
+        select(
+            EmiDetail.id.label("emi_id"), EmiDetail.sale_id, Sale.sale_datetime,
+            Customer.full_name.label("customer"), Customer.phone,
+            Company.company_name.label("company"), EmiDetail.down_payment,
+            EmiDetail.financed_amount, EmiDetail.tenure_months, EmiDetail.interest_rate,
+            EmiDetail.emi_amount, EmiDetail.remaining_installments, EmiDetail.next_due_date,
+        )
+        .join(Sale, Sale.id == EmiDetail.sale_id)
+        .outerjoin(Customer, Customer.id == Sale.customer_id)
+        .outerjoin(Company, Company.id == EmiDetail.company_id)
+        .where(Sale.sale_datetime >= start, Sale.sale_datetime < end)
+        .order_by(Sale.sale_datetime, Sale.id, EmiDetail.id)
+    )
+
+
+def _stock_movements(start, end):
+    return (
+        select(
+            StockMovement.id.label("movement_id"), StockMovement.timestamp, StockMovement.product_id,
+            Product.sku, Product.name.label("product"), StockMovement.change_qty,
+            StockMovement.reason, StockMovement.ref_sale_id, User.username.label("user"),
+        )
+        .outerjoin(Product, Product.id == StockMovement.product_id)
+        .outerjoin(User, User.id == StockMovement.user_id)
+        .where(StockMovement.timestamp >= start, StockMovement.timestamp < end)
+        .order_by(StockMovement.timestamp, StockMovement.id)
+    )
+
+
+EXPORTS = {
+    "sales": ("Sales", _sales),
+    "sale_items": ("Sale line items", _sale_items),
+    "emis": ("EMIs (by sale date)", _emis),
+    "stock_movements": ("Stock movements", _stock_movements),
+}
+
+
+def day_range(start_day, end_day):
+    """[start 00:00, end+1 00:00) in IST for an inclusive date range."""
+    start = IST.localize(datetime.datetime.combine(start_day, datetime.time(0)))
+    end = IST.localize(datetime.datetime.combine(end_day + datetime.timedelta(days=1), datetime.time(0)))
+    return start, end
+
+
+def iter_chunks(stmt, chunk_rows=CHUNK_ROWS):
+    """Yield lists of row tuples from a streaming cursor."""
+    with read_engine_for_reports().connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_rows).execute(stmt)
+        for part in result.partitions():
+            yield part
+
+
+def _write_csv(stmt, path, chunk_rows):
+    n = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow([c.name for c in stmt.selected_columns])
+        for part in iter_chunks(stmt, chunk_rows):
+            w.writerows(part)
+            n += len(part)
+    return n
+
+
+def _arrow_type(pa, sa_type):
+    if isinstance(sa_type, Boolean):
+        return pa.bool_()
+    if isinstance(sa_type, Integer):
+        return pa.int64()
+    if isinstance(sa_type, (Numeric, Float)):
+        return pa.float64()
+    if isinstance(sa_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(sa_type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def _write_parquet(stmt, path, chunk_rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    cols = list(stmt.selected_columns)
+    schema = pa.schema([(c.name, _arrow_type(pa, c.type)) for c in cols])
+    floats = [i for i, f in enumerate(schema) if pa.types.is_floating(f.type)]
+    stamps = [i for i, f in enumerate(schema) if pa.types.is_timestamp(f.type)]
+    n = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for part in iter_chunks(stmt, chunk_rows):
+            columns = [list(c) for c in zip(*part)]
+            for i in floats:
+                columns[i] = [None if v is None else float(v) for v in columns[i]]
+            for i in stamps:
+                # IST wall time, as shown in the app
+                columns[i] = [v.astimezone(IST).replace(tzinfo=None) if v is not None and v.tzinfo else v
+                              for v in columns[i]]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(c, type=f.type) for c, f in zip(columns, schema)], schema=schema
+            ))
+            n += len(part)
+    return n
+
+
+def export(kind, start, end, fmt="csv", path=None, chunk_rows=CHUNK_ROWS):
+    """
+    Stream export `kind` for [start, end) into a file; returns (path, rows).
+    Writes to a unique temp name first, so a half-written file is never
+    picked up and concurrent exports of the same range do not collide.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {sorted(FORMATS)}")
+    stmt = EXPORTS[kind][1](start, end)
+    if path is None:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        prune_exports()
+        path = os.path.join(EXPORT_DIR, export_name(kind, start, end, fmt))
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".",
+                                     suffix=".tmp", delete=False) as f:
+        tmp = f.name
+    try:
+        rows = (_write_parquet if fmt == "parquet" else _write_csv)(stmt, tmp, chunk_rows)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path, rows
+
+
+def prune_exports(max_age_hours=EXPORT_KEEP_HOURS, export_dir=EXPORT_DIR):
+    """Remove exports (and abandoned temp files) older than max_age_hours; returns the count."""
+    if not os.path.isdir(export_dir):
+        return 0
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for entry in os.scandir(export_dir):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass  # removed by a concurrent prune
+    return removed
+
+
+def export_name(kind, start, end, fmt):
+    last = (end - datetime.timedelta(days=1)).date()
+    return f"{kind}_{start.date():%Y%m%d}-{last:%Y%m%d}.{fmt}"
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m utils.exports")
+    ap.add_argument("kind", choices=sorted(EXPORTS))
+    ap.add_argument("--start", type=datetime.date.fromisoformat, required=True)
+    ap.add_argument("--end", type=datetime.date.fromisoformat, required=True, help="exclusive")
+    ap.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    ap.add_argument("-o", "--output")
+    args = ap.parse_args(argv)
+    start, end = day_range(args.start, args.end - datetime.timedelta(days=1))
+    path, rows = export(args.kind, start, end, args.format, args.output)
+    print(f"{rows} row(s) -> {path}")
+
+
+if __name__ == "__main__":
+    main()
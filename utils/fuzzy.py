@@ -0,0 +1,138 @@
+"""
+Fuzzy product-name matching for the bulk importers.
+
+Names are reduced to a key of lowercase letter / digit runs, so case,
+spacing and punctuation do not matter ("Redmi Note13 Pro (5G)" and "Redmi
+Note 13 Pro 5G" are both "redmi note 13 pro 5 g"), and compared by the Dice
+coefficient of the trigrams of the key with its spaces removed. A candidate
+whose numbers differ (storage, model number) has its score scaled by
+NUMBER_MISMATCH, so "128GB" does not quietly match "256GB".
+
+NameMatcher is built once per catalog snapshot (get_name_matcher). Equal
+keys are a dict hit; other names cost one bincount over the trigram
+postings, once per distinct name in the upload. Scores >= AUTO_MATCH are
+taken as matches (and flagged for review in the preview); scores >=
+SUGGEST are only shown as hints.
+"""
+import re
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sqlalchemy import select
+
+from db import Product, stock_version
+from utils.catalog import get_catalog
+
+TOKEN_RE = re.compile(r"[a-z]+|\d+")
+AUTO_MATCH = 0.9
+SUGGEST = 0.6
+NUMBER_MISMATCH = 0.7
+
+
+def name_tokens(name):
+    return TOKEN_RE.findall(str(name).lower()) if name else []
+
+
+def name_key(name):
+    """Normalized name used for exact comparison ("" for blank names)."""
+    return " ".join(name_tokens(name))
+
+
+def _grams(key):
+    s = key.replace(" ", "")
+    return {s[i:i + 3] for i in range(len(s) - 2)} or ({s} if s else set())
+
+
+def _numbers(tokens):
+    return frozenset(t for t in tokens if t.isdigit())
+
+
+class NameMatcher:
+    def __init__(self, ids, names):
+        self.ids = np.asarray(list(ids), dtype=np.int64)
+        self.names = list(names)
+        self.by_key = {}
+        self.n_grams = np.zeros(len(self.names), dtype=np.int32)
+        self.numbers = []
+        postings = defaultdict(list)
+        for row, name in enumerate(self.names):
+            toks = name_tokens(name)
+            key = " ".join(toks)
+            if key and (key not in self.by_key or self.ids[row] < self.ids[self.by_key[key]]):
+                self.by_key[key] = row
+            grams = _grams(key)
+            self.n_grams[row] = len(grams)
+            self.numbers.append(_numbers(toks))
+            for g in grams:
+                postings[g].append(row)
+        self.postings = {g: np.array(rows, dtype=np.int32) for g, rows in postings.items()}
+
+    @classmethod
+    def from_session(cls, session):
+        rows = session.execute(select(Product.id, Product.name).order_by(Product.id)).all()
+        return cls([r.id for r in rows], [r.name for r in rows])
+
+    def __len__(self):
+        return len(self.names)
+
+    def match(self, name, k=3):
+        """Up to k (product_id, name, score) for one name, best first."""
+        toks = name_tokens(name)
+        key = " ".join(toks)
+        if not key:
+            return []
+        if key in self.by_key:
+            row = self.by_key[key]
+            return [(int(self.ids[row]), self.names[row], 1.0)]
+        grams = _grams(key)
+        lists = [self.postings[g] for g in grams if g in self.postings]
+        if not lists:
+            return []
+        common = np.bincount(np.concatenate(lists), minlength=len(self.names))
+        cand = np.flatnonzero(common)
+        scores = 2.0 * common[cand] / (len(grams) + self.n_grams[cand])
+        if len(cand) > k * 4:
+            # a few times k by raw score, then the number check can reorder them
+            top = np.argpartition(-scores, k * 4 - 1)[:k * 4]
+            cand, scores = cand[top], scores[top]
+        numbers = _numbers(toks)
+        out = [
+            (int(self.ids[row]), self.names[row],
+             float(s) * (1.0 if self.numbers[row] == numbers else NUMBER_MISMATCH))
+            for row, s in zip(cand, scores)
+        ]
+        out.sort(key=lambda m: (-m[2], m[0]))
+        return out[:k]
+
+    def best(self, names):
+        """
+        Best match per name of a Series: DataFrame on the same index with
+        fuzzy_id (NaN if none), fuzzy_name and fuzzy_score.
+        """
+        memo = {}
+        for name in names.dropna().unique():
+            hits = self.match(name, k=1)
+            memo[name] = hits[0] if hits else (np.nan, None, 0.0)
+        cols = [memo.get(n, (np.nan, None, 0.0)) if pd.notna(n) else (np.nan, None, 0.0) for n in names]
+        return pd.DataFrame(cols, index=names.index, columns=["fuzzy_id", "fuzzy_name", "fuzzy_score"])
+
+
+def review_note(name, score, matched):
+    """Preview text for a fuzzy match (matched=True) or a below-threshold hint."""
+    if name is None or score < SUGGEST:
+        return ""
+    return f"fuzzy {score:.2f}: {name}" if matched else f"did you mean {name}? ({score:.2f})"
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _build_matcher(version, catalog_id, _catalog):
+    catalog = _catalog.sort_values("id")
+    return NameMatcher(catalog["id"], catalog["name"])
+
+
+def get_name_matcher():
+    """Name matcher for the current catalog snapshot."""
+    catalog = get_catalog()
+    return _build_matcher(stock_version(), id(catalog), catalog)
@@ -0,0 +1,140 @@
+"""
+Scheduled batch jobs with a per-job watermark in `job_runs`.
+
+Each job gets (session, since, now): `since` is the previous successful
+run's cutoff (None on the first run or with --full) and `now` this run's
+cutoff, which becomes the new watermark when the job commits. Jobs must be
+idempotent, so overlapping runs from several app processes are harmless.
+
+    python -m utils.jobs list
+    python -m utils.jobs run emi-rollover [--full]
+    python -m utils.jobs run stock-snapshot
+    python -m utils.jobs run customer-dedupe [--full]
+
+In the app, start_job_scheduler() runs due jobs from a daemon thread.
+"""
+import argparse
+import datetime
+import threading
+
+from db import SessionLocal, JobRun, IST
+from utils.emi_rollover import roll_over_due_dates
+from utils.phones import merge_duplicates
+from utils.stock_ledger import snapshot_if_due
+
+SCHEDULER_POLL_SECONDS = 60
+
+
+def _emi_rollover(session, since, now):
+    return roll_over_due_dates(session, now, since)
+
+
+def _stock_snapshot(session, since, now):
+    taken = snapshot_if_due(session)
+    return taken[1] if taken else 0
+
+
+def _customer_dedupe(session, since, now):
+    # first run / --full re-checks every customer, later runs only new numbers
+    return merge_duplicates(session, full=since is None)["customers_merged"]
+
+
+# name -> (fn(session, since, now) -> rows affected, run every)
+JOBS = {
+    "emi-rollover": (_emi_rollover, datetime.timedelta(hours=1)),
+    "stock-snapshot": (_stock_snapshot, datetime.timedelta(hours=1)),
+    "customer-dedupe": (_customer_dedupe, datetime.timedelta(hours=1)),
+}
+
+
+def run_job(name, full=False, now=None):
+    """Run one job in its own transaction; returns rows affected."""
+    fn, _ = JOBS[name]
+    now = now or datetime.datetime.now(IST)
+    session = SessionLocal()
+    try:
+        state = session.get(JobRun, name) or JobRun(name=name)
+        since = None if full else state.watermark
+        try:
+            rows = fn(session, since, now)
+        except Exception as e:
+            session.rollback()
+            state = session.get(JobRun, name) or JobRun(name=name)
+            state.last_started_at = now
+            state.last_error = f"{type(e).__name__}: {e}"
+            session.merge(state)
+            session.commit()
+            raise
+        state.watermark = now
+        state.last_started_at = now
+        state.last_finished_at = datetime.datetime.now(IST)
+        state.last_rows = rows
+        state.last_error = None
+        session.merge(state)
+        session.commit()
+        return rows
+    finally:
+        session.close()
+
+
+def due_jobs(session, now=None):
+    """Names of jobs not started within their interval."""
+    now = now or datetime.datetime.now(IST)
+    due = []
+    for name, (_, every) in JOBS.items():
+        recent = session.query(JobRun.name).filter(
+            JobRun.name == name, JobRun.last_started_at > now - every
+        ).first()
+        if recent is None:
+            due.append(name)
+    return due
+
+
+def _scheduler_loop(stop, poll):
+    while not stop.is_set():
+        session = SessionLocal()
+        try:
+            names = due_jobs(session)
+        except Exception:
+            names = []
+        finally:
+            session.close()
+        for name in names:
+            try:
+                run_job(name)
+            except Exception:
+                pass  # recorded in job_runs.last_error; retried next interval
+        stop.wait(poll)
+
+
+def start_job_scheduler(poll=SCHEDULER_POLL_SECONDS):
+    """Start the daemon scheduler thread; returns its stop Event."""
+    stop = threading.Event()
+    threading.Thread(target=_scheduler_loop, args=(stop, poll), name="job-scheduler", daemon=True).start()
+    return stop
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m utils.jobs")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="jobs and their last run")
+    rn = sub.add_parser("run", help="run a job now")
+    rn.add_argument("name", choices=sorted(JOBS))
+    rn.add_argument("--full", action="store_true", help="ignore the watermark")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "run":
+        rows = run_job(args.name, full=args.full)
+        print(f"{args.name}: {rows} row(s).")
+        return
+    with SessionLocal() as session:
+        runs = {r.name: r for r in session.query(JobRun).all()}
+    for name, (_, every) in JOBS.items():
+        r = runs.get(name)
+        last = f"last {r.last_finished_at:%Y-%m-%d %H:%M}, {r.last_rows} row(s)" if r and r.last_finished_at else "never run"
+        err = f", error: {r.last_error}" if r and r.last_error else ""
+        print(f"{name:16} every {every}  {last}{err}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+OCR for uploaded bills.
+
+- PDF pages are rasterized + OCR'd one page per task in a process pool
+  (keeps the Streamlit script thread free and uses every core).
+- With `stop_on_imei=True` pages are processed in waves and the job stops
+  after the first wave whose text contains a check-digit-valid IMEI.
+- Extracted text is cached on disk under data/ocr_cache/<sha256>.txt, so a
+  rerun or re-upload of the same bytes costs one file read.
+
+Tesseract / pdf2image are optional and imported on first use; without them
+the helpers return "".
+"""
+import hashlib
+import io
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.scanning import extract_valid_imeis
+
+_tess = None
+_pdf2image = None
+
+
+def _tesseract():
+    """(pytesseract, PIL.Image) or None; imported on first OCR, not at page load."""
+    global _tess
+    if _tess is None:
+        try:
+            import pytesseract
+            from PIL import Image
+            _tess = (pytesseract, Image)
+        except Exception:
+            _tess = False
+    return _tess or None
+
+
+def _pdf_backend():
+    global _pdf2image
+    if _pdf2image is None:
+        try:
+            import pdf2image
+            _pdf2image = pdf2image
+        except Exception:
+            _pdf2image = False
+    return _pdf2image or None
+
+
+OCR_CACHE_DIR = os.path.join("data", "ocr_cache")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or max(1, min(4, os.cpu_count() or 1))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def bytes_digest(data) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _cache_file(digest, partial=False):
+    return os.path.join(OCR_CACHE_DIR, f"{digest}{'.partial' if partial else ''}.txt")
+
+
+def _read_cache(digest, allow_partial=False):
+    paths = [_cache_file(digest)] + ([_cache_file(digest, True)] if allow_partial else [])
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            continue
+    return None
+
+
+def _write_cache(digest, text, partial=False):
+    try:
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        path = _cache_file(digest, partial)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking the multi-threaded Streamlit server is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _ocr_pdf_page(data: bytes, page_no: int) -> str:
+    """Worker: rasterize + OCR a single 1-based PDF page."""
+    pytesseract, _ = _tesseract()
+    images = _pdf_backend().convert_from_bytes(data, first_page=page_no, last_page=page_no)
+    return "\n".join(pytesseract.image_to_string(img) for img in images)
+
+
+def ocr_image_bytes(data: bytes, use_cache: bool = True) -> str:
+    if not _tesseract():
+        return ""
+    pytesseract, Image = _tesseract()
+    data = bytes(data)
+    digest = bytes_digest(data)
+    if use_cache:
+        cached = _read_cache(digest)
+        if cached is not None:
+            return cached
+    try:
+        text = pytesseract.image_to_string(Image.open(io.BytesIO(data)))
+    except Exception:
+        return ""
+    if use_cache:
+        _write_cache(digest, text)
+    return text
+
+
+def ocr_pdf_bytes(data: bytes, stop_on_imei: bool = False, use_cache: bool = True) -> str:
+    if not (_tesseract() and _pdf_backend()):
+        return ""
+    data = bytes(data)
+    digest = bytes_digest(data)
+    if use_cache:
+        cached = _read_cache(digest, allow_partial=stop_on_imei)
+        if cached is not None:
+            return cached
+    try:
+        n_pages = int(_pdf_backend().pdfinfo_from_bytes(data)["Pages"])
+        pool = _get_pool()
+        pages = list(range(1, n_pages + 1))
+        wave = OCR_WORKERS if stop_on_imei else n_pages
+        texts = []
+        stopped = False
+        for i in range(0, n_pages, wave):
+            batch = pages[i:i + wave]
+            texts.extend(pool.map(_ocr_pdf_page, [data] * len(batch), batch))
+            if stop_on_imei and i + wave < n_pages and extract_valid_imeis("\n".join(texts)):
+                stopped = True
+                break
+    except Exception:
+        return ""
+    text = "\n".join(texts)
+    if use_cache:
+        _write_cache(digest, text, partial=stopped)
+    return text
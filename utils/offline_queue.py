@@ -0,0 +1,360 @@
+"""
+Offline-first sale queue: a local SQLite outbox in front of the primary DB.
+
+With `[db] offline_queue` (env DB_OFFLINE_QUEUE) set, "Submit Sale" can
+write the sale to a local SQLite file instead of waiting on the uplink:
+
+- "always":   every sale goes to the outbox; the syncer sends it at once.
+- "fallback": sales commit directly; when the primary is unreachable (or
+              queued sales are still waiting, to keep order) they are queued.
+- "off":      no outbox (default).
+
+A queued sale gets a local id (L-<n>) and a client_ref UUID. The syncer
+thread replays pending sales in order, SYNC_BATCH per primary transaction,
+through checkout() with sales.client_ref as a unique replay guard: a sale
+whose ref is already on the primary (synced, but the outbox was not
+updated) is just marked synced. If a batch fails for any reason other than
+a connection error (stock shortage, integrity error, bad payload) it is
+retried sale by sale: a ref that turns out to be on the primary is marked
+synced, the other failing sales become "conflict" (with the error) for an
+owner/admin to retry (after restocking) or discard, so one bad sale never
+holds up the ones behind it. Connection errors leave the batch pending.
+
+Queued lines are subtracted from the catalog (utils/catalog.py) until they
+sync, so local stock views match the counter. The sale keeps the time it
+was rung up; its stock movements are stamped at sync time, since stock
+snapshots assume movements arrive in timestamp order.
+
+    python -m utils.offline_queue status
+    python -m utils.offline_queue sync
+    python -m utils.offline_queue retry 12 | discard 12
+"""
+import argparse
+import datetime
+import json
+import os
+import threading
+import uuid
+
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, String, DateTime, Text, ForeignKey,
+    create_engine, event, select, insert, update, func,
+)
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError
+
+from db import IST, Sale, SessionLocal, _get_db_setting, _sqlite_pragmas
+from utils.checkout import checkout, StockShortError
+
+MODES = ("off", "fallback", "always")
+DEFAULT_OUTBOX_URL = "sqlite:///data/outbox.db"
+SYNC_BATCH = 50
+SYNC_POLL_SECONDS = 5
+MAX_BACKOFF_SECONDS = 60
+UNSYNCED = ("pending", "conflict")  # still hold stock locally
+
+_meta = MetaData()
+outbox_sales = Table(
+    "outbox_sales", _meta,
+    Column("local_id", Integer, primary_key=True),
+    Column("client_ref", String(36), nullable=False, unique=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("payload", Text, nullable=False),  # JSON: checkout() arguments
+    Column("status", String(16), nullable=False, default="pending", index=True),  # pending/synced/conflict/discarded
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("last_error", Text),
+    Column("sale_id", Integer),  # primary sales.id once synced
+    Column("synced_at", DateTime),
+)
+outbox_lines = Table(
+    "outbox_lines", _meta,
+    Column("local_id", Integer, ForeignKey("outbox_sales.local_id"), primary_key=True),
+    Column("line_no", Integer, primary_key=True),
+    Column("product_id", Integer, nullable=False, index=True),
+    Column("qty", Integer, nullable=False),
+)
+
+
+def queue_mode():
+    mode = str(_get_db_setting("offline_queue", "off")).strip().lower()
+    return mode if mode in MODES else "off"
+
+
+def _payload(cart, user_id, payment_type, total_amount, customer_phone, customer_name, emi, sold_at):
+    if emi:
+        emi = {k: emi[k] for k in ("company_id", "down", "financed", "tenure", "interest", "emi_amount")} | {
+            "next_due_date": emi["next_due_date"].isoformat()}
+    return json.dumps({
+        "cart": [{k: line.get(k) for k in ("product_id", "name", "qty", "price", "imei")} for line in cart],
+        "user_id": user_id, "payment_type": payment_type, "total_amount": float(total_amount),
+        "customer_phone": customer_phone, "customer_name": customer_name, "emi": emi,
+        "sold_at": sold_at.isoformat(),
+    })
+
+
+def _checkout_args(payload):
+    args = json.loads(payload)
+    if args["emi"]:
+        args["emi"]["next_due_date"] = datetime.datetime.fromisoformat(args["emi"]["next_due_date"])
+    args["sale_datetime"] = datetime.datetime.fromisoformat(args.pop("sold_at"))
+    return args
+
+
+class Outbox:
+    """Local SQLite outbox file; safe to share between threads."""
+
+    def __init__(self, url=DEFAULT_OUTBOX_URL):
+        if url.startswith("sqlite:///") and not url.startswith("sqlite:////"):
+            os.makedirs(os.path.dirname(url[len("sqlite:///"):]) or ".", exist_ok=True)
+        self.engine = create_engine(url, connect_args={"check_same_thread": False})
+        event.listen(self.engine, "connect", _sqlite_pragmas)
+        _meta.create_all(bind=self.engine)
+        self.version = 0  # bumped on every change; catalog cache key
+        self.wake = threading.Event()
+
+    def _changed(self):
+        self.version += 1
+        self.wake.set()
+
+    def enqueue(self, cart, user_id, payment_type, total_amount,
+                customer_phone=None, customer_name=None, emi=None):
+        """Queue a sale; returns its local id. Takes milliseconds, no network."""
+        now = datetime.datetime.now(IST)
+        with self.engine.begin() as conn:
+            local_id = conn.execute(insert(outbox_sales).values(
+                client_ref=str(uuid.uuid4()), created_at=now, status="pending",
+                payload=_payload(cart, user_id, payment_type, total_amount,
+                                 customer_phone, customer_name, emi, now),
+            )).inserted_primary_key[0]
+            conn.execute(insert(outbox_lines), [
+                {"local_id": local_id, "line_no": n, "product_id": int(line["product_id"]), "qty": int(line["qty"])}
+                for n, line in enumerate(cart, start=1)
+            ])
+        self._changed()
+        return local_id
+
+    def pending_stock(self):
+        """{product_id: qty} held by sales not yet on the primary."""
+        with self.engine.connect() as conn:
+            return dict(conn.execute(
+                select(outbox_lines.c.product_id, func.sum(outbox_lines.c.qty))
+                .join(outbox_sales, outbox_sales.c.local_id == outbox_lines.c.local_id)
+                .where(outbox_sales.c.status.in_(UNSYNCED))
+                .group_by(outbox_lines.c.product_id)
+            ).all())
+
+    def counts(self):
+        with self.engine.connect() as conn:
+            return dict(conn.execute(
+                select(outbox_sales.c.status, func.count()).group_by(outbox_sales.c.status)
+            ).all())
+
+    def entries(self, statuses=UNSYNCED, limit=SYNC_BATCH):
+        """Oldest entries with the given statuses, as mappings."""
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(outbox_sales).where(outbox_sales.c.status.in_(statuses))
+                .order_by(outbox_sales.c.local_id).limit(limit)
+            ).mappings().all()
+
+    def _set(self, local_ids, **values):
+        if local_ids:
+            with self.engine.begin() as conn:
+                conn.execute(update(outbox_sales).where(outbox_sales.c.local_id.in_(local_ids)).values(**values))
+            self._changed()
+
+    def mark_synced(self, sale_ids):
+        """sale_ids: {local_id: primary sales.id}."""
+        now = datetime.datetime.now(IST)
+        with self.engine.begin() as conn:
+            for local_id, sale_id in sale_ids.items():
+                conn.execute(update(outbox_sales).where(outbox_sales.c.local_id == local_id).values(
+                    status="synced", sale_id=sale_id, synced_at=now, last_error=None,
+                    attempts=outbox_sales.c.attempts + 1,
+                ))
+        if sale_ids:
+            self._changed()
+
+    def mark_conflicts(self, errors):
+        """errors: {local_id: message}."""
+        with self.engine.begin() as conn:
+            for local_id, msg in errors.items():
+                conn.execute(update(outbox_sales).where(outbox_sales.c.local_id == local_id).values(
+                    status="conflict", last_error=msg, attempts=outbox_sales.c.attempts + 1,
+                ))
+        if errors:
+            self._changed()
+
+    def mark_failed_attempt(self, local_ids, msg):
+        with self.engine.begin() as conn:
+            conn.execute(update(outbox_sales).where(outbox_sales.c.local_id.in_(local_ids)).values(
+                last_error=msg, attempts=outbox_sales.c.attempts + 1,
+            ))
+
+    def retry(self, local_id):
+        self._set([local_id], status="pending")
+
+    def discard(self, local_id):
+        self._set([local_id], status="discarded")
+
+
+# ------------------------------------------------------------------
+# Sync
+# ------------------------------------------------------------------
+def _apply(session, entries):
+    """checkout() each entry in the open transaction; {local_id: sale id}."""
+    done = {}
+    for e in entries:
+        sale = checkout(session, client_ref=e["client_ref"], **_checkout_args(e["payload"]))
+        done[e["local_id"]] = sale.id
+    return done
+
+
+def _is_connection_error(err):
+    """True for errors worth retrying later: the primary is unreachable, not the entry bad."""
+    return isinstance(err, OperationalError) or (isinstance(err, DBAPIError) and err.connection_invalidated)
+
+
+def _apply_one(session, e):
+    """
+    Replay one entry on its own: ("synced", sale id) or ("conflict", message).
+    Only connection errors propagate, so one bad entry never blocks the queue.
+    """
+    try:
+        sale_id = _apply(session, [e])[e["local_id"]]
+        session.commit()
+        return "synced", sale_id
+    except StockShortError as err:
+        session.rollback()
+        return "conflict", f"Sale not synced. {err}"
+    except IntegrityError as err:
+        session.rollback()
+        # another process replayed the same client_ref: already on the primary
+        sale_id = session.execute(select(Sale.id).where(Sale.client_ref == e["client_ref"])).scalar()
+        if sale_id is not None:
+            return "synced", sale_id
+        return "conflict", f"Sale not synced. {type(err).__name__}: {str(err.orig or err).splitlines()[0]}"
+    except Exception as err:
+        session.rollback()
+        if _is_connection_error(err):
+            raise
+        return "conflict", f"Sale not synced. {type(err).__name__}: {(str(err).splitlines() or [''])[0]}"
+
+
+def sync_once(outbox, session_factory=SessionLocal, batch=SYNC_BATCH):
+    """
+    Replay up to `batch` pending sales to the primary. Returns
+    {"synced": n, "conflicts": n, "pending": n left in this batch}. Connection
+    errors propagate (nothing is lost; the entries stay pending).
+    """
+    entries = outbox.entries(("pending",), batch)
+    if not entries:
+        return {"synced": 0, "conflicts": 0, "pending": 0}
+    session = session_factory()
+    try:
+        try:
+            known = dict(session.execute(
+                select(Sale.client_ref, Sale.id).where(Sale.client_ref.in_([e["client_ref"] for e in entries]))
+            ).all())
+            synced = {e["local_id"]: known[e["client_ref"]] for e in entries if e["client_ref"] in known}
+            todo = [e for e in entries if e["client_ref"] not in known]
+            conflicts = {}
+            try:
+                synced.update(_apply(session, todo))
+                session.commit()
+            except Exception as err:
+                # stock sold meanwhile, a concurrent replay, a constraint violation or a
+                # bad payload: replay one by one so only the offending sale(s) become conflicts
+                session.rollback()
+                if _is_connection_error(err):
+                    raise
+                for e in todo:
+                    state, value = _apply_one(session, e)
+                    (synced if state == "synced" else conflicts)[e["local_id"]] = value
+        except Exception as e:
+            session.rollback()
+            outbox.mark_failed_attempt([x["local_id"] for x in entries], f"{type(e).__name__}: {e}")
+            raise
+    finally:
+        session.close()
+    outbox.mark_synced(synced)
+    outbox.mark_conflicts(conflicts)
+    return {"synced": len(synced), "conflicts": len(conflicts), "pending": 0}
+
+
+def sync_all(outbox, session_factory=SessionLocal, batch=SYNC_BATCH):
+    """Sync until nothing is pending; returns totals."""
+    total = {"synced": 0, "conflicts": 0}
+    while True:
+        done = sync_once(outbox, session_factory, batch)
+        total["synced"] += done["synced"]
+        total["conflicts"] += done["conflicts"]
+        if not done["synced"] and not done["conflicts"]:
+            return total
+
+
+def _syncer_loop(outbox, stop):
+    delay = SYNC_POLL_SECONDS
+    while not stop.is_set():
+        outbox.wake.wait(delay)
+        outbox.wake.clear()
+        if stop.is_set():
+            break
+        try:
+            sync_all(outbox)
+            delay = SYNC_POLL_SECONDS
+        except Exception:
+            # primary unreachable: back off, the entries stay pending
+            delay = min(delay * 2, MAX_BACKOFF_SECONDS)
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    """Process-wide outbox at `[db] outbox_url` (env DB_OUTBOX_URL)."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox(_get_db_setting("outbox_url", DEFAULT_OUTBOX_URL))
+        return _outbox
+
+
+def start_outbox_syncer():
+    """Start the daemon syncer thread (when the queue is on); returns its stop Event."""
+    stop = threading.Event()
+    if queue_mode() == "off":
+        return stop
+    outbox = get_outbox()
+    outbox.wake.set()  # drain whatever an earlier process left behind
+    threading.Thread(target=_syncer_loop, args=(outbox, stop), name="outbox-syncer", daemon=True).start()
+    return stop
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m utils.offline_queue")
+    ap.add_argument("--outbox", help="outbox URL (default: [db] outbox_url / DB_OUTBOX_URL)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="entry counts and unsynced sales")
+    sub.add_parser("sync", help="replay pending sales to the primary now")
+    for cmd in ("retry", "discard"):
+        p = sub.add_parser(cmd, help=f"{cmd} a conflicting sale")
+        p.add_argument("local_id", type=int)
+    args = ap.parse_args(argv)
+    outbox = Outbox(args.outbox) if args.outbox else get_outbox()
+
+    if args.cmd == "sync":
+        print(sync_all(outbox))
+    elif args.cmd == "retry":
+        outbox.retry(args.local_id)
+    elif args.cmd == "discard":
+        outbox.discard(args.local_id)
+    else:
+        print(outbox.counts())
+        for e in outbox.entries(UNSYNCED, limit=1000):
+            err = f"  {e['last_error']}" if e["last_error"] else ""
+            print(f"L-{e['local_id']:<6} {e['status']:9} {e['created_at']:%Y-%m-%d %H:%M}  tries {e['attempts']}{err}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Customer phone numbers: E.164 normalization, duplicate merging, prefix lookup.
+
+customers.phone keeps the number as entered; customers.phone_e164 holds the
+canonical form ("+919876543210") under a unique index. checkout() finds
+customers by it, so "98765 43210", "+91 98765-43210" and "09876543210" are
+one customer. Numbers that cannot be normalized keep phone_e164 NULL.
+
+merge_duplicates() folds customers sharing a normalized number into one
+(the current holder of the number, else the oldest), re-pointing their
+sales in bulk. Migration 7 runs it over all customers before creating the
+unique index; the customer-dedupe job then picks up rows written by other
+paths (imports, hand edits).
+
+    python -m utils.phones dedupe [--dry-run]
+"""
+import argparse
+import re
+
+from sqlalchemy import select, update, delete, case, func, bindparam
+
+from db import Customer, Sale, SaleItem, Product
+from utils.bulk_import import _chunks
+
+COUNTRY_CODE = "91"
+NATIONAL_DIGITS = 10
+MIN_PREFIX_DIGITS = 3
+PLACEHOLDER_NAMES = {"", "unknown"}
+
+
+def to_e164(phone):
+    """'+919876543210' for Indian numbers in any common format or '+CC...' input; None if unparseable."""
+    if phone is None:
+        return None
+    raw = str(phone).strip()
+    digits = re.sub(r"\D", "", raw)
+    if raw.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif len(digits) == NATIONAL_DIGITS + 1 and digits.startswith("0"):
+        digits = COUNTRY_CODE + digits[1:]
+    elif len(digits) == NATIONAL_DIGITS:
+        digits = COUNTRY_CODE + digits
+    elif not (len(digits) == len(COUNTRY_CODE) + NATIONAL_DIGITS and digits.startswith(COUNTRY_CODE)):
+        return None
+    if not 8 <= len(digits) <= 15 or digits.startswith("0"):
+        return None
+    if digits.startswith(COUNTRY_CODE) and len(digits) != len(COUNTRY_CODE) + NATIONAL_DIGITS:
+        return None
+    return "+" + digits
+
+
+def e164_prefix(text):
+    """Canonical prefix of partially typed digits ('98765' -> '+9198765'); None if too short."""
+    raw = str(text or "").strip()
+    digits = re.sub(r"\D", "", raw)
+    if len(digits) < MIN_PREFIX_DIGITS:
+        return None
+    if raw.startswith("+"):
+        return "+" + digits
+    if digits.startswith("00"):
+        return "+" + digits[2:]
+    if digits.startswith("0"):
+        digits = digits[1:]
+    if len(digits) > NATIONAL_DIGITS and digits.startswith(COUNTRY_CODE):
+        return "+" + digits
+    return "+" + COUNTRY_CODE + digits
+
+
+def national(phone):
+    """Digits without the +91 country code (the form search indexes)."""
+    e164 = to_e164(phone) or e164_prefix(phone)
+    if e164 is None:
+        return re.sub(r"\D", "", str(phone or ""))
+    return e164[1 + len(COUNTRY_CODE):] if e164.startswith("+" + COUNTRY_CODE) else e164[1:]
+
+
+# ------------------------------------------------------------------
+# Lookups
+# ------------------------------------------------------------------
+def find_customer(session, phone):
+    """Customer with this number (by phone_e164, or as entered if unparseable)."""
+    e164 = to_e164(phone)
+    if e164:
+        return session.query(Customer).filter(Customer.phone_e164 == e164).first()
+    return session.query(Customer).filter(Customer.phone == phone).first()
+
+
+def suggest(session, text, limit=8):
+    """
+    Customers whose number starts with the typed digits, with purchase counts.
+    A range on phone_e164 rather than LIKE, so both SQLite and Postgres use
+    its index.
+    """
+    prefix = e164_prefix(text)
+    if not prefix:
+        return []
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    custs = session.execute(
+        select(Customer.id, Customer.full_name, Customer.phone_e164)
+        .where(Customer.phone_e164 >= prefix, Customer.phone_e164 < upper)
+        .order_by(Customer.phone_e164)
+        .limit(limit)
+    ).all()
+    if not custs:
+        return []
+    stats = {r.customer_id: r for r in session.execute(
+        select(Sale.customer_id, func.count().label("sales"), func.max(Sale.sale_datetime).label("last_sale"),
+               func.sum(Sale.total_amount).label("spent"))
+        .where(Sale.customer_id.in_([c.id for c in custs]))
+        .group_by(Sale.customer_id)
+    )}
+    out = []
+    for c in custs:
+        s = stats.get(c.id)
+        out.append({"id": c.id, "name": c.full_name, "phone": c.phone_e164,
+                    "sales": s.sales if s else 0, "last_sale": s.last_sale if s else None,
+                    "spent": float(s.spent or 0) if s else 0.0})
+    return out
+
+
+def history(session, customer_id, limit=10):
+    """Latest sales of a customer with their item names, newest first."""
+    sales = session.execute(
+        select(Sale.id, Sale.sale_datetime, Sale.payment_type, Sale.total_amount)
+        .where(Sale.customer_id == customer_id)
+        .order_by(Sale.sale_datetime.desc())
+        .limit(limit)
+    ).all()
+    items = {}
+    if sales:
+        for sale_id, name, qty in session.execute(
+            select(SaleItem.sale_id, Product.name, SaleItem.qty)
+            .outerjoin(Product, Product.id == SaleItem.product_id)
+            .where(SaleItem.sale_id.in_([s.id for s in sales]))
+            .order_by(SaleItem.id)
+        ):
+            items.setdefault(sale_id, []).append(f"{qty} x {name}" if qty and qty > 1 else str(name))
+    return [
+        {"Sale #": s.id, "Date": s.sale_datetime, "Payment": s.payment_type,
+         "Amount": float(s.total_amount or 0), "Items": ", ".join(items.get(s.id, ()))}
+        for s in sales
+    ]
+
+
+# ------------------------------------------------------------------
+# Dedupe / merge
+# ------------------------------------------------------------------
+def _is_placeholder(name, phone):
+    return name is None or name.strip().lower() in PLACEHOLDER_NAMES or name == phone
+
+
+def merge_duplicates(bind, full=False, dry_run=False):
+    """
+    Normalize phones and merge customers that share a number.
+
+    By default only customers without phone_e164 are looked at (plus the
+    holders of the numbers they normalize to); `full` re-checks everyone.
+    The kept customer takes missing name / email / govt id / notes from the
+    merged ones. Returns counts.
+    """
+    c = Customer.__table__.c
+    cols = [c.id, c.phone, c.phone_e164, c.full_name, c.email, c.govt_id, c.notes]
+    q = select(*cols).where(c.phone.isnot(None))
+    if not full:
+        q = q.where(c.phone_e164.is_(None))
+    rows = {r.id: r._asdict() for r in bind.execute(q)}
+    for r in rows.values():
+        r["e164"] = to_e164(r["phone"])
+    if not full:
+        numbers = sorted({r["e164"] for r in rows.values() if r["e164"]})
+        for chunk in _chunks(numbers):
+            for r in bind.execute(select(*cols).where(c.phone_e164.in_(chunk))):
+                rows[r.id] = dict(r._asdict(), e164=r.phone_e164)
+
+    groups = {}
+    for r in sorted(rows.values(), key=lambda r: r["id"]):
+        if r["e164"]:
+            groups.setdefault(r["e164"], []).append(r)
+    keep_of, updates = {}, []
+    for e164, members in groups.items():
+        keeper = next((m for m in members if m["phone_e164"] == e164), members[0])
+        merged = dict(keeper)
+        for m in members:
+            if m is keeper:
+                continue
+            keep_of[m["id"]] = keeper["id"]
+            if _is_placeholder(merged["full_name"], merged["phone"]) and not _is_placeholder(m["full_name"], m["phone"]):
+                merged["full_name"] = m["full_name"]
+            for field in ("email", "govt_id", "notes"):
+                if not merged[field] and m[field]:
+                    merged[field] = m[field]
+        if merged != keeper or keeper["phone_e164"] != e164:
+            updates.append(merged)
+    # rows whose number no longer normalizes lose their stale phone_e164
+    updates += [dict(r) for r in rows.values() if not r["e164"] and r["phone_e164"]]
+
+    dup_ids = sorted(keep_of)
+    moved = []
+    for chunk in _chunks(dup_ids):
+        moved += bind.execute(select(Sale.id).where(Sale.customer_id.in_(chunk))).scalars().all()
+    counts = {"normalized": len(updates), "groups_merged": len({keep_of[d] for d in dup_ids}),
+              "customers_merged": len(dup_ids), "sales_repointed": len(moved)}
+    if dry_run:
+        return counts
+
+    sales = Sale.__table__
+    for chunk in _chunks(dup_ids):
+        bind.execute(
+            update(sales).where(sales.c.customer_id.in_(chunk))
+            .values(customer_id=case({d: keep_of[d] for d in chunk}, value=sales.c.customer_id))
+        )
+        bind.execute(delete(Customer.__table__).where(c.id.in_(chunk)))
+    if updates:
+        # clear first, so numbers moving between rows never collide on the unique index
+        stale = [{"_id": u["id"]} for u in updates if u["phone_e164"]]
+        if stale:
+            bind.execute(update(Customer.__table__).where(c.id == bindparam("_id")).values(phone_e164=None), stale)
+        bind.execute(
+            update(Customer.__table__).where(c.id == bindparam("_id")).values(
+                phone_e164=bindparam("e164"), full_name=bindparam("full_name"), email=bindparam("email"),
+                govt_id=bindparam("govt_id"), notes=bindparam("notes"),
+            ),
+            [{"_id": u["id"], "e164": u["e164"], "full_name": u["full_name"], "email": u["email"],
+              "govt_id": u["govt_id"], "notes": u["notes"]} for u in updates],
+        )
+
+    from utils.search import index_sales, index_customers
+    index_customers(bind, dup_ids + [u["id"] for u in updates])
+    index_sales(bind, moved)
+    return counts
+
+
+def main(argv=None):
+    from db import engine
+    ap = argparse.ArgumentParser(prog="python -m utils.phones")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    d = sub.add_parser("dedupe", help="normalize phones and merge duplicate customers")
+    d.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = ap.parse_args(argv)
+    with engine.begin() as conn:
+        counts = merge_duplicates(conn, full=True, dry_run=args.dry_run)
+    print(", ".join(f"{k.replace('_', ' ')}: {v}" for k, v in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+In-memory as-you-type product search over name / SKU / IMEI.
+
+Built once per catalog snapshot (stock version). Query tokens are matched by
+token prefix (bisect over a sorted vocabulary) and, for tokens of 3+ chars,
+by trigram containment; a full 15-digit IMEI is an O(1) hash hit.
+"""
+import bisect
+import itertools
+import re
+from collections import defaultdict
+
+import numpy as np
+import streamlit as st
+
+from db import stock_version
+from utils.catalog import get_catalog
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+IMEI_QUERY_RE = re.compile(r"^\d{15}$")
+
+
+def _tokens(text):
+    return TOKEN_RE.findall(str(text).lower()) if text else []
+
+
+def _trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class ProductSearchIndex:
+    def __init__(self, catalog):
+        self.catalog = catalog
+        n = len(catalog)
+        self.n = n
+        self.in_stock = (catalog["qty_on_hand"] > 0).to_numpy()
+        self.name_len = catalog["name"].map(lambda v: len(str(v))).to_numpy()
+        self.by_imei = {}
+        postings = defaultdict(set)
+        grams = defaultdict(set)
+        first_tok = []
+        for row, (name, sku, imei) in enumerate(zip(catalog["name"], catalog["sku"], catalog["imei"])):
+            if imei:
+                self.by_imei.setdefault(str(imei), row)
+            name_toks = _tokens(name)
+            first_tok.append(name_toks[0] if name_toks else "")
+            for tok in set(name_toks + _tokens(sku) + _tokens(imei)):
+                postings[tok].add(row)
+                for g in _trigrams(tok):
+                    grams[g].add(row)
+        # vocabulary sorted, postings laid out contiguously in vocab order so a
+        # prefix range is one slice of `flat`
+        self.vocab = sorted(postings)
+        self.vocab_pos = {tok: i for i, tok in enumerate(self.vocab)}
+        lists = [np.fromiter(sorted(postings[t]), dtype=np.int32) for t in self.vocab]
+        self.offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(a) for a in lists], out=self.offsets[1:])
+        self.flat = np.concatenate(lists) if lists else np.zeros(0, dtype=np.int32)
+        self.grams = {g: np.fromiter(rows, dtype=np.int32) for g, rows in grams.items()}
+        self.first_tok_pos = np.array([self.vocab_pos.get(t, -1) for t in first_tok], dtype=np.int64)
+
+    def __len__(self):
+        return self.n
+
+    def _token_scores(self, token):
+        """Per-row score for one query token: 3 exact, 2 prefix, 1 trigram."""
+        sc = np.zeros(self.n, dtype=np.float32)
+        if len(token) >= 3:
+            gs = [self.grams.get(g) for g in _trigrams(token)]
+            if all(a is not None for a in gs):
+                counts = np.bincount(np.concatenate(gs), minlength=self.n)
+                sc[counts == len(gs)] = 1.0
+        lo = bisect.bisect_left(self.vocab, token)
+        hi = bisect.bisect_left(self.vocab, token + "\uffff")
+        sc[self.flat[self.offsets[lo]:self.offsets[hi]]] = 2.0
+        if token in self.vocab_pos:
+            i = self.vocab_pos[token]
+            sc[self.flat[self.offsets[i]:self.offsets[i + 1]]] = 3.0
+        return sc, lo, hi
+
+    def search(self, query, k=20, in_stock_only=True):
+        """Top-k catalog row positions for `query`, best first."""
+        query = (query or "").strip()
+        if IMEI_QUERY_RE.match(query) and query in self.by_imei:
+            row = self.by_imei[query]
+            return [row] if self.in_stock[row] or not in_stock_only else []
+
+        toks = _tokens(query)
+        if not toks:
+            rows = (r for r in range(self.n) if self.in_stock[r] or not in_stock_only)
+            return list(itertools.islice(rows, k))
+
+        total = np.zeros(self.n, dtype=np.float32)
+        ok = self.in_stock.copy() if in_stock_only else np.ones(self.n, dtype=bool)
+        for i, tok in enumerate(toks):
+            sc, lo, hi = self._token_scores(tok)
+            ok &= sc > 0
+            total += sc
+            if i == 0:
+                # bonus when the name itself starts with the first query token
+                total += 2.0 * ((self.first_tok_pos >= lo) & (self.first_tok_pos < hi))
+        cand = np.flatnonzero(ok)
+        if len(cand) > k * 4:
+            # keep a few times k by score before the exact (score, length) sort
+            cand = cand[np.argpartition(-total[cand], k * 4 - 1)[:k * 4]]
+        order = np.lexsort((self.name_len[cand], -total[cand]))
+        return cand[order][:k].tolist()
+
+    def rows(self, positions):
+        return self.catalog.iloc[positions]
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _build_index(version, catalog_id, _catalog):
+    return ProductSearchIndex(_catalog)
+
+
+def get_search_index():
+    """Search index for the current catalog snapshot."""
+    catalog = get_catalog()
+    return _build_index(stock_version(), id(catalog), catalog)
@@ -0,0 +1,193 @@
+"""
+Admin-armed Python profiler for page renders.
+
+The admin sidebar arms profiling for the next N reruns of the current page,
+with cProfile (exact call counts, higher overhead) or a sampling profiler (a
+thread reading the script thread's stack every SAMPLE_INTERVAL_S, low
+overhead). Each profiled rerun is saved under data/profiles/ as a pstats
+dump (.prof: `python -m pstats`, snakeviz) or collapsed stacks (.collapsed:
+flamegraph.pl, speedscope), and the panel shows its top functions.
+
+When nothing is armed, profile_rerun() is one session_state lookup.
+"""
+import contextlib
+import cProfile
+import datetime
+import os
+import pstats
+import re
+import sys
+import threading
+from collections import Counter
+
+import pandas as pd
+import streamlit as st
+
+PROFILE_DIR = os.path.join("data", "profiles")
+SAMPLE_INTERVAL_S = 0.005
+TOP_FUNCTIONS = 25
+MODES = {"sampling": ".collapsed", "cprofile": ".prof"}
+
+
+# ------------------------------------------------------------------
+# Sampling profiler
+# ------------------------------------------------------------------
+def _short_path(path):
+    """Repo-relative, or from site-packages/ on for libraries."""
+    if path.startswith(os.getcwd()):
+        return os.path.relpath(path)
+    _, sep, tail = path.rpartition("site-packages" + os.sep)
+    return tail if sep else path
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples one thread's stack into collapsed-stack counts."""
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL_S):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        labels = {}
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+# ------------------------------------------------------------------
+# Reading profiles back
+# ------------------------------------------------------------------
+def top_functions(path, limit=TOP_FUNCTIONS):
+    """Top functions of a saved .prof / .collapsed file as a DataFrame."""
+    if path.endswith(".prof"):
+        stats = pstats.Stats(path)
+        rows = [
+            {"function": f"{name} ({_short_path(file)}:{line})",
+             "calls": nc, "self ms": tt * 1000, "cumulative ms": ct * 1000}
+            for (file, line, name), (cc, nc, tt, ct, _) in stats.stats.items()
+        ]
+        df = pd.DataFrame(rows, columns=["function", "calls", "self ms", "cumulative ms"])
+        return df.sort_values("cumulative ms", ascending=False).head(limit).reset_index(drop=True)
+
+    self_n, total_n, samples = Counter(), Counter(), 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stack, _, n = line.rstrip("\n").rpartition(" ")
+            if not stack:
+                continue
+            n = int(n)
+            frames = stack.split(";")
+            samples += n
+            self_n[frames[-1]] += n
+            for fr in set(frames):
+                total_n[fr] += n
+    df = pd.DataFrame({
+        "function": list(total_n),
+        "self %": [100.0 * self_n[fr] / samples for fr in total_n],
+        "total %": [100.0 * total_n[fr] / samples for fr in total_n],
+        "samples": list(total_n.values()),
+    })
+    return df.sort_values(["self %", "total %"], ascending=False).head(limit).reset_index(drop=True)
+
+
+def saved_profiles(limit=20):
+    """Newest saved profile paths first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = [n for n in os.listdir(PROFILE_DIR) if n.endswith(tuple(MODES.values()))]
+    return [os.path.join(PROFILE_DIR, n) for n in sorted(names, reverse=True)[:limit]]
+
+
+# ------------------------------------------------------------------
+# Per-rerun hook + admin panel
+# ------------------------------------------------------------------
+def _profile_path(page, mode):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^a-z0-9]+", "-", page.lower()).strip("-")
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return os.path.join(PROFILE_DIR, f"{stamp}_{slug}{MODES[mode]}")
+
+
+@contextlib.contextmanager
+def profile_rerun(page):
+    """Profile the enclosed page render if the admin armed it for `page`."""
+    armed = st.session_state.get("_profiler")
+    if not armed or armed["page"] != page:
+        yield
+        return
+    if armed["mode"] == "cprofile":
+        prof = cProfile.Profile()
+        prof.enable()
+    else:
+        prof = StackSampler()
+        prof.start()
+    try:
+        yield
+    finally:
+        path = _profile_path(page, armed["mode"])
+        if armed["mode"] == "cprofile":
+            prof.disable()
+            prof.dump_stats(path)
+        else:
+            prof.stop()
+            prof.dump(path)
+        st.session_state["_profile_last"] = path
+        armed["left"] -= 1
+        if armed["left"] <= 0:
+            del st.session_state["_profiler"]
+
+
+def render_profiler_panel(page):
+    with st.sidebar.expander("Performance: Python profiler"):
+        armed = st.session_state.get("_profiler")
+        if armed:
+            st.caption(f"Profiling the next {armed['left']} rerun(s) of {armed['page']} ({armed['mode']}).")
+            if st.button("Stop profiling"):
+                del st.session_state["_profiler"]
+                st.rerun()
+        else:
+            mode = st.radio("Profiler", list(MODES), horizontal=True,
+                            help="sampling: low overhead, collapsed stacks; cprofile: exact calls, slower")
+            n = st.number_input("Reruns", min_value=1, max_value=20, value=3)
+            if st.button(f"Profile {page}"):
+                # this rerun counts as the first one
+                st.session_state["_profiler"] = {"page": page, "mode": mode, "left": int(n)}
+
+        files = saved_profiles()
+        if not files:
+            return
+        last = st.session_state.get("_profile_last")
+        path = st.selectbox("Saved profiles", files, index=files.index(last) if last in files else 0,
+                            format_func=os.path.basename)
+        st.dataframe(top_functions(path), hide_index=True)
+        with open(path, "rb") as f:
+            st.download_button("Download", f.read(), file_name=os.path.basename(path))
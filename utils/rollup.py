@@ -0,0 +1,149 @@
+"""
+Incrementally maintained `daily_sales_rollup` (per IST day / payment type / product).
+
+`record_sale` is called in the same transaction as the sale insert; `rebuild`
+recomputes the table from raw sales/sale_items:
+
+    python -m utils.rollup rebuild [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+import argparse
+import datetime
+from collections import defaultdict
+
+from sqlalchemy import select, delete, insert, func, literal
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db import DailySalesRollup, Sale, SaleItem, IST
+
+ALL_PRODUCTS = 0
+_KEY = ["day", "payment_type", "product_id"]
+
+
+def ist_day(dt):
+    """IST calendar day of a sale datetime (naive values are IST wall time)."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(IST)
+    return dt.date()
+
+
+def is_ist_midnight(dt):
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(IST)
+    return dt.time() == datetime.time(0)
+
+
+def _dialect_name(conn):
+    """Dialect of a Connection or Session."""
+    dialect = getattr(conn, "dialect", None) or conn.get_bind().dialect
+    return dialect.name
+
+
+def _upsert(conn, rows):
+    dialects = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+    tbl = DailySalesRollup.__table__
+    stmt = dialects[_dialect_name(conn)](tbl)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=_KEY,
+        set_={
+            "sale_count": tbl.c.sale_count + stmt.excluded.sale_count,
+            "units": tbl.c.units + stmt.excluded.units,
+            "amount": tbl.c.amount + stmt.excluded.amount,
+        },
+    )
+    conn.execute(stmt, rows)
+
+
+def record_sale(session, sale_datetime, payment_type, total_amount, lines):
+    """
+    Add one sale to the rollup. `lines` yields (product_id, qty, line_total).
+    Runs inside the caller's transaction; the caller commits.
+    """
+    day = ist_day(sale_datetime)
+    per_product = defaultdict(lambda: [0, 0.0])
+    for product_id, qty, line_total in lines:
+        per_product[product_id][0] += int(qty)
+        per_product[product_id][1] += float(line_total)
+    rows = [{"day": day, "payment_type": payment_type, "product_id": ALL_PRODUCTS,
+             "sale_count": 1, "units": sum(u for u, _ in per_product.values()),
+             "amount": float(total_amount)}]
+    rows += [{"day": day, "payment_type": payment_type, "product_id": pid,
+              "sale_count": 1, "units": units, "amount": amount}
+             for pid, (units, amount) in per_product.items()]
+    _upsert(session, rows)
+
+
+def _day_expr(conn):
+    """SQL expression for the IST day of Sale.sale_datetime."""
+    if _dialect_name(conn) == "postgresql":
+        # timestamp (stored in the session time zone) -> IST wall clock -> date
+        utc = func.timezone(func.current_setting("TimeZone"), Sale.sale_datetime)
+        return func.date(func.timezone("Asia/Kolkata", utc))
+    return func.date(Sale.sale_datetime)
+
+
+def rebuild(conn, start=None, end=None):
+    """Recompute rollup rows for days in [start, end) (all days when omitted)."""
+    tbl = DailySalesRollup.__table__
+    day = _day_expr(conn)
+    pay = func.coalesce(Sale.payment_type, "cash")
+
+    clear = delete(tbl)
+    if start:
+        clear = clear.where(tbl.c.day >= start)
+    if end:
+        clear = clear.where(tbl.c.day < end)
+    conn.execute(clear)
+
+    def _in_range(q):
+        if start:
+            q = q.where(day >= start)
+        if end:
+            q = q.where(day < end)
+        return q
+
+    unit_sums = (
+        select(SaleItem.sale_id, func.sum(SaleItem.qty).label("units"))
+        .group_by(SaleItem.sale_id)
+        .subquery()
+    )
+    sale_rows = _in_range(
+        select(
+            day, pay, literal(ALL_PRODUCTS),
+            func.count(Sale.id),
+            func.coalesce(func.sum(unit_sums.c.units), 0),
+            func.coalesce(func.sum(Sale.total_amount), 0),
+        )
+        .outerjoin(unit_sums, unit_sums.c.sale_id == Sale.id)
+        .group_by(day, pay)
+    )
+    product_rows = _in_range(
+        select(
+            day, pay, SaleItem.product_id,
+            func.count(func.distinct(Sale.id)),
+            func.coalesce(func.sum(SaleItem.qty), 0),
+            func.coalesce(func.sum(SaleItem.line_total), 0),
+        )
+        .join(SaleItem, SaleItem.sale_id == Sale.id)
+        .where(SaleItem.product_id.isnot(None))
+        .group_by(day, pay, SaleItem.product_id)
+    )
+    cols = ["day", "payment_type", "product_id", "sale_count", "units", "amount"]
+    conn.execute(insert(tbl).from_select(cols, sale_rows))
+    conn.execute(insert(tbl).from_select(cols, product_rows))
+
+
+def main(argv=None):
+    from db import engine
+    ap = argparse.ArgumentParser(prog="python -m utils.rollup")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rb = sub.add_parser("rebuild", help="recompute daily_sales_rollup from sales/sale_items")
+    rb.add_argument("--start", type=datetime.date.fromisoformat)
+    rb.add_argument("--end", type=datetime.date.fromisoformat, help="exclusive")
+    args = ap.parse_args(argv)
+    with engine.begin() as conn:
+        rebuild(conn, args.start, args.end)
+    print("daily_sales_rollup rebuilt.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,125 @@
-import re, pathlib
-from typing import List
+import re, os, pathlib, multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
 IMEI_RE = re.compile(r'(?:\D|^)(\d{15})(?:\D|$)')
+CANDIDATE_RE = re.compile(r'(?<!\d)(\d{15})(?!\d)')
+IMEI_BYTES_RE = re.compile(rb'(?<!\d)(\d{15})(?!\d)')
+CHUNK_SIZE = 1 << 20
+CHUNK_OVERLAP = 16  # one full IMEI + one byte of left context
+IMEI_LABEL_RE = re.compile(r'imei|serial|s\s*/\s*n', re.IGNORECASE)
+MIN_CONFIDENCE = 0.55  # Luhn-valid candidates score >= 0.6, invalid ones at most 0.1 + 0.3 + 0.1 = 0.5
+def imei_luhn_valid(imei: str) -> bool:
+    """IMEI check digit (Luhn mod 10) over all 15 digits."""
+    if len(imei) != 15 or not imei.isdigit():
+        return False
+    total = 0
+    for i, ch in enumerate(reversed(imei)):
+        d = ord(ch) - 48
+        if i % 2:
+            d *= 2
+            if d > 9:
+                d -= 9
+        total += d
+    return total % 10 == 0
+def rank_imeis(text: str, label_window: int = 32) -> List[Tuple[str, float]]:
+    """
+    15-digit candidates with a confidence in [0, 1], best first.
+    Luhn-valid: 0.6, invalid: 0.1; +0.3 when an IMEI/serial label precedes
+    the number within `label_window` chars; +0.1 when it appears more than once.
+    """
+    seen = {}
+    for m in CANDIDATE_RE.finditer(text):
+        imei = m.group(1)
+        labelled = bool(IMEI_LABEL_RE.search(text, max(0, m.start() - label_window), m.start()))
+        hit = seen.setdefault(imei, [0, False])
+        hit[0] += 1
+        hit[1] = hit[1] or labelled
+    ranked = []
+    for imei, (count, labelled) in seen.items():
+        score = (0.6 if imei_luhn_valid(imei) else 0.1) + (0.3 if labelled else 0) + (0.1 if count > 1 else 0)
+        ranked.append((imei, round(min(score, 1.0), 2)))
+    ranked.sort(key=lambda t: (-t[1], t[0]))
+    return ranked
+def extract_valid_imeis(text: str, min_confidence: float = MIN_CONFIDENCE) -> List[str]:
+    return [imei for imei, conf in rank_imeis(text) if conf >= min_confidence]
 def extract_imeis_from_text(text: str) -> List[str]:
     return list({m.group(1) for m in IMEI_RE.finditer(text)})
 def extract_imeis_from_filename(name: str) -> List[str]:
     return extract_imeis_from_text(name)
+class _RecentSet:
+    """Bounded LRU set: dedupes within the last `maxsize` distinct keys."""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+    def add(self, key) -> bool:
+        """True if key was not present (and is now recorded)."""
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return False
+        self._keys[key] = None
+        if len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
+        return True
+def iter_imeis_in_file(path: str, chunk_size: int = CHUNK_SIZE, dedupe: bool = True,
+                       max_seen: int = 1_000_000) -> Iterator[Tuple[str, int]]:
+    """
+    Lazily yield (imei, byte_offset) from a file of any size using fixed-size
+    reads. The last CHUNK_OVERLAP bytes are rescanned with the next chunk, so an
+    IMEI split across a boundary is still found; a run ending exactly at the
+    buffer end waits for the next chunk to confirm no digit follows.
+    Dedupe memory is bounded by `max_seen` distinct IMEIs (LRU).
+    """
+    seen = _RecentSet(max_seen) if dedupe else None
+    buf, base, reported_end = b"", 0, 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf += chunk
+            for m in IMEI_BYTES_RE.finditer(buf):
+                start = base + m.start()
+                if start < reported_end or (m.start() == 0 and base > 0):
+                    continue  # already reported / no left context in this window
+                if not eof and m.end() == len(buf):
+                    continue  # may continue in the next chunk
+                reported_end = base + m.end()
+                imei = m.group(1)
+                if seen is None or seen.add(int(imei)):
+                    yield imei.decode("ascii"), start
+            if eof:
+                return
+            keep = buf[-CHUNK_OVERLAP:]
+            base += len(buf) - len(keep)
+            buf = keep
+def _scan_file(path: str) -> List[str]:
+    return [imei for imei, _ in iter_imeis_in_file(path)]
+def scan_directory(path: str, pattern: str = "*", workers: int = None) -> Dict[str, List[str]]:
+    """Scan every file matching `pattern` under `path` in parallel; {file: [imeis]}."""
+    files = sorted(str(p) for p in pathlib.Path(path).rglob(pattern) if p.is_file())
+    if not files:
+        return {}
+    workers = workers or min(len(files), os.cpu_count() or 1)
+    if workers <= 1:
+        return {p: _scan_file(p) for p in files}
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return dict(zip(files, pool.map(_scan_file, files)))
 def extract_imeis_from_file(path: str) -> List[str]:
     try:
-        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-            txt = f.read()
-        vals = extract_imeis_from_text(txt)
+        vals = _scan_file(path)
         if vals:
             return vals
     except Exception:
         pass
     return extract_imeis_from_filename(pathlib.Path(path).name)
+if __name__ == "__main__":
+    import sys
+    # python -m utils.scanning <file-or-dir> [glob]  -> "file,imei" lines
+    target = sys.argv[1]
+    if os.path.isdir(target):
+        results = scan_directory(target, sys.argv[2] if len(sys.argv) > 2 else "*")
+    else:
+        results = {target: _scan_file(target)}
+    for fname, imeis in results.items():
+        for imei in imeis:
+            print(f"{fname},{imei}")
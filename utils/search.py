@@ -0,0 +1,238 @@
+"""
+Ranked search over past sales and customers.
+
+`search_documents` holds one text row per sale (customer name, phone,
+IMEIs, product names, notes) and per customer (name, phone, notes). Phones
+are indexed as national digits (utils.phones.national), so
+"+91 98765 43210" and "9876543210" match.
+
+Indexes: FTS5 on SQLite (trigram tokenizer, so any 3+ character substring
+matches, e.g. the last digits of an IMEI; bm25 ranking), tsvector + pg_trgm
+GIN indexes on Postgres (ILIKE filtering, ts_rank ranking).
+
+checkout() re-indexes its sale (and a new customer) in the same
+transaction; everything else can be re-indexed with
+
+    python -m utils.search rebuild
+    python -m utils.search query "ramesh 4410"
+"""
+import argparse
+import re
+import time
+
+from sqlalchemy import Float, Integer, select, delete, insert, and_, column, func, literal_column, text
+
+from db import SearchDocument, Sale, SaleItem, Product, Customer
+from utils.bulk_import import _chunks
+from utils.phones import national
+from utils.rollup import _dialect_name
+
+FTS_TABLE = "search_fts"
+INDEX_CHUNK = 2000
+TERM_RE = re.compile(r"[a-z0-9]+")
+PHONE_QUERY_RE = re.compile(r"^\+?[\d\s\-()]{6,}$")
+SNIPPET_CHARS = 60
+
+_fts_tokenizers = {}  # engine url -> tokenizer name or None
+
+
+def _terms(query):
+    query = (query or "").strip()
+    if PHONE_QUERY_RE.match(query):
+        return [national(query)]
+    return TERM_RE.findall(query.lower())
+
+
+# ------------------------------------------------------------------
+# Documents
+# ------------------------------------------------------------------
+def _body(*parts):
+    return " · ".join(str(p) for p in parts if p)
+
+
+def _phone_text(phone):
+    digits = national(phone)
+    return _body(digits, phone if phone and phone != digits else None)
+
+
+def _sale_docs(bind, sale_ids):
+    sales = bind.execute(
+        select(Sale.id, Sale.sale_datetime, Sale.notes, Customer.full_name, Customer.phone)
+        .outerjoin(Customer, Customer.id == Sale.customer_id)
+        .where(Sale.id.in_(sale_ids))
+    ).all()
+    items = {}
+    for sale_id, imei, name in bind.execute(
+        select(SaleItem.sale_id, SaleItem.imei, Product.name)
+        .outerjoin(Product, Product.id == SaleItem.product_id)
+        .where(SaleItem.sale_id.in_(sale_ids))
+        .order_by(SaleItem.sale_id, SaleItem.id)
+    ):
+        items.setdefault(sale_id, []).extend(v for v in (imei, name) if v)
+    return [
+        {"kind": "sale", "ref_id": s.id, "sold_at": s.sale_datetime, "customer": s.full_name,
+         "phone": national(s.phone) or None,
+         "body": _body(s.full_name, _phone_text(s.phone), *items.get(s.id, ()), s.notes)}
+        for s in sales
+    ]
+
+
+def _customer_docs(bind, customer_ids):
+    return [
+        {"kind": "customer", "ref_id": c.id, "sold_at": None, "customer": c.full_name,
+         "phone": national(c.phone) or None, "body": _body(c.full_name, _phone_text(c.phone), c.notes)}
+        for c in bind.execute(
+            select(Customer.id, Customer.full_name, Customer.phone, Customer.notes)
+            .where(Customer.id.in_(customer_ids))
+        )
+    ]
+
+
+def _reindex(bind, kind, ids, build):
+    d = SearchDocument.__table__.c
+    for chunk in _chunks(sorted(set(ids)), INDEX_CHUNK):
+        bind.execute(delete(SearchDocument.__table__).where(d.kind == kind, d.ref_id.in_(chunk)))
+        docs = build(bind, chunk)
+        if docs:
+            bind.execute(insert(SearchDocument.__table__), docs)
+
+
+def index_sales(bind, sale_ids):
+    """(Re)write the documents of these sales. Runs in the caller's transaction."""
+    _reindex(bind, "sale", sale_ids, _sale_docs)
+
+
+def index_customers(bind, customer_ids):
+    _reindex(bind, "customer", customer_ids, _customer_docs)
+
+
+def rebuild(bind):
+    """Re-index every sale and customer."""
+    bind.execute(delete(SearchDocument.__table__))
+    for model, index in ((Sale, index_sales), (Customer, index_customers)):
+        ids = bind.execute(select(model.id).order_by(model.id)).scalars().all()
+        for chunk in _chunks(ids, INDEX_CHUNK * 10):
+            index(bind, chunk)
+
+
+# ------------------------------------------------------------------
+# Text indexes
+# ------------------------------------------------------------------
+def install(conn):
+    """Create the dialect's full-text index on search_documents (idempotent)."""
+    if _dialect_name(conn) == "postgresql":
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_documents_tsv "
+            "ON search_documents USING gin (to_tsvector('simple', body))"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_documents_trgm "
+            "ON search_documents USING gin (body gin_trgm_ops)"
+        ))
+        return
+    tokenizer = "trigram" if conn.dialect.dbapi.sqlite_version_info >= (3, 34) else "unicode61"
+    # external-content FTS5 table kept in step with search_documents by triggers
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"body, content='search_documents', content_rowid='id', tokenize='{tokenizer}')"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body); END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body); "
+        f"INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body); END"
+    ))
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def _fts_tokenizer(bind):
+    """'trigram' / 'unicode61' when the SQLite FTS table exists, else None."""
+    key = str(bind.get_bind().url if hasattr(bind, "get_bind") else bind.engine.url)
+    if key not in _fts_tokenizers:
+        sql = bind.execute(text("SELECT sql FROM sqlite_master WHERE name = :n"), {"n": FTS_TABLE}).scalar()
+        _fts_tokenizers[key] = None if sql is None else ("trigram" if "trigram" in sql else "unicode61")
+    return _fts_tokenizers[key]
+
+
+# ------------------------------------------------------------------
+# Query
+# ------------------------------------------------------------------
+def _snippet(body, terms):
+    low = body.lower()
+    pos = min((i for i in (low.find(t) for t in terms) if i >= 0), default=0)
+    start = max(0, pos - SNIPPET_CHARS // 3)
+    out = body[start:start + SNIPPET_CHARS]
+    return ("…" if start else "") + out + ("…" if start + SNIPPET_CHARS < len(body) else "")
+
+
+def search(bind, query, limit=20):
+    """
+    Best `limit` documents containing every query term, as dicts with kind,
+    ref_id, sold_at, customer, phone and a snippet; newest first among ties.
+    """
+    terms = [t for t in _terms(query) if t]
+    if not terms:
+        return []
+    d = SearchDocument.__table__.c
+    cols = [d.kind, d.ref_id, d.sold_at, d.customer, d.phone, d.body]
+    like_all = and_(*[d.body.ilike(f"%{t}%") for t in terms])
+    newest = d.sold_at.desc().nulls_last() if _dialect_name(bind) == "postgresql" else d.sold_at.desc()
+
+    if _dialect_name(bind) == "postgresql":
+        tsq = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{t}:*" for t in terms))
+        rank = func.ts_rank(func.to_tsvector(literal_column("'simple'"), d.body), tsq)
+        stmt = select(*cols).where(like_all).order_by(rank.desc(), newest)
+    else:
+        tokenizer = _fts_tokenizer(bind)
+        fts_terms = [t for t in terms if len(t) >= 3] if tokenizer == "trigram" else terms
+        if tokenizer and fts_terms:
+            match = " ".join(f'"{t}"' if tokenizer == "trigram" else f'"{t}"*' for t in fts_terms)
+            fts = text(f"SELECT rowid AS id, bm25({FTS_TABLE}) AS score FROM {FTS_TABLE} "
+                       f"WHERE {FTS_TABLE} MATCH :match").bindparams(match=match)
+            fts = fts.columns(column("id", Integer), column("score", Float)).subquery()
+            stmt = (select(*cols).join(fts, fts.c.id == d.id)
+                    .where(like_all).order_by(fts.c.score, newest))
+        else:
+            stmt = select(*cols).where(like_all).order_by(newest)
+    rows = bind.execute(stmt.limit(limit)).all()
+    return [
+        {"kind": r.kind, "ref_id": r.ref_id, "sold_at": r.sold_at, "customer": r.customer,
+         "phone": r.phone, "snippet": _snippet(r.body, terms)}
+        for r in rows
+    ]
+
+
+def main(argv=None):
+    from db import engine
+    ap = argparse.ArgumentParser(prog="python -m utils.search")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("rebuild", help="re-index all sales and customers")
+    q = sub.add_parser("query", help="run a search")
+    q.add_argument("text")
+    q.add_argument("--limit", type=int, default=20)
+    args = ap.parse_args(argv)
+    if args.cmd == "rebuild":
+        t0 = time.perf_counter()
+        with engine.begin() as conn:
+            rebuild(conn)
+        print(f"search index rebuilt in {time.perf_counter() - t0:.1f}s.")
+        return
+    with engine.connect() as conn:
+        t0 = time.perf_counter()
+        rows = search(conn, args.text, args.limit)
+        ms = (time.perf_counter() - t0) * 1000
+    for r in rows:
+        print(f"{r['kind']:8} {r['ref_id']:>8}  {r['sold_at'] or '':19}  {r['snippet']}")
+    print(f"{len(rows)} result(s) in {ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
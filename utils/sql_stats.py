@@ -0,0 +1,231 @@
+"""
+Per-rerun SQL instrumentation for the admin sidebar.
+
+Engine cursor events record every statement executed while a capture() is
+active in the current context (the Streamlit script thread for one rerun):
+count, total time, slowest statements, and counts per statement shape
+(literals and IN-lists folded). A shape repeated N_PLUS_ONE_MIN+ times in
+one rerun is flagged as a likely N+1 (per-row lookups in a loop).
+Background threads (jobs, bill workers) run outside a capture and are not
+recorded.
+
+Reruns can also be appended to a JSONL log (SQL_STATS_LOG env var, or the
+checkbox in the panel) and summarised offline:
+
+    python -m utils.sql_stats summary data/sql_stats.jsonl
+"""
+import argparse
+import contextlib
+import contextvars
+import datetime
+import json
+import os
+import re
+import statistics
+import time
+from collections import Counter, defaultdict, deque
+
+from sqlalchemy import event
+
+RERUN_HISTORY = 50
+N_PLUS_ONE_MIN = 5
+SLOWEST = 5
+SQL_PREVIEW = 300
+DEFAULT_LOG = os.path.join("data", "sql_stats.jsonl")
+
+_active = contextvars.ContextVar("sql_stats", default=None)
+
+_WS_RE = re.compile(r"\s+")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PARAM_RE = re.compile(r"%\(\w+\)s|\$\d+|\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def shape(statement):
+    """Statement with literals/params as ? and IN-lists folded to (?...)."""
+    s = _WS_RE.sub(" ", statement).strip()
+    s = _STRING_RE.sub("?", s)
+    s = _PARAM_RE.sub("?", s)
+    return _LIST_RE.sub("(?...)", s)
+
+
+class RerunSQL:
+    """Statements seen during one rerun."""
+
+    def __init__(self):
+        self.count = 0
+        self.replica = 0  # of count, run on the read replica
+        self.total_ms = 0.0
+        self.shapes = Counter()
+        self.shape_ms = defaultdict(float)
+        self.slowest = []  # (ms, statement)
+
+    def add(self, statement, ms, replica=False):
+        self.count += 1
+        self.replica += replica
+        self.total_ms += ms
+        key = shape(statement)
+        self.shapes[key] += 1
+        self.shape_ms[key] += ms
+        if len(self.slowest) < SLOWEST or ms > self.slowest[-1][0]:
+            self.slowest.append((ms, statement))
+            self.slowest.sort(key=lambda t: -t[0])
+            del self.slowest[SLOWEST:]
+
+    def n_plus_one(self):
+        """[(shape, count, ms)] for shapes repeated N_PLUS_ONE_MIN+ times, worst first."""
+        return [(s, n, self.shape_ms[s]) for s, n in self.shapes.most_common() if n >= N_PLUS_ONE_MIN]
+
+    def as_record(self, page, rerun_ms=None):
+        return {
+            "at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "page": page,
+            "rerun_ms": None if rerun_ms is None else round(rerun_ms, 2),
+            "queries": self.count,
+            "replica_queries": self.replica,
+            "sql_ms": round(self.total_ms, 2),
+            "distinct_shapes": len(self.shapes),
+            "n_plus_one": [{"sql": s[:SQL_PREVIEW], "count": n, "ms": round(ms, 2)}
+                           for s, n, ms in self.n_plus_one()],
+            "slowest": [{"sql": shape(q)[:SQL_PREVIEW], "ms": round(ms, 2)} for ms, q in self.slowest],
+        }
+
+
+# ------------------------------------------------------------------
+# Engine hooks
+# ------------------------------------------------------------------
+# the start time lives on the execution context, so a statement that raises
+# (no after_cursor_execute) leaves nothing behind on the pooled connection
+def _before(conn, cursor, statement, parameters, context, executemany):
+    if _active.get() is not None and context is not None:
+        context._sql_stats_t0 = time.perf_counter()
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    stats = _active.get()
+    t0 = getattr(context, "_sql_stats_t0", None)
+    if stats is not None and t0 is not None:
+        stats.add(statement, (time.perf_counter() - t0) * 1000, conn.engine in _replicas)
+
+
+_replicas = set()
+
+
+def instrument(engine, replica=False):
+    """Attach the cursor hooks to `engine` (idempotent)."""
+    if replica:
+        _replicas.add(engine)
+    if not event.contains(engine, "before_cursor_execute", _before):
+        event.listen(engine, "before_cursor_execute", _before)
+        event.listen(engine, "after_cursor_execute", _after)
+
+
+@contextlib.contextmanager
+def capture():
+    """Record statements run in this context; yields the RerunSQL."""
+    from db import engine, read_engine
+    instrument(engine)
+    if read_engine is not engine:
+        instrument(read_engine, replica=True)
+    stats = RerunSQL()
+    token = _active.set(stats)
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+
+
+def append_jsonl(record, path=DEFAULT_LOG):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+# ------------------------------------------------------------------
+# Streamlit: history + sidebar panel
+# ------------------------------------------------------------------
+def record_sql(page, stats, rerun_ms=None):
+    import streamlit as st
+    record = stats.as_record(page, rerun_ms)
+    st.session_state.setdefault("_sql_stats", deque(maxlen=RERUN_HISTORY)).append(record)
+    path = os.getenv("SQL_STATS_LOG") or (DEFAULT_LOG if st.session_state.get("_sql_stats_log") else None)
+    if path:
+        append_jsonl(record, path)
+    return record
+
+
+def render_sql_panel():
+    import streamlit as st
+    from db import READ_URL, replica_status, use_replica
+    history = list(st.session_state.get("_sql_stats", ()))
+    with st.sidebar.expander("Performance: SQL per rerun"):
+        st.checkbox(f"Append reruns to {DEFAULT_LOG}", key="_sql_stats_log")
+        if not history:
+            st.caption("No reruns recorded yet.")
+            return
+        last = history[-1]
+        st.write(f"Last rerun ({last['page']}): {last['queries']} queries, {last['sql_ms']:,.1f} ms in SQL")
+        if READ_URL:
+            rs = replica_status()
+            where = "replica" if use_replica() else "primary (fallback)"
+            lag = f"lag {rs['lag_s']:.1f} s" if rs["lag_s"] is not None else rs["error"]
+            st.caption(f"Report reads: {where}, {lag}. Replica queries last rerun: "
+                       f"{last.get('replica_queries', 0)}")
+        for hit in last["n_plus_one"]:
+            st.warning(f"Likely N+1: {hit['count']}x ({hit['ms']:,.1f} ms)\n\n`{hit['sql'][:160]}`")
+        if last["slowest"]:
+            st.write("Slowest statements:")
+            st.table({"ms": [q["ms"] for q in last["slowest"]], "sql": [q["sql"][:120] for q in last["slowest"]]})
+        by_page = defaultdict(list)
+        for r in history:
+            by_page[r["page"]].append(r)
+        st.table({
+            "page": list(by_page),
+            "reruns": [len(v) for v in by_page.values()],
+            "median queries": [statistics.median(r["queries"] for r in v) for v in by_page.values()],
+            "max queries": [max(r["queries"] for r in v) for v in by_page.values()],
+            "median SQL ms": [round(statistics.median(r["sql_ms"] for r in v), 1) for v in by_page.values()],
+        })
+
+
+# ------------------------------------------------------------------
+# Offline summary of a JSONL log
+# ------------------------------------------------------------------
+def summarize(path):
+    by_page = defaultdict(list)
+    suspects = defaultdict(lambda: [0, 0, 0.0, set()])  # sql -> reruns, executions, ms, pages
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            r = json.loads(line)
+            by_page[r["page"]].append(r)
+            for hit in r["n_plus_one"]:
+                s = suspects[hit["sql"]]
+                s[0] += 1
+                s[1] += hit["count"]
+                s[2] += hit["ms"]
+                s[3].add(r["page"])
+    print(f"{'page':16} {'reruns':>7} {'med q':>7} {'max q':>7} {'med ms':>8} {'max ms':>8}")
+    for page, rs in sorted(by_page.items(), key=lambda kv: str(kv[0])):
+        q = [r["queries"] for r in rs]
+        ms = [r["sql_ms"] for r in rs]
+        print(f"{str(page):16} {len(rs):7} {statistics.median(q):7.0f} {max(q):7} "
+              f"{statistics.median(ms):8.1f} {max(ms):8.1f}")
+    if suspects:
+        print("\nLikely N+1 shapes (reruns, executions, ms, pages):")
+        for sql, (reruns, n, ms, pages) in sorted(suspects.items(), key=lambda kv: -kv[1][2]):
+            print(f"  {reruns:5} {n:7} {ms:9.1f}  {','.join(sorted(map(str, pages)))}\n        {sql}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m utils.sql_stats")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sm = sub.add_parser("summary", help="aggregate a JSONL log by page and N+1 shape")
+    sm.add_argument("path", nargs="?", default=DEFAULT_LOG)
+    args = ap.parse_args(argv)
+    summarize(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Stock ledger: `stock_movements` is the audit trail, `Product.qty_on_hand` the
+running balance.
+
+- `reconcile` recomputes quantities from the movements (streamed with
+  yield_per, starting from the latest snapshot) and reports or repairs drift.
+- `take_snapshot` checkpoints the ledger into `stock_snapshots`, so `stock_at`
+  only replays the movements after the nearest earlier snapshot.
+
+    python -m utils.stock_ledger reconcile [--repair ledger|stock] [--full]
+    python -m utils.stock_ledger snapshot [--if-due]
+    python -m utils.stock_ledger stock-at 2025-03-31 [--product ID ...]
+
+Run `snapshot --if-due` from cron (e.g. hourly); it writes at most one
+snapshot per SNAPSHOT_EVERY.
+"""
+import argparse
+import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, update, insert, func
+
+from db import Product, StockMovement, StockSnapshot, StockSnapshotItem, IST
+
+YIELD_PER = 10_000
+SNAPSHOT_EVERY = datetime.timedelta(days=1)
+# movements younger than this may belong to transactions not committed yet
+SNAPSHOT_SETTLE = datetime.timedelta(minutes=5)
+REPAIR_MODES = ("ledger", "stock")
+
+
+def _as_ist(dt):
+    if dt.tzinfo is None:
+        return IST.localize(dt)
+    return dt.astimezone(IST)
+
+
+def end_of_day(day):
+    """Instant just after IST `day`: stock "on 31 March" is stock_at(end_of_day(...))."""
+    return IST.localize(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time(0)))
+
+
+def _accumulate(totals, rows):
+    """Add a chunk of (product_id, change_qty) rows into totals."""
+    if not rows:
+        return
+    arr = np.asarray(rows, dtype=np.int64)
+    pids, inv = np.unique(arr[:, 0], return_inverse=True)
+    sums = np.bincount(inv, weights=arr[:, 1])
+    for pid, qty in zip(pids.tolist(), sums.tolist()):
+        totals[pid] = totals.get(pid, 0) + int(qty)
+
+
+def _snapshot_before(session, at=None):
+    q = select(StockSnapshot.id, StockSnapshot.taken_at).order_by(StockSnapshot.taken_at.desc()).limit(1)
+    if at is not None:
+        q = q.where(StockSnapshot.taken_at <= at)
+    return session.execute(q).first()
+
+
+def ledger_quantities(session, at=None, product_ids=None, use_snapshots=True):
+    """
+    {product_id: qty} from the ledger, counting movements strictly before `at`
+    (all when None): nearest snapshot plus the movements after it. Products
+    at 0 may be missing.
+    """
+    totals, since = {}, None
+    snap = _snapshot_before(session, at) if use_snapshots else None
+    if snap is not None:
+        since = snap.taken_at
+        q = select(StockSnapshotItem.product_id, StockSnapshotItem.qty).where(
+            StockSnapshotItem.snapshot_id == snap.id
+        )
+        if product_ids is not None:
+            q = q.where(StockSnapshotItem.product_id.in_(product_ids))
+        totals = {pid: int(qty) for pid, qty in session.execute(q)}
+
+    q = select(StockMovement.product_id, func.coalesce(StockMovement.change_qty, 0)).where(
+        StockMovement.product_id.isnot(None)
+    )
+    if since is not None:
+        q = q.where(StockMovement.timestamp >= since)
+    if at is not None:
+        q = q.where(StockMovement.timestamp < at)
+    if product_ids is not None:
+        q = q.where(StockMovement.product_id.in_(product_ids))
+    result = session.execute(q.execution_options(yield_per=YIELD_PER))
+    for chunk in result.partitions():
+        _accumulate(totals, chunk)
+    return totals
+
+
+def stock_at(session, at, product_ids=None):
+    """{product_id: qty} at instant `at` (naive values are IST)."""
+    return ledger_quantities(session, _as_ist(at), product_ids)
+
+
+# ------------------------------------------------------------------
+# Snapshots
+# ------------------------------------------------------------------
+def take_snapshot(session, taken_at=None):
+    """
+    Checkpoint the ledger as of `taken_at` (default: now - SNAPSHOT_SETTLE).
+    Returns (snapshot, item count). Caller commits.
+    """
+    taken_at = _as_ist(taken_at or datetime.datetime.now(IST) - SNAPSHOT_SETTLE)
+    totals = ledger_quantities(session, taken_at)
+    snap = StockSnapshot(taken_at=taken_at)
+    session.add(snap)
+    session.flush()
+    rows = [{"snapshot_id": snap.id, "product_id": pid, "qty": qty} for pid, qty in totals.items() if qty]
+    if rows:
+        session.execute(insert(StockSnapshotItem), rows)
+    return snap, len(rows)
+
+
+def snapshot_if_due(session, every=SNAPSHOT_EVERY):
+    """take_snapshot() unless one newer than `every` exists; None when skipped."""
+    cutoff = datetime.datetime.now(IST) - SNAPSHOT_SETTLE - every
+    if session.execute(select(func.count()).where(StockSnapshot.taken_at > cutoff)).scalar():
+        return None
+    return take_snapshot(session)
+
+
+# ------------------------------------------------------------------
+# Reconciliation
+# ------------------------------------------------------------------
+def reconcile(session, repair=None, user_id=None, use_snapshots=True):
+    """
+    Compare qty_on_hand with the ledger; returns a DataFrame of drifting
+    products (product_id, name, qty_on_hand, ledger_qty, drift, action).
+
+    repair="ledger" trusts qty_on_hand and writes a "reconcile" movement of
+    `drift`; repair="stock" trusts the movements and resets qty_on_hand.
+    A product whose qty_on_hand changes meanwhile (a sale) is skipped.
+    Caller commits.
+    """
+    if repair not in (None,) + REPAIR_MODES:
+        raise ValueError(f"repair must be one of {REPAIR_MODES}")
+    products = session.execute(
+        select(Product.id, Product.name, func.coalesce(Product.qty_on_hand, 0))
+        .execution_options(yield_per=YIELD_PER)
+    ).all()
+    ledger = ledger_quantities(session, use_snapshots=use_snapshots)
+
+    rows = []
+    for pid, name, on_hand in products:
+        expected = ledger.pop(pid, 0)
+        if on_hand != expected:
+            rows.append({"product_id": pid, "name": name, "qty_on_hand": on_hand,
+                         "ledger_qty": expected, "drift": on_hand - expected, "action": ""})
+    for pid, expected in ledger.items():
+        if expected:
+            rows.append({"product_id": pid, "name": None, "qty_on_hand": None,
+                         "ledger_qty": expected, "drift": None, "action": "product missing"})
+
+    if repair:
+        tbl = Product.__table__
+        now = datetime.datetime.now(IST)
+        moves = []
+        for r in rows:
+            if r["qty_on_hand"] is None:
+                continue
+            # guarded on the value we compared; also locks the row until commit
+            guard = update(tbl).where(
+                tbl.c.id == r["product_id"], func.coalesce(tbl.c.qty_on_hand, 0) == r["qty_on_hand"]
+            )
+            if repair == "stock":
+                res = session.execute(guard.values(qty_on_hand=r["ledger_qty"], updated_at=now))
+            else:
+                res = session.execute(guard.values(qty_on_hand=tbl.c.qty_on_hand))
+                if res.rowcount == 1:
+                    moves.append({"product_id": r["product_id"], "change_qty": r["drift"],
+                                  "reason": "reconcile", "user_id": user_id})
+            r["action"] = f"repaired ({repair})" if res.rowcount == 1 else "skipped (changed)"
+        if moves:
+            session.execute(insert(StockMovement), moves)
+
+    return pd.DataFrame(rows, columns=["product_id", "name", "qty_on_hand", "ledger_qty", "drift", "action"])
+
+
+def _instant(value):
+    """CLI date (end of that IST day) or ISO datetime (IST when naive)."""
+    try:
+        return end_of_day(datetime.date.fromisoformat(value))
+    except ValueError:
+        return _as_ist(datetime.datetime.fromisoformat(value))
+
+
+def main(argv=None):
+    from db import SessionLocal
+    ap = argparse.ArgumentParser(prog="python -m utils.stock_ledger")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rc = sub.add_parser("reconcile", help="report (or repair) qty_on_hand vs ledger drift")
+    rc.add_argument("--repair", choices=REPAIR_MODES)
+    rc.add_argument("--full", action="store_true", help="replay every movement, ignore snapshots")
+    sn = sub.add_parser("snapshot", help="checkpoint ledger quantities")
+    sn.add_argument("--if-due", action="store_true", help=f"skip if one is newer than {SNAPSHOT_EVERY}")
+    sa = sub.add_parser("stock-at", help="ledger quantities at a date (end of day) or datetime")
+    sa.add_argument("when", type=_instant)
+    sa.add_argument("--product", type=int, action="append", dest="products")
+    args = ap.parse_args(argv)
+
+    with SessionLocal() as session:
+        if args.cmd == "reconcile":
+            report = reconcile(session, repair=args.repair, use_snapshots=not args.full)
+            session.commit()
+            print(report.to_string(index=False) if len(report) else "No drift.")
+        elif args.cmd == "snapshot":
+            taken = snapshot_if_due(session) if args.if_due else take_snapshot(session)
+            session.commit()
+            if taken is None:
+                print("Snapshot not due.")
+            else:
+                snap, n = taken
+                print(f"Snapshot {snap.id} as of {snap.taken_at}: {n} product(s).")
+        else:
+            qty = stock_at(session, args.when, args.products)
+            names = dict(session.execute(select(Product.id, Product.name)).all())
+            df = pd.DataFrame([{"product_id": pid, "name": names.get(pid), "qty": q}
+                               for pid, q in sorted(qty.items()) if q or args.products])
+            print(f"Stock as of {args.when:%Y-%m-%d %H:%M %Z}")
+            print(df.to_string(index=False) if len(df) else "No stock.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Deterministic synthetic shop data for benchmarks and load testing.
+
+Fills products, customers, companies, sales, sale items, EMIs and stock
+movements (opening purchase + one movement per sold line, so the stock
+ledger reconciles), then rebuilds daily_sales_rollup and indexes the new
+sales and customers for search. The same seed and
+scale always produce the same rows. Ids continue after the current maximum,
+so it can top up an existing database.
+
+    python -m utils.synthetic --products 50000 --sales 1000000   # into DB_URL
+
+Values are derived from row numbers by the helpers below (product_sku(i),
+customer_phone(i), item_imei(i), ...), so benchmarks can build probes
+without reading the data back.
+"""
+import argparse
+import datetime
+import time
+
+import numpy as np
+from sqlalchemy import insert, select, func
+
+from db import (
+    Product, Customer, Company, Sale, SaleItem, EmiDetail, StockMovement,
+)
+from utils.emi import emi_amount
+
+BATCH = 20_000
+START = datetime.datetime(2024, 1, 1)
+
+BRANDS = ["Samsung", "Vivo", "Oppo", "Redmi", "Realme", "Apple", "OnePlus", "Nokia", "Motorola", "iQOO"]
+SERIES = ["A", "M", "F", "Y", "Note", "Pro", "Neo", "Max", "Lite", "Plus"]
+ACCESSORIES = ["Fast Charger", "Screen Protector", "Back Cover", "Earphones", "USB-C Cable", "Power Bank"]
+COLORS = ["Black", "Blue", "Green", "Silver", "Gold", "Purple"]
+STORAGE = ["64GB", "128GB", "256GB", "512GB"]
+TENURES = np.array([3, 6, 9, 12, 18, 24])
+RATES = np.array([0.0, 0.0, 12.0, 14.0, 18.0])
+
+
+# ------------------------------------------------------------------
+# Row-number -> value helpers
+# ------------------------------------------------------------------
+def _luhn_complete(bodies):
+    """Append the Luhn check digit to 14-digit int64 bodies."""
+    bodies = np.asarray(bodies, dtype=np.int64)
+    total = np.zeros_like(bodies)
+    rest = bodies.copy()
+    for k in range(14):
+        d = rest % 10
+        rest //= 10
+        if k % 2 == 0:  # doubled: sits at an odd position once the check digit is appended
+            d = d * 2
+            d = np.where(d > 9, d - 9, d)
+        total += d
+    return bodies * 10 + (10 - total % 10) % 10
+
+
+def is_phone(i):
+    return i % 10 < 7
+
+
+def product_sku(i):
+    return f"SKU{i:06d}"
+
+
+def product_name(i):
+    if not is_phone(i):
+        return f"{ACCESSORIES[i % len(ACCESSORIES)]} {i}"
+    return (f"{BRANDS[i % len(BRANDS)]} {SERIES[(i // 10) % len(SERIES)]}{i % 97} "
+            f"{STORAGE[(i // 3) % len(STORAGE)]} {COLORS[(i // 7) % len(COLORS)]}")
+
+
+def product_imei(i):
+    """IMEI of phone product i; None for accessories."""
+    return str(int(_luhn_complete(35_000_000_000_000 + i))) if is_phone(i) else None
+
+
+def item_imei(i):
+    """IMEI recorded on phone sale item i."""
+    return str(int(_luhn_complete(86_000_000_000_000 + i)))
+
+
+def customer_phone(i):
+    """Mostly bare 10-digit numbers, some with +91 / spaces like real input."""
+    bare = f"9{i:09d}"
+    if i % 10 == 1:
+        return "+91" + bare
+    if i % 20 == 2:
+        return f"{bare[:5]} {bare[5:]}"
+    return bare
+
+
+def bill_text(imeis, noise_lines=40, seed=0):
+    """
+    OCR-like invoice text around `imeis`: labelled IMEI lines mixed with
+    GSTIN, invoice and phone numbers, amounts and a 15-digit non-IMEI.
+    """
+    rng = np.random.default_rng(seed)
+    lines = ["TAX INVOICE", f"GSTIN: 29ABCDE{rng.integers(1000, 9999)}F1Z5",
+             f"Invoice No: INV/{rng.integers(10**14, 10**15)}"]  # 15 digits, fails Luhn half the time
+    for n, imei in enumerate(imeis):
+        label = ["IMEI", "IMEI 1:", "S/N", "Serial No."][n % 4]
+        lines.append(f"{product_name(n + 1)}  {label} {imei}  Qty 1")
+    for _ in range(noise_lines):
+        lines.append(f"Item {rng.integers(1, 999)}  HSN {rng.integers(10**7, 10**8)}  "
+                     f"Rs {rng.integers(100, 99999)}.00  Ph {customer_phone(int(rng.integers(1, 10**6)))}")
+    lines.append("Thank you for shopping!")
+    return "\n".join(lines)
+
+
+# ------------------------------------------------------------------
+# Generator
+# ------------------------------------------------------------------
+def _max_id(conn, model):
+    return conn.execute(select(func.coalesce(func.max(model.id), 0))).scalar()
+
+
+def _batched(engine, model, rows_iter):
+    n = 0
+    for rows in rows_iter:
+        if rows:
+            with engine.begin() as conn:
+                conn.execute(insert(model), rows)
+            n += len(rows)
+    return n
+
+
+def generate(engine, products=1000, customers=5000, sales=20000, seed=7,
+             start=START, days=365, emi_share=0.3, log=None):
+    """Insert a synthetic dataset; returns {table: rows inserted}."""
+    from utils.rollup import rebuild
+    from utils.search import index_sales, index_customers
+    from utils.phones import to_e164
+
+    rng = np.random.default_rng(seed)
+    with engine.connect() as conn:
+        p0, c0, s0 = _max_id(conn, Product), _max_id(conn, Customer), _max_id(conn, Sale)
+        i0, co0 = _max_id(conn, SaleItem), _max_id(conn, Company)
+    counts = {}
+
+    def note(table, n):
+        counts[table] = n
+        if log:
+            log(f"{table}: {n}")
+
+    with engine.begin() as conn:
+        conn.execute(insert(Company), [
+            {"id": co0 + k + 1, "company_name": f"Finance Co {co0 + k + 1}", "company_type": t}
+            for k, t in enumerate(["NBFC", "Bank", "NBFC", "StoreFinance"])
+        ])
+    note("companies", 4)
+
+    # every sale draw up front: 1-3 lines, product popularity skewed (Zipf-like)
+    n_lines = rng.choice([1, 1, 1, 2, 2, 3], size=sales)
+    total_lines = int(n_lines.sum())
+    popularity = 1.0 / np.arange(1, products + 1) ** 0.8
+    line_product = rng.choice(products, size=total_lines, p=popularity / popularity.sum()) + 1
+    line_qty = np.where(is_phone(line_product), 1, rng.integers(1, 4, size=total_lines))
+    sell = np.round(np.where(is_phone(np.arange(1, products + 1)),
+                             rng.integers(60, 1200, size=products) * 100.0,
+                             rng.integers(1, 40, size=products) * 50.0), 2)
+    cost = np.round(sell * rng.uniform(0.7, 0.9, size=products), 2)
+    line_price = sell[line_product - 1]
+    line_total = line_price * line_qty
+    line_sale = np.repeat(np.arange(1, sales + 1), n_lines)
+    sale_total = np.bincount(line_sale - 1, weights=line_total, minlength=sales)
+    sale_when = np.sort(rng.integers(0, days * 86400, size=sales))
+    sale_customer = rng.integers(1, customers + 1, size=sales) + c0
+    is_emi = rng.random(sales) < emi_share
+    sold = np.bincount(line_product - 1, weights=line_qty, minlength=products).astype(np.int64)
+    on_hand = rng.integers(0, 20, size=products)
+
+    def product_rows():
+        for lo in range(1, products + 1, BATCH):
+            yield [{
+                "id": p0 + i, "sku": product_sku(p0 + i), "imei": product_imei(p0 + i),
+                "name": product_name(p0 + i), "category": "phone" if is_phone(p0 + i) else "accessory",
+                "cost_price": float(cost[i - 1]), "sell_price": float(sell[i - 1]),
+                "qty_on_hand": int(on_hand[i - 1]),
+            } for i in range(lo, min(lo + BATCH, products + 1))]
+    note("products", _batched(engine, Product, product_rows()))
+
+    def customer_rows():
+        for lo in range(1, customers + 1, BATCH):
+            yield [{"id": c0 + i, "full_name": f"Customer {c0 + i}", "phone": customer_phone(c0 + i),
+                    "phone_e164": to_e164(customer_phone(c0 + i))}
+                   for i in range(lo, min(lo + BATCH, customers + 1))]
+    note("customers", _batched(engine, Customer, customer_rows()))
+
+    opening = start - datetime.timedelta(days=1)
+    note("stock_movements (opening)", _batched(engine, StockMovement, ([
+        {"product_id": p0 + i, "change_qty": int(sold[i - 1] + on_hand[i - 1]),
+         "reason": "purchase", "timestamp": opening}
+        for i in range(lo, min(lo + BATCH, products + 1))
+    ] for lo in range(1, products + 1, BATCH))))
+
+    line_start = np.concatenate([[0], np.cumsum(n_lines)])
+    n_sales = n_items = n_emis = 0
+    for lo in range(0, sales, BATCH):
+        hi = min(lo + BATCH, sales)
+        when = [start + datetime.timedelta(seconds=int(s)) for s in sale_when[lo:hi]]
+        sale_rows, item_rows, move_rows, emi_rows = [], [], [], []
+        for k in range(lo, hi):
+            sid = s0 + k + 1
+            sale_rows.append({"id": sid, "sale_datetime": when[k - lo], "customer_id": int(sale_customer[k]),
+                              "payment_type": "emi" if is_emi[k] else "cash",
+                              "total_amount": float(sale_total[k])})
+            for j in range(line_start[k], line_start[k + 1]):
+                pid = p0 + int(line_product[j])
+                item_rows.append({"id": i0 + j + 1, "sale_id": sid, "product_id": pid,
+                                  "imei": item_imei(i0 + j + 1) if is_phone(pid) else None,
+                                  "qty": int(line_qty[j]), "unit_price": float(line_price[j]),
+                                  "line_total": float(line_total[j])})
+                move_rows.append({"product_id": pid, "change_qty": -int(line_qty[j]), "reason": "sale",
+                                  "ref_sale_id": sid, "timestamp": when[k - lo]})
+        emi_idx = np.flatnonzero(is_emi[lo:hi]) + lo
+        if len(emi_idx):
+            total = sale_total[emi_idx]
+            down = np.round(total * rng.choice([0.0, 0.1, 0.2, 0.3], size=len(emi_idx)), 2)
+            tenure = rng.choice(TENURES, size=len(emi_idx))
+            rate = rng.choice(RATES, size=len(emi_idx))
+            emi = np.round(emi_amount(total - down, rate, tenure), 2)
+            company = rng.integers(1, 5, size=len(emi_idx)) + co0
+            for n, k in enumerate(emi_idx):
+                due = when[k - lo] + datetime.timedelta(days=30)
+                emi_rows.append({"sale_id": s0 + int(k) + 1, "company_id": int(company[n]),
+                                 "down_payment": float(down[n]), "financed_amount": float(total[n] - down[n]),
+                                 "tenure_months": int(tenure[n]), "interest_rate": float(rate[n]),
+                                 "emi_amount": float(emi[n]), "next_due_date": due,
+                                 "first_due_date": due, "remaining_installments": int(tenure[n])})
+        with engine.begin() as conn:
+            conn.execute(insert(Sale), sale_rows)
+            conn.execute(insert(SaleItem), item_rows)
+            conn.execute(insert(StockMovement), move_rows)
+            if emi_rows:
+                conn.execute(insert(EmiDetail), emi_rows)
+        n_sales += len(sale_rows)
+        n_items += len(item_rows)
+        n_emis += len(emi_rows)
+        if log and (hi == sales or (hi // BATCH) % 10 == 0):
+            log(f"sales: {hi}/{sales}")
+    counts.update({"sales": n_sales, "sale_items": n_items, "emi_details": n_emis})
+    counts["stock_movements (sales)"] = n_items
+
+    with engine.begin() as conn:
+        rebuild(conn)
+        index_sales(conn, range(s0 + 1, s0 + sales + 1))
+        index_customers(conn, range(c0 + 1, c0 + customers + 1))
+    return counts
+
+
+def main(argv=None):
+    from db import Base, engine
+    from migrations import run_migrations
+    ap = argparse.ArgumentParser(prog="python -m utils.synthetic")
+    ap.add_argument("--products", type=int, default=1000)
+    ap.add_argument("--customers", type=int, default=5000)
+    ap.add_argument("--sales", type=int, default=20000)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args(argv)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    t0 = time.perf_counter()
+    counts = generate(engine, args.products, args.customers, args.sales, args.seed,
+                      days=args.days, log=print)
+    print(f"done in {time.perf_counter() - t0:.1f}s: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Startup / rerun timing for the admin sidebar.
+
+Process-wide: bootstrap time and the first-import time of each page module.
+Per session: wall time of the last reruns, grouped by page.
+"""
+import importlib
+import statistics
+import sys
+import time
+from collections import deque
+
+import streamlit as st
+
+RERUN_HISTORY = 50
+PROCESS_TIMINGS = {"bootstrap_ms": None, "page_import_ms": {}}
+
+
+def load_page(module_name):
+    """Import a page module on first use (timed); later calls hit sys.modules."""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    t0 = time.perf_counter()
+    module = importlib.import_module(module_name)
+    PROCESS_TIMINGS["page_import_ms"][module_name] = (time.perf_counter() - t0) * 1000
+    return module
+
+
+def record_rerun(page, elapsed_ms):
+    history = st.session_state.setdefault("_rerun_ms", deque(maxlen=RERUN_HISTORY))
+    history.append((page, elapsed_ms))
+
+
+def render_timing_panel():
+    history = list(st.session_state.get("_rerun_ms", ()))
+    with st.sidebar.expander("Performance: startup / reruns"):
+        boot = PROCESS_TIMINGS["bootstrap_ms"]
+        st.write(f"Bootstrap (once per process): {boot:,.0f} ms" if boot is not None else "Bootstrap: n/a")
+        imports = PROCESS_TIMINGS["page_import_ms"]
+        if imports:
+            st.write("First page imports:")
+            st.table({"module": list(imports), "ms": [round(v, 1) for v in imports.values()]})
+        if history:
+            page, last = history[-1]
+            st.write(f"Last rerun ({page}): {last:,.0f} ms")
+            by_page = {}
+            for p, ms in history:
+                by_page.setdefault(p, []).append(ms)
+            st.table({
+                "page": list(by_page),
+                "reruns": [len(v) for v in by_page.values()],
+                "median ms": [round(statistics.median(v), 1) for v in by_page.values()],
+                "max ms": [round(max(v), 1) for v in by_page.values()],
+            })